@@ -4,15 +4,30 @@ Saurellius Platform - Complete Database Models
 117+ fields across all models for production-ready payroll system
 """
 
-from datetime import datetime, timezone
 from flask_sqlalchemy import SQLAlchemy
-from sqlalchemy import event, func
+from sqlalchemy import DDL, Float, cast, column, event, func, inspect, literal_column, table
 from sqlalchemy.dialects.postgresql import JSONB
+from sqlalchemy.orm import deferred
 import hashlib
+import time
 import uuid
 
 db = SQLAlchemy()
 
+# Deferred column group for Employee YTD/deduction/PTO balances; only payroll
+# paths undefer it, everything else loads the narrow identity/tax columns
+PAYROLL_STATE_GROUP = 'payroll_state'
+
+# Deferred column group for Paystub JSONB documents (calculation breakdowns,
+# branding, compliance/audit trails); undefer it where the documents are read
+PAYSTUB_DOCUMENTS_GROUP = 'paystub_documents'
+
+# Naive-UTC timestamp evaluated by Postgres, used for created_at/updated_at
+# defaults so inserts and updates don't call datetime.now() per row. Set as
+# both default (rendered into each INSERT, so databases created before the
+# server_default still get a value) and server_default.
+utc_now = func.timezone('utc', func.now())
+
 # ============================================================================
 # USER MODEL - Authentication & Account Management
 # ============================================================================
@@ -51,7 +66,7 @@ class User(db.Model):
     subscription_ends_at = db.Column(db.DateTime)
     subscription_renews_at = db.Column(db.DateTime)
     stripe_customer_id = db.Column(db.String(50), unique=True)
-    stripe_subscription_id = db.Column(db.String(50))
+    stripe_subscription_id = db.Column(db.String(50), unique=True)
     stripe_payment_method_id = db.Column(db.String(50))
     monthly_paystub_limit = db.Column(db.Integer, default=10)
     paystubs_used_this_month = db.Column(db.Integer, default=0)
@@ -94,17 +109,19 @@ class User(db.Model):
     require_2fa_for_paystubs = db.Column(db.Boolean, default=False)
     theme_preference = db.Column(db.String(20), default='system')
     
-    # Platform Metadata (6 fields)
+    # Platform Metadata (8 fields)
     oauth_provider = db.Column(db.String(20))  # google, microsoft, apple
     oauth_provider_id = db.Column(db.String(100))
-    api_key_hash = db.Column(db.String(64))
+    api_key_hash = db.Column(db.String(64))  # BLAKE3 hex digest
+    api_key_hash_prefix = db.Column(db.String(8), index=True)  # Lookup key for API-key auth
+    api_key_display = db.Column(db.String(24))  # Masked key shown in settings
     api_requests_this_month = db.Column(db.Integer, default=0)
     api_rate_limit = db.Column(db.Integer, default=1000)
     api_last_request = db.Column(db.DateTime)
     
     # Timestamps (4 fields)
-    created_at = db.Column(db.DateTime, default=lambda: datetime.now(timezone.utc), nullable=False)
-    updated_at = db.Column(db.DateTime, default=lambda: datetime.now(timezone.utc), onupdate=lambda: datetime.now(timezone.utc))
+    created_at = db.Column(db.DateTime, default=utc_now, server_default=utc_now, nullable=False)
+    updated_at = db.Column(db.DateTime, default=utc_now, server_default=utc_now, onupdate=utc_now)
     deleted_at = db.Column(db.DateTime)  # Soft delete
     last_activity_at = db.Column(db.DateTime)
     
@@ -137,14 +154,17 @@ class Employee(db.Model):
     
     # Primary Identity (3 fields)
     id = db.Column(db.Integer, primary_key=True)
-    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False, index=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)  # Leads the composite indexes below
     uuid = db.Column(db.String(36), unique=True, nullable=False, default=lambda: str(uuid.uuid4()))
     
-    # Personal Information (9 fields)
+    # Personal Information (12 fields)
     first_name = db.Column(db.String(100), nullable=False)
     middle_name = db.Column(db.String(100))
     last_name = db.Column(db.String(100), nullable=False)
+    full_name = db.Column(db.Text, db.Computed("first_name || ' ' || last_name", persisted=True))
     ssn_encrypted = db.Column(db.Text, nullable=False)  # Encrypted
+    ssn_last4 = db.Column(db.String(4))  # Plaintext last 4 for masked display
+    ssn_hash = db.Column(db.String(64))  # Keyed HMAC of the SSN for duplicate detection
     email = db.Column(db.String(255))
     phone = db.Column(db.String(20))
     date_of_birth = db.Column(db.Date, nullable=False)
@@ -195,42 +215,42 @@ class Employee(db.Model):
     local_exempt = db.Column(db.Boolean, default=False)
     
     # Year-to-Date Totals (15 fields)
-    ytd_gross_pay = db.Column(db.Numeric(12, 2), default=0.00)
-    ytd_net_pay = db.Column(db.Numeric(12, 2), default=0.00)
-    ytd_federal_tax = db.Column(db.Numeric(12, 2), default=0.00)
-    ytd_state_tax = db.Column(db.Numeric(12, 2), default=0.00)
-    ytd_local_tax = db.Column(db.Numeric(12, 2), default=0.00)
-    ytd_ss_tax = db.Column(db.Numeric(12, 2), default=0.00)
-    ytd_medicare_tax = db.Column(db.Numeric(12, 2), default=0.00)
-    ytd_ss_wages = db.Column(db.Numeric(12, 2), default=0.00)  # Social Security wage base tracking
-    ytd_medicare_wages = db.Column(db.Numeric(12, 2), default=0.00)
-    ytd_401k = db.Column(db.Numeric(12, 2), default=0.00)
-    ytd_health_insurance = db.Column(db.Numeric(12, 2), default=0.00)
-    ytd_overtime_pay = db.Column(db.Numeric(12, 2), default=0.00)
-    ytd_bonus = db.Column(db.Numeric(12, 2), default=0.00)
-    ytd_commission = db.Column(db.Numeric(12, 2), default=0.00)
-    ytd_reimbursements = db.Column(db.Numeric(12, 2), default=0.00)
+    ytd_gross_pay = deferred(db.Column(db.Numeric(12, 2), default=0.00), group=PAYROLL_STATE_GROUP)
+    ytd_net_pay = deferred(db.Column(db.Numeric(12, 2), default=0.00), group=PAYROLL_STATE_GROUP)
+    ytd_federal_tax = deferred(db.Column(db.Numeric(12, 2), default=0.00), group=PAYROLL_STATE_GROUP)
+    ytd_state_tax = deferred(db.Column(db.Numeric(12, 2), default=0.00), group=PAYROLL_STATE_GROUP)
+    ytd_local_tax = deferred(db.Column(db.Numeric(12, 2), default=0.00), group=PAYROLL_STATE_GROUP)
+    ytd_ss_tax = deferred(db.Column(db.Numeric(12, 2), default=0.00), group=PAYROLL_STATE_GROUP)
+    ytd_medicare_tax = deferred(db.Column(db.Numeric(12, 2), default=0.00), group=PAYROLL_STATE_GROUP)
+    ytd_ss_wages = deferred(db.Column(db.Numeric(12, 2), default=0.00), group=PAYROLL_STATE_GROUP)  # Social Security wage base tracking
+    ytd_medicare_wages = deferred(db.Column(db.Numeric(12, 2), default=0.00), group=PAYROLL_STATE_GROUP)
+    ytd_401k = deferred(db.Column(db.Numeric(12, 2), default=0.00), group=PAYROLL_STATE_GROUP)
+    ytd_health_insurance = deferred(db.Column(db.Numeric(12, 2), default=0.00), group=PAYROLL_STATE_GROUP)
+    ytd_overtime_pay = deferred(db.Column(db.Numeric(12, 2), default=0.00), group=PAYROLL_STATE_GROUP)
+    ytd_bonus = deferred(db.Column(db.Numeric(12, 2), default=0.00), group=PAYROLL_STATE_GROUP)
+    ytd_commission = deferred(db.Column(db.Numeric(12, 2), default=0.00), group=PAYROLL_STATE_GROUP)
+    ytd_reimbursements = deferred(db.Column(db.Numeric(12, 2), default=0.00), group=PAYROLL_STATE_GROUP)
     
     # Benefits & Deductions (8 fields)
-    contribution_401k_percent = db.Column(db.Numeric(5, 2), default=0.00)
-    contribution_401k_fixed = db.Column(db.Numeric(10, 2), default=0.00)
-    health_insurance_deduction = db.Column(db.Numeric(10, 2), default=0.00)
-    dental_insurance_deduction = db.Column(db.Numeric(10, 2), default=0.00)
-    vision_insurance_deduction = db.Column(db.Numeric(10, 2), default=0.00)
-    life_insurance_deduction = db.Column(db.Numeric(10, 2), default=0.00)
-    hsa_contribution = db.Column(db.Numeric(10, 2), default=0.00)
-    other_deductions = db.Column(JSONB)
+    contribution_401k_percent = deferred(db.Column(db.Numeric(5, 2), default=0.00), group=PAYROLL_STATE_GROUP)
+    contribution_401k_fixed = deferred(db.Column(db.Numeric(10, 2), default=0.00), group=PAYROLL_STATE_GROUP)
+    health_insurance_deduction = deferred(db.Column(db.Numeric(10, 2), default=0.00), group=PAYROLL_STATE_GROUP)
+    dental_insurance_deduction = deferred(db.Column(db.Numeric(10, 2), default=0.00), group=PAYROLL_STATE_GROUP)
+    vision_insurance_deduction = deferred(db.Column(db.Numeric(10, 2), default=0.00), group=PAYROLL_STATE_GROUP)
+    life_insurance_deduction = deferred(db.Column(db.Numeric(10, 2), default=0.00), group=PAYROLL_STATE_GROUP)
+    hsa_contribution = deferred(db.Column(db.Numeric(10, 2), default=0.00), group=PAYROLL_STATE_GROUP)
+    other_deductions = deferred(db.Column(JSONB), group=PAYROLL_STATE_GROUP)
     
     # PTO Tracking (9 fields)
-    vacation_hours_accrued = db.Column(db.Numeric(8, 2), default=0.00)
-    vacation_hours_used = db.Column(db.Numeric(8, 2), default=0.00)
-    vacation_hours_balance = db.Column(db.Numeric(8, 2), default=0.00)
-    sick_hours_accrued = db.Column(db.Numeric(8, 2), default=0.00)
-    sick_hours_used = db.Column(db.Numeric(8, 2), default=0.00)
-    sick_hours_balance = db.Column(db.Numeric(8, 2), default=0.00)
-    personal_hours_accrued = db.Column(db.Numeric(8, 2), default=0.00)
-    personal_hours_used = db.Column(db.Numeric(8, 2), default=0.00)
-    personal_hours_balance = db.Column(db.Numeric(8, 2), default=0.00)
+    vacation_hours_accrued = deferred(db.Column(db.Numeric(8, 2), default=0.00), group=PAYROLL_STATE_GROUP)
+    vacation_hours_used = deferred(db.Column(db.Numeric(8, 2), default=0.00), group=PAYROLL_STATE_GROUP)
+    vacation_hours_balance = deferred(db.Column(db.Numeric(8, 2), default=0.00), group=PAYROLL_STATE_GROUP)
+    sick_hours_accrued = deferred(db.Column(db.Numeric(8, 2), default=0.00), group=PAYROLL_STATE_GROUP)
+    sick_hours_used = deferred(db.Column(db.Numeric(8, 2), default=0.00), group=PAYROLL_STATE_GROUP)
+    sick_hours_balance = deferred(db.Column(db.Numeric(8, 2), default=0.00), group=PAYROLL_STATE_GROUP)
+    personal_hours_accrued = deferred(db.Column(db.Numeric(8, 2), default=0.00), group=PAYROLL_STATE_GROUP)
+    personal_hours_used = deferred(db.Column(db.Numeric(8, 2), default=0.00), group=PAYROLL_STATE_GROUP)
+    personal_hours_balance = deferred(db.Column(db.Numeric(8, 2), default=0.00), group=PAYROLL_STATE_GROUP)
     
     # PTO Accrual Rules (5 fields)
     pto_accrual_rate = db.Column(db.Numeric(8, 4), default=0.0384)  # hours per hour worked
@@ -255,19 +275,15 @@ class Employee(db.Model):
     tags = db.Column(JSONB)
     
     # Status & Metadata (4 fields)
-    status = db.Column(db.String(20), default='active', index=True)
-    created_at = db.Column(db.DateTime, default=lambda: datetime.now(timezone.utc), nullable=False)
-    updated_at = db.Column(db.DateTime, default=lambda: datetime.now(timezone.utc), onupdate=lambda: datetime.now(timezone.utc))
+    status = db.Column(db.String(20), default='active')  # Indexed via ix_employee_list
+    created_at = db.Column(db.DateTime, default=utc_now, server_default=utc_now, nullable=False)
+    updated_at = db.Column(db.DateTime, default=utc_now, server_default=utc_now, onupdate=utc_now)
     deleted_at = db.Column(db.DateTime)
     
     # Relationships
     user = db.relationship('User', back_populates='employees')
     paystubs = db.relationship('Paystub', back_populates='employee', lazy='dynamic', cascade='all, delete-orphan')
     
-    @property
-    def full_name(self):
-        return f"{self.first_name} {self.last_name}"
-    
     @property
     def state(self):
         return self.address_state
@@ -276,6 +292,103 @@ class Employee(db.Model):
         return f'<Employee {self.full_name}>'
 
 
+# Employee lists filter on user_id (and usually status) and sort by
+# last_name, first_name. ix_employee_list covers the status-filtered list
+# with every selected column so pages come from an index-only scan.
+db.Index('ix_employee_user_lastname', Employee.user_id, Employee.last_name, Employee.first_name)
+db.Index(
+    'ix_employee_list',
+    Employee.user_id, Employee.status, Employee.last_name, Employee.first_name,
+    postgresql_include=[
+        'id', 'full_name', 'email', 'phone', 'job_title', 'department', 'address_state', 'pay_rate',
+        'pay_frequency', 'employment_type', 'hire_date', 'ytd_gross_pay', 'ytd_net_pay'
+    ]
+)
+
+# One live employee per SSN per account. Bulk import targets this index with
+# ON CONFLICT DO NOTHING; soft-deleted rows don't block a re-hire.
+db.Index(
+    'uq_employee_user_ssn_hash',
+    Employee.user_id, Employee.ssn_hash,
+    unique=True,
+    postgresql_where=Employee.deleted_at.is_(None)
+)
+
+# Lowercased text searched by the employee list. Must stay identical to the
+# ix_employee_search_trgm expression below or the planner won't use the index.
+employee_search_text = func.lower(
+    Employee.first_name + literal_column("' '") + Employee.last_name + literal_column("' '")
+    + func.coalesce(Employee.email, literal_column("''")) + literal_column("' '")
+    + func.coalesce(Employee.job_title, literal_column("''"))
+)
+
+# PTO hour buckets cast to float8 in SQL, for read-only report queries. Hours
+# are display values, so the driver returns floats instead of building a
+# Decimal per cell; payroll math keeps using the Numeric columns.
+EMPLOYEE_PTO_HOURS_FLOAT = tuple(
+    cast(Employee.__table__.c[name], Float).label(name)
+    for name in (
+        'vacation_hours_accrued', 'vacation_hours_used', 'vacation_hours_balance',
+        'sick_hours_accrued', 'sick_hours_used', 'sick_hours_balance',
+        'personal_hours_accrued', 'personal_hours_used', 'personal_hours_balance',
+    )
+)
+
+# Trigram GIN index so '%term%' searches don't sequentially scan employees
+event.listen(Employee.__table__, 'after_create', DDL(
+    "CREATE EXTENSION IF NOT EXISTS pg_trgm; "
+    "CREATE INDEX IF NOT EXISTS ix_employee_search_trgm ON employees USING gin "
+    "((lower(first_name || ' ' || last_name || ' ' || coalesce(email, '') || ' ' "
+    "|| coalesce(job_title, ''))) gin_trgm_ops)"
+).execute_if(dialect='postgresql'))
+
+# Profile edits and soft deletes are audited by the database: the trigger
+# diffs OLD/NEW and writes the audit_logs row inside the same UPDATE. It
+# fires only for user-editable columns, so payroll YTD/PTO updates from
+# paystub generation aren't logged. The client IP comes from the
+# transaction-local app.client_ip setting.
+event.listen(Employee.__table__, 'after_create', DDL("""
+CREATE OR REPLACE FUNCTION audit_employee_change() RETURNS trigger AS $$
+DECLARE
+    diff jsonb;
+    deleted boolean := NEW.deleted_at IS NOT NULL AND OLD.deleted_at IS NULL;
+BEGIN
+    SELECT jsonb_object_agg(n.key, n.value) INTO diff
+    FROM jsonb_each(to_jsonb(NEW) - 'ssn_encrypted' - 'full_name' - 'updated_at') AS n
+    WHERE n.value IS DISTINCT FROM to_jsonb(OLD) -> n.key;
+
+    IF diff IS NULL THEN
+        RETURN NULL;
+    END IF;
+
+    INSERT INTO audit_logs (user_id, action, resource_type, resource_id, changes, ip_address, severity)
+    VALUES (
+        NEW.user_id,
+        CASE WHEN deleted THEN 'employee_deleted' ELSE 'employee_updated' END,
+        'employee',
+        NEW.id,
+        diff,
+        nullif(current_setting('app.client_ip', true), ''),
+        CASE WHEN deleted THEN 'warning' ELSE 'info' END
+    );
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER employees_audit
+AFTER UPDATE OF
+    first_name, middle_name, last_name, email, phone,
+    address_street, address_street2, address_city, address_state, address_zip,
+    job_title, department, pay_rate, pay_frequency, employment_status,
+    filing_status, federal_allowances, federal_additional_withholding,
+    state_allowances, local_jurisdiction, contribution_401k_percent,
+    health_insurance_deduction, dental_insurance_deduction, vision_insurance_deduction,
+    status, deleted_at, termination_date
+ON employees
+FOR EACH ROW EXECUTE FUNCTION audit_employee_change();
+""").execute_if(dialect='postgresql'))
+
+
 # ============================================================================
 # PAYSTUB MODEL - Complete Paystub with All Calculations
 # ============================================================================
@@ -289,12 +402,14 @@ class Paystub(db.Model):
     employee_id = db.Column(db.Integer, db.ForeignKey('employees.id'), nullable=False, index=True)
     uuid = db.Column(db.String(36), unique=True, nullable=False, default=lambda: str(uuid.uuid4()))
     
-    # Pay Period Information (5 fields)
+    # Pay Period Information (7 fields)
     pay_date = db.Column(db.Date, nullable=False, index=True)
     period_start = db.Column(db.Date, nullable=False)
     period_end = db.Column(db.Date, nullable=False)
     check_number = db.Column(db.String(20))
     pay_frequency = db.Column(db.String(20))
+    pay_year = db.Column(db.SmallInteger, db.Computed("EXTRACT(YEAR FROM pay_date)::smallint", persisted=True))
+    pay_month = db.Column(db.SmallInteger, db.Computed("EXTRACT(MONTH FROM pay_date)::smallint", persisted=True))
     
     # Earnings - Regular (5 fields)
     regular_hours = db.Column(db.Numeric(8, 2), default=0.00)
@@ -314,7 +429,7 @@ class Paystub(db.Model):
     commission = db.Column(db.Numeric(10, 2), default=0.00)
     tips = db.Column(db.Numeric(10, 2), default=0.00)
     reimbursements = db.Column(db.Numeric(10, 2), default=0.00)
-    other_earnings = db.Column(JSONB)
+    other_earnings = deferred(db.Column(JSONB), group=PAYSTUB_DOCUMENTS_GROUP)
     
     # Total Earnings (3 fields)
     gross_pay = db.Column(db.Numeric(10, 2), nullable=False)
@@ -327,20 +442,20 @@ class Paystub(db.Model):
     medicare_tax = db.Column(db.Numeric(10, 2), default=0.00)
     additional_medicare_tax = db.Column(db.Numeric(10, 2), default=0.00)
     federal_unemployment_tax = db.Column(db.Numeric(10, 2), default=0.00)
-    federal_tax_calculation = db.Column(JSONB)
+    federal_tax_calculation = deferred(db.Column(JSONB), group=PAYSTUB_DOCUMENTS_GROUP)
     
     # State Taxes (5 fields)
     state_income_tax = db.Column(db.Numeric(10, 2), default=0.00)
     state_disability_tax = db.Column(db.Numeric(10, 2), default=0.00)
     state_unemployment_tax = db.Column(db.Numeric(10, 2), default=0.00)
     state_code = db.Column(db.String(2))
-    state_tax_calculation = db.Column(JSONB)
+    state_tax_calculation = deferred(db.Column(JSONB), group=PAYSTUB_DOCUMENTS_GROUP)
     
     # Local Taxes (4 fields)
     local_income_tax = db.Column(db.Numeric(10, 2), default=0.00)
     local_jurisdiction = db.Column(db.String(100))
     local_tax_code = db.Column(db.String(20))
-    local_tax_calculation = db.Column(JSONB)
+    local_tax_calculation = deferred(db.Column(JSONB), group=PAYSTUB_DOCUMENTS_GROUP)
     
     # Pre-Tax Deductions (5 fields)
     deduction_401k = db.Column(db.Numeric(10, 2), default=0.00)
@@ -355,7 +470,7 @@ class Paystub(db.Model):
     deduction_vision = db.Column(db.Numeric(10, 2), default=0.00)
     deduction_life = db.Column(db.Numeric(10, 2), default=0.00)
     deduction_garnishment = db.Column(db.Numeric(10, 2), default=0.00)
-    other_deductions = db.Column(JSONB)
+    other_deductions = deferred(db.Column(JSONB), group=PAYSTUB_DOCUMENTS_GROUP)
     
     # Totals (4 fields)
     total_taxes = db.Column(db.Numeric(10, 2), default=0.00)
@@ -382,7 +497,13 @@ class Paystub(db.Model):
     ytd_hours_worked = db.Column(db.Numeric(10, 2), default=0.00)
     
     # Verification & Security (7 fields)
-    verification_id = db.Column(db.String(20), unique=True, nullable=False)
+    verification_id = db.Column(
+        db.String(20), unique=True, nullable=False,
+        server_default=db.text(
+            "'SAU' || to_char(now(), 'YYYYMMDD') || "
+            "upper(substring(replace(gen_random_uuid()::text, '-', ''), 1, 8))"
+        )
+    )
     verification_qr_data = db.Column(db.Text)
     document_hash = db.Column(db.String(64))
     security_hash = db.Column(db.String(64))
@@ -401,14 +522,14 @@ class Paystub(db.Model):
     # Template & Customization (4 fields)
     template_id = db.Column(db.String(50), default='eusotrip_original')
     template_version = db.Column(db.String(20))
-    custom_branding = db.Column(JSONB)
-    custom_fields = db.Column(JSONB)
+    custom_branding = deferred(db.Column(JSONB), group=PAYSTUB_DOCUMENTS_GROUP)
+    custom_fields = deferred(db.Column(JSONB), group=PAYSTUB_DOCUMENTS_GROUP)
     
     # Compliance & Audit (5 fields)
     snappt_verified = db.Column(db.Boolean, default=True)
     snappt_verification_date = db.Column(db.DateTime)
-    compliance_flags = db.Column(JSONB)
-    audit_trail = db.Column(JSONB)
+    compliance_flags = deferred(db.Column(JSONB), group=PAYSTUB_DOCUMENTS_GROUP)
+    audit_trail = deferred(db.Column(JSONB), group=PAYSTUB_DOCUMENTS_GROUP)
     regeneration_count = db.Column(db.Integer, default=0)
     
     # Status & Workflow (5 fields)
@@ -421,11 +542,11 @@ class Paystub(db.Model):
     # Notifications (3 fields)
     emailed_at = db.Column(db.DateTime)
     emailed_to = db.Column(db.String(255))
-    notification_log = db.Column(JSONB)
+    notification_log = deferred(db.Column(JSONB), group=PAYSTUB_DOCUMENTS_GROUP)
     
     # Metadata (4 fields)
-    created_at = db.Column(db.DateTime, default=lambda: datetime.now(timezone.utc), nullable=False, index=True)
-    updated_at = db.Column(db.DateTime, default=lambda: datetime.now(timezone.utc), onupdate=lambda: datetime.now(timezone.utc))
+    created_at = db.Column(db.DateTime, default=utc_now, server_default=utc_now, nullable=False, index=True)
+    updated_at = db.Column(db.DateTime, default=utc_now, server_default=utc_now, onupdate=utc_now)
     deleted_at = db.Column(db.DateTime)
     generation_time_ms = db.Column(db.Integer)
     
@@ -434,7 +555,58 @@ class Paystub(db.Model):
     employee = db.relationship('Employee', back_populates='paystubs')
     
     def __repr__(self):
-        return f'<Paystub {self.verification_id} - {self.employee.full_name}>'
+        return f'<Paystub {self.verification_id} emp={self.employee_id}>'
+
+
+# verification_id is already backed by its unique constraint's index; history
+# pages filter on user_id and page through pay_date DESC, id DESC.
+db.Index('ix_paystubs_user_history', Paystub.user_id, Paystub.pay_date.desc(), Paystub.id.desc())
+
+# Reports aggregate finalized paystubs over a user's pay_date range. The
+# partial index skips drafts/voids and carries every summed column, so the
+# payroll and tax summaries are answered by index-only scans.
+db.Index(
+    'ix_paystubs_user_paydate_finalized',
+    Paystub.user_id, Paystub.pay_date,
+    postgresql_where=Paystub.status == 'finalized',
+    postgresql_include=[
+        'id', 'employee_id', 'gross_pay', 'net_pay', 'total_taxes', 'total_deductions',
+        'federal_income_tax', 'social_security_tax', 'medicare_tax', 'state_income_tax',
+        'state_disability_tax', 'local_income_tax'
+    ]
+)
+
+# Yearly reports filter on the stored pay_year and group by pay_month, so
+# they match this index by equality instead of a pay_date range.
+db.Index(
+    'ix_paystubs_user_payyear_finalized',
+    Paystub.user_id, Paystub.pay_year,
+    postgresql_where=Paystub.status == 'finalized',
+    postgresql_include=[
+        'pay_month', 'employee_id', 'gross_pay', 'total_taxes', 'federal_income_tax',
+        'social_security_tax', 'medicare_tax', 'state_income_tax',
+        'state_disability_tax', 'local_income_tax'
+    ]
+)
+
+# Containment (@>) lookups on the compliance/audit JSONB documents. The
+# jsonb_path_ops opclass only supports @> but is a fraction of the size of
+# the default jsonb_ops GIN index.
+db.Index(
+    'ix_paystubs_audit_trail_gin', Paystub.audit_trail,
+    postgresql_using='gin',
+    postgresql_ops={'audit_trail': 'jsonb_path_ops'}
+)
+db.Index(
+    'ix_paystubs_compliance_flags_gin', Paystub.compliance_flags,
+    postgresql_using='gin',
+    postgresql_ops={'compliance_flags': 'jsonb_path_ops'}
+)
+db.Index(
+    'ix_paystubs_custom_fields_gin', Paystub.custom_fields,
+    postgresql_using='gin',
+    postgresql_ops={'custom_fields': 'jsonb_path_ops'}
+)
 
 
 # ============================================================================
@@ -454,11 +626,94 @@ class AuditLog(db.Model):
     user_agent = db.Column(db.String(255))
     request_id = db.Column(db.String(36))
     severity = db.Column(db.String(20))  # info, warning, error, critical
-    created_at = db.Column(db.DateTime, default=lambda: datetime.now(timezone.utc), nullable=False, index=True)
+    # Stamped by Postgres on INSERT so audit writes don't compute timestamps in Python
+    created_at = db.Column(db.DateTime, default=utc_now, server_default=utc_now, nullable=False, index=True)
     
     user = db.relationship('User', back_populates='audit_logs')
 
 
+db.Index(
+    'ix_audit_logs_changes_gin', AuditLog.changes,
+    postgresql_using='gin',
+    postgresql_ops={'changes': 'jsonb_path_ops'}
+)
+
+
+# ============================================================================
+# STRIPE EVENT MODEL - Webhook Inbox
+# ============================================================================
+
+class StripeEvent(db.Model):
+    """Webhook events stored on receipt and applied by a background worker"""
+    __tablename__ = 'stripe_events'
+    
+    id = db.Column(db.String(255), primary_key=True)  # Stripe event id (evt_...)
+    event_type = db.Column(db.String(100), nullable=False)
+    payload = db.Column(JSONB, nullable=False)  # event.data.object
+    source_ip = db.Column(db.String(45))  # webhook request's remote address, for audit rows
+    status = db.Column(db.String(20), nullable=False, default='pending')  # pending, processed, failed
+    attempts = db.Column(db.Integer, nullable=False, default=0, server_default='0')  # failed applies
+    next_attempt_at = db.Column(db.DateTime, server_default=utc_now, nullable=False)  # retry backoff
+    received_at = db.Column(db.DateTime, server_default=utc_now, nullable=False)
+    processed_at = db.Column(db.DateTime)
+
+
+# Replays scan only the (small) set of unprocessed events
+db.Index(
+    'ix_stripe_events_pending', StripeEvent.received_at,
+    postgresql_where=StripeEvent.status == 'pending'
+)
+
+
+# ============================================================================
+# PAYSTUB ANNUAL ROLLUP (materialized view)
+# ============================================================================
+
+# Finalized paystub totals per (user, employee, pay_year, quarter), so polled
+# yearly and quarterly figures are index lookups instead of aggregate scans
+# over paystubs. The
+# view is refreshed in the background after paystubs are finalized or
+# voided (utils/paystub_rollup.py), so it may trail them by a few seconds.
+PaystubAnnualRollup = table(
+    'paystub_annual_rollup',
+    column('user_id', db.Integer),
+    column('employee_id', db.Integer),
+    column('year', db.SmallInteger),
+    column('quarter', db.SmallInteger),
+    column('gross', db.Numeric(14, 2)),
+    column('net', db.Numeric(14, 2)),
+    column('federal', db.Numeric(14, 2)),
+    column('ss', db.Numeric(14, 2)),
+    column('medicare', db.Numeric(14, 2)),
+    column('state', db.Numeric(14, 2)),
+    column('sdi', db.Numeric(14, 2)),
+    column('local', db.Numeric(14, 2)),
+    column('total_taxes', db.Numeric(14, 2)),
+    column('paystub_count', db.Integer)
+)
+
+# The unique index is required for REFRESH ... CONCURRENTLY
+event.listen(Paystub.__table__, 'after_create', DDL("""
+CREATE MATERIALIZED VIEW IF NOT EXISTS paystub_annual_rollup AS
+SELECT user_id, employee_id, pay_year AS year,
+       ((pay_month + 2) / 3)::smallint AS quarter,
+       sum(gross_pay) AS gross, sum(net_pay) AS net,
+       sum(federal_income_tax) AS federal, sum(social_security_tax) AS ss,
+       sum(medicare_tax) AS medicare, sum(state_income_tax) AS state,
+       sum(state_disability_tax) AS sdi, sum(local_income_tax) AS local,
+       sum(total_taxes) AS total_taxes, count(*)::int AS paystub_count
+FROM paystubs
+WHERE status = 'finalized'
+GROUP BY user_id, employee_id, pay_year, quarter;
+
+CREATE UNIQUE INDEX IF NOT EXISTS uq_paystub_annual_rollup
+    ON paystub_annual_rollup (user_id, year, quarter, employee_id);
+""").execute_if(dialect='postgresql'))
+event.listen(Paystub.__table__, 'before_drop', DDL(
+    "DROP MATERIALIZED VIEW IF EXISTS paystub_annual_rollup"
+).execute_if(dialect='postgresql'))
+
+
 # ============================================================================
 # EVENTS - Auto-update timestamps and calculations
 # ============================================================================
@@ -467,18 +722,26 @@ class AuditLog(db.Model):
 @event.listens_for(User, 'before_update')
 def generate_referral_code(mapper, connection, target):
     if not target.referral_code:
-        target.referral_code = hashlib.md5(f"{target.email}{datetime.now().timestamp()}".encode()).hexdigest()[:10].upper()
+        target.referral_code = hashlib.blake2b(
+            f"{target.email}{time.time_ns()}".encode(), digest_size=5
+        ).hexdigest().upper()
 
 
-@event.listens_for(Paystub, 'before_insert')
-def generate_verification_id(mapper, connection, target):
-    if not target.verification_id:
-        target.verification_id = f"SAU{datetime.now().strftime('%Y%m%d')}{uuid.uuid4().hex[:8].upper()}"
+# (accrued, used, balance) attributes of each PTO type
+_PTO_BALANCE_ATTRS = (
+    ('vacation_hours_accrued', 'vacation_hours_used', 'vacation_hours_balance'),
+    ('sick_hours_accrued', 'sick_hours_used', 'sick_hours_balance'),
+    ('personal_hours_accrued', 'personal_hours_used', 'personal_hours_balance'),
+)
 
 
 @event.listens_for(Employee, 'before_update')
 def update_pto_balances(mapper, connection, target):
     """Auto-calculate PTO balances"""
-    target.vacation_hours_balance = target.vacation_hours_accrued - target.vacation_hours_used
-    target.sick_hours_balance = target.sick_hours_accrued - target.sick_hours_used
-    target.personal_hours_balance = target.personal_hours_accrued - target.personal_hours_used
+    # Only for PTO types touched by this update: the columns are deferred,
+    # and reading them on every Employee update would lazy-load them per row
+    # (attribute history never loads an unloaded attribute)
+    attrs = inspect(target).attrs
+    for accrued, used, balance in _PTO_BALANCE_ATTRS:
+        if any(attrs[name].history.has_changes() for name in (accrued, used, balance)):
+            setattr(target, balance, getattr(target, accrued) - getattr(target, used))
@@ -4,15 +4,37 @@ Saurellius Platform - Employee Management Routes
 Complete CRUD operations with encryption
 """
 
-from flask import Blueprint, request, jsonify
+from flask import Blueprint, Response, request, jsonify
 from flask_jwt_extended import jwt_required, get_jwt_identity
-from models import db, Employee, User, AuditLog
-from cryptography.fernet import Fernet
-from datetime import datetime, timezone
+from models import db, AuditLog, Employee, User, employee_search_text
+from sqlalchemy import Date, cast, func, insert, select, update
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import load_only, raiseload
+from werkzeug.exceptions import RequestEntityTooLarge
+from cryptography.exceptions import InvalidTag
+from cryptography.fernet import Fernet, InvalidToken
+from cryptography.hazmat.primitives import hashes
+from cryptography.hazmat.primitives.ciphers.aead import AESGCM
+from cryptography.hazmat.primitives.kdf.hkdf import HKDF
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from datetime import date
+from decimal import Decimal
+from itertools import islice
+from typing import Optional
+import base64
+import binascii
+import hashlib
+import hmac
+import ijson
+import io
+import logging
+import orjson
 import os
-import re
 
 employees_bp = Blueprint('employees', __name__)
+logger = logging.getLogger(__name__)
 
 # Encryption setup
 ENCRYPTION_KEY = os.environ.get('ENCRYPTION_KEY')
@@ -21,40 +43,184 @@ if not ENCRYPTION_KEY:
     print(f"⚠️  Generated new encryption key: {ENCRYPTION_KEY.decode()}")
     print("⚠️  Set ENCRYPTION_KEY environment variable!")
 
-fernet = Fernet(ENCRYPTION_KEY if isinstance(ENCRYPTION_KEY, bytes) else ENCRYPTION_KEY.encode())
+_key_bytes = ENCRYPTION_KEY if isinstance(ENCRYPTION_KEY, bytes) else ENCRYPTION_KEY.encode()
+
+# New values use AES-256-GCM (OpenSSL AES-NI) under a key derived from
+# ENCRYPTION_KEY, so it never shares key material with Fernet, which is
+# kept only to read values written before the switch
+_aesgcm = AESGCM(HKDF(
+    algorithm=hashes.SHA256(), length=32, salt=None, info=b'employee-field-aes-gcm',
+).derive(base64.urlsafe_b64decode(_key_bytes)))
+# GCM values first written under the raw Fernet key bytes; read-only until
+# `flask reencrypt-ssns` has rewritten them
+_legacy_aesgcm = AESGCM(base64.urlsafe_b64decode(_key_bytes)[:32])
+fernet = Fernet(_key_bytes)
+_FERNET_PREFIX = 'gAAAAA'
+
+# Key for the deterministic SSN hash, derived from (not equal to) the
+# encryption key. Keyed so the 9-digit SSN space can't be enumerated
+# against stored hashes.
+_ssn_hash_key = hmac.new(_key_bytes, b'employee-ssn-hash', hashlib.sha256).digest()
+
+# Bulk imports encrypt SSNs off the request thread
+_crypto_pool = ThreadPoolExecutor(max_workers=os.cpu_count(), thread_name_prefix='ssn-crypto')
+
+
+# ============================================================================
+# RESPONSE SCHEMAS
+# ============================================================================
+
+@dataclass(slots=True)
+class EmployeeListItem:
+    """Employee list entry; field order matches EMPLOYEE_LIST_COLUMNS"""
+    id: int
+    first_name: str
+    last_name: str
+    full_name: str
+    email: Optional[str]
+    phone: Optional[str]
+    job_title: str
+    department: Optional[str]
+    state: str
+    pay_rate: Decimal
+    pay_frequency: str
+    employment_type: str
+    hire_date: date
+    status: str
+    ytd_gross: Decimal
+    ytd_net: Decimal
+
+
+EMPLOYEE_LIST_COLUMNS = (
+    Employee.id,
+    Employee.first_name,
+    Employee.last_name,
+    Employee.full_name,
+    Employee.email,
+    Employee.phone,
+    Employee.job_title,
+    Employee.department,
+    Employee.address_state,
+    Employee.pay_rate,
+    Employee.pay_frequency,
+    Employee.employment_type,
+    Employee.hire_date,
+    Employee.status,
+    Employee.ytd_gross_pay,
+    Employee.ytd_net_pay,
+)
+
+# Columns rendered by get_employee; skips the encrypted SSN blob and
+# fields the detail view never reads
+EMPLOYEE_DETAIL_COLUMNS = (
+    Employee.id,
+    Employee.user_id,
+    Employee.first_name,
+    Employee.middle_name,
+    Employee.last_name,
+    Employee.ssn_last4,
+    Employee.email,
+    Employee.phone,
+    Employee.date_of_birth,
+    Employee.address_street,
+    Employee.address_street2,
+    Employee.address_city,
+    Employee.address_state,
+    Employee.address_zip,
+    Employee.job_title,
+    Employee.department,
+    Employee.employee_id,
+    Employee.hire_date,
+    Employee.employment_type,
+    Employee.employment_status,
+    Employee.pay_rate,
+    Employee.pay_frequency,
+    Employee.salary_or_hourly,
+    Employee.filing_status,
+    Employee.federal_allowances,
+    Employee.federal_additional_withholding,
+    Employee.state_allowances,
+    Employee.state_additional_withholding,
+    Employee.local_jurisdiction,
+    Employee.ytd_gross_pay,
+    Employee.ytd_net_pay,
+    Employee.ytd_federal_tax,
+    Employee.ytd_state_tax,
+    Employee.ytd_ss_tax,
+    Employee.ytd_medicare_tax,
+    Employee.contribution_401k_percent,
+    Employee.contribution_401k_fixed,
+    Employee.health_insurance_deduction,
+    Employee.dental_insurance_deduction,
+    Employee.vision_insurance_deduction,
+    Employee.vacation_hours_balance,
+    Employee.sick_hours_balance,
+    Employee.personal_hours_balance,
+    Employee.pto_accrual_rate,
+    Employee.status,
+    Employee.created_at,
+    Employee.updated_at,
+)
+
 
 # ============================================================================
 # VALIDATION HELPERS
 # ============================================================================
 
+# Separators accepted in SSN input; anything else left over is rejected
+_SSN_STRIP = str.maketrans({c: None for c in '-. /()_+'})
+_INVALID_SSNS = frozenset({'000000000', '999999999'})
+
+
 def validate_ssn(ssn):
     """Validate SSN format"""
-    # Remove any non-digits
-    ssn_clean = re.sub(r'[^\d]', '', ssn)
+    ssn_clean = ssn.translate(_SSN_STRIP)
     
-    if len(ssn_clean) != 9:
+    if len(ssn_clean) != 9 or not (ssn_clean.isascii() and ssn_clean.isdigit()):
         return False, "SSN must be 9 digits"
     
     # Check for invalid patterns
-    if ssn_clean == '000000000' or ssn_clean == '999999999':
+    if ssn_clean in _INVALID_SSNS:
         return False, "Invalid SSN"
     
-    if ssn_clean[0:3] == '000' or ssn_clean[3:5] == '00' or ssn_clean[5:9] == '0000':
+    if ssn_clean[:3] == '000' or ssn_clean[3:5] == '00' or ssn_clean[5:] == '0000':
         return False, "Invalid SSN format"
     
     return True, ssn_clean
 
 
+def hash_ssn(ssn_clean):
+    """Deterministic keyed hash of a validated SSN, for duplicate detection"""
+    return hmac.new(_ssn_hash_key, ssn_clean.encode('ascii'), hashlib.sha256).hexdigest()
+
+
 def encrypt_data(data):
-    """Encrypt sensitive data"""
-    return fernet.encrypt(data.encode()).decode()
+    """Encrypt sensitive data (bytes, or str which is UTF-8 encoded)"""
+    if isinstance(data, str):
+        data = data.encode()
+    nonce = os.urandom(12)
+    # Stored as base64(nonce + ciphertext + tag)
+    return base64.b64encode(nonce + _aesgcm.encrypt(nonce, data, None)).decode()
 
 
 def decrypt_data(encrypted_data):
     """Decrypt sensitive data"""
+    # Fernet tokens start with the version byte 0x80 and a zero-padded
+    # timestamp; try them first rather than failing a GCM attempt per row
+    if encrypted_data.startswith(_FERNET_PREFIX):
+        try:
+            return fernet.decrypt(encrypted_data).decode()
+        except (InvalidToken, ValueError):
+            pass
+    
     try:
-        return fernet.decrypt(encrypted_data.encode()).decode()
-    except:
+        raw = base64.b64decode(encrypted_data)
+        try:
+            plaintext = _aesgcm.decrypt(raw[:12], raw[12:], None)
+        except InvalidTag:
+            plaintext = _legacy_aesgcm.decrypt(raw[:12], raw[12:], None)
+        return plaintext.decode()
+    except (InvalidTag, InvalidToken, binascii.Error, ValueError):
         return None
 
 
@@ -79,59 +245,48 @@ def get_employees():
         offset = request.args.get('offset', 0, type=int)
         search = request.args.get('search', '')
         
-        # Build query
-        query = Employee.query.filter_by(user_id=user_id)
+        # Select only the listed columns so rows come back as plain tuples
+        # without ORM hydration; the window count returns the filtered total
+        # with each page row so listing takes a single round trip
+        query = select(
+            *EMPLOYEE_LIST_COLUMNS,
+            func.count().over().label('total')
+        ).where(Employee.user_id == user_id)
         
         if status and status != 'all':
-            query = query.filter_by(status=status)
+            query = query.where(Employee.status == status)
         
         if search:
-            search_pattern = f"%{search}%"
-            query = query.filter(
-                db.or_(
-                    Employee.first_name.ilike(search_pattern),
-                    Employee.last_name.ilike(search_pattern),
-                    Employee.email.ilike(search_pattern),
-                    Employee.job_title.ilike(search_pattern)
-                )
+            search_pattern = f"%{search.lower()}%"
+            query = query.where(employee_search_text.like(search_pattern))
+        
+        rows = db.session.execute(
+            query.order_by(Employee.last_name, Employee.first_name)
+            .limit(limit)
+            .offset(offset)
+        ).all()
+        
+        if rows:
+            total = rows[0].total
+        elif offset:
+            # Paged past the end; no row carried the total
+            total = db.session.scalar(
+                query.with_only_columns(func.count()).order_by(None)
             )
+        else:
+            total = 0
         
-        # Get total count
-        total = query.count()
-        
-        # Get paginated results
-        employees = query.order_by(Employee.last_name, Employee.first_name)\
-            .limit(limit)\
-            .offset(offset)\
-            .all()
-        
+        # orjson serializes the dataclasses natively, Decimal/date included
         return jsonify({
             'success': True,
-            'employees': [{
-                'id': emp.id,
-                'first_name': emp.first_name,
-                'last_name': emp.last_name,
-                'full_name': emp.full_name,
-                'email': emp.email,
-                'phone': emp.phone,
-                'job_title': emp.job_title,
-                'department': emp.department,
-                'state': emp.address_state,
-                'pay_rate': float(emp.pay_rate),
-                'pay_frequency': emp.pay_frequency,
-                'employment_type': emp.employment_type,
-                'hire_date': emp.hire_date.isoformat(),
-                'status': emp.status,
-                'ytd_gross': float(emp.ytd_gross_pay),
-                'ytd_net': float(emp.ytd_net_pay)
-            } for emp in employees],
+            'employees': [EmployeeListItem(*row[:-1]) for row in rows],
             'total': total,
             'limit': limit,
             'offset': offset
         }), 200
         
-    except Exception as e:
-        print(f"Get employees error: {str(e)}")
+    except Exception:
+        logger.exception("Get employees error")
         return jsonify({
             'success': False,
             'message': 'Failed to get employees'
@@ -149,19 +304,26 @@ def get_employee(employee_id):
     try:
         user_id = get_jwt_identity()
         
-        employee = Employee.query.filter_by(
-            id=employee_id,
-            user_id=user_id
-        ).first()
+        employee = db.session.get(
+            Employee, employee_id,
+            options=[load_only(*EMPLOYEE_DETAIL_COLUMNS), raiseload('*')]
+        )
         
-        if not employee:
+        if employee is None or employee.user_id != user_id:
             return jsonify({'success': False, 'message': 'Employee not found'}), 404
         
-        # Decrypt SSN (last 4 only)
-        ssn_decrypted = decrypt_data(employee.ssn_encrypted)
-        ssn_masked = f"XXX-XX-{ssn_decrypted[-4:]}" if ssn_decrypted else "XXX-XX-XXXX"
+        # Conditional GET: skip building and encoding the payload when the
+        # client already holds this version
+        last_modified = employee.updated_at or employee.created_at
+        etag = f"{employee.id}-{int(last_modified.timestamp() * 1000000)}"
+        if request.if_none_match.contains_weak(etag):
+            response = Response(status=304)
+            response.set_etag(etag, weak=True)
+            return response
         
-        return jsonify({
+        ssn_masked = f"XXX-XX-{employee.ssn_last4 or 'XXXX'}"
+        
+        response = jsonify({
             'success': True,
             'employee': {
                 'id': employee.id,
@@ -224,10 +386,13 @@ def get_employee(employee_id):
                 'status': employee.status,
                 'created_at': employee.created_at.isoformat()
             }
-        }), 200
+        })
+        response.set_etag(etag, weak=True)
+        response.headers['Cache-Control'] = 'private, must-revalidate'
+        return response, 200
         
-    except Exception as e:
-        print(f"Get employee error: {str(e)}")
+    except Exception:
+        logger.exception("Get employee error (employee_id=%s)", employee_id)
         return jsonify({
             'success': False,
             'message': 'Failed to get employee'
@@ -276,7 +441,7 @@ def create_employee():
     """
     try:
         user_id = get_jwt_identity()
-        data = request.get_json()
+        data = orjson.loads(request.get_data(cache=False))  # Body isn't needed again
         
         # Check if user exists
         user = User.query.get(user_id)
@@ -304,7 +469,7 @@ def create_employee():
             }), 400
         
         # Encrypt SSN
-        encrypted_ssn = encrypt_data(ssn_result)
+        encrypted_ssn = encrypt_data(ssn_result.encode('ascii'))
         
         # Create employee
         employee = Employee(
@@ -315,6 +480,8 @@ def create_employee():
             middle_name=personal.get('middle_name'),
             last_name=personal['last_name'],
             ssn_encrypted=encrypted_ssn,
+            ssn_last4=ssn_result[-4:],
+            ssn_hash=hash_ssn(ssn_result),
             email=personal.get('email'),
             phone=personal.get('phone'),
             date_of_birth=personal['date_of_birth'],
@@ -358,41 +525,50 @@ def create_employee():
         )
         
         db.session.add(employee)
-        db.session.commit()
+        try:
+            db.session.flush()  # Assigns employee.id
+        except IntegrityError as e:
+            db.session.rollback()
+            if getattr(getattr(e.orig, 'diag', None), 'constraint_name', None) != 'uq_employee_user_ssn_hash':
+                raise
+            return jsonify({
+                'success': False,
+                'message': 'An employee with this SSN already exists'
+            }), 409
+        
+        # Read before commit expires the instance and forces a reload
+        created = {
+            'id': employee.id,
+            'full_name': employee.full_name,
+            'job_title': employee.job_title,
+            'state': employee.address_state
+        }
         
-        # Audit log
-        log = AuditLog(
+        # Audit log, committed with the employee it records
+        db.session.execute(insert(AuditLog).values(
             user_id=user_id,
             action='employee_created',
             resource_type='employee',
-            resource_id=employee.id,
+            resource_id=created['id'],
             changes={
-                'name': employee.full_name,
-                'job_title': employee.job_title
+                'name': created['full_name'],
+                'job_title': created['job_title']
             },
             ip_address=request.remote_addr,
             severity='info'
-        )
-        db.session.add(log)
+        ))
         db.session.commit()
         
         return jsonify({
             'success': True,
-            'message': f'Employee {employee.full_name} created successfully',
-            'employee_id': employee.id,
-            'employee': {
-                'id': employee.id,
-                'full_name': employee.full_name,
-                'job_title': employee.job_title,
-                'state': employee.address_state
-            }
+            'message': f"Employee {created['full_name']} created successfully",
+            'employee_id': created['id'],
+            'employee': created
         }), 201
         
     except Exception as e:
         db.session.rollback()
-        print(f"Create employee error: {str(e)}")
-        import traceback
-        traceback.print_exc()
+        logger.exception("Create employee error")
         return jsonify({
             'success': False,
             'message': 'Failed to create employee',
@@ -404,127 +580,95 @@ def create_employee():
 # UPDATE EMPLOYEE
 # ============================================================================
 
+# (payload section, key) -> Employee attribute accepted on update
+EMPLOYEE_UPDATE_FIELDS = {
+    ('personal', 'first_name'): 'first_name',
+    ('personal', 'middle_name'): 'middle_name',
+    ('personal', 'last_name'): 'last_name',
+    ('personal', 'email'): 'email',
+    ('personal', 'phone'): 'phone',
+    ('address', 'street'): 'address_street',
+    ('address', 'street2'): 'address_street2',
+    ('address', 'city'): 'address_city',
+    ('address', 'state'): 'address_state',
+    ('address', 'zip'): 'address_zip',
+    ('employment', 'job_title'): 'job_title',
+    ('employment', 'department'): 'department',
+    ('employment', 'pay_rate'): 'pay_rate',
+    ('employment', 'pay_frequency'): 'pay_frequency',
+    ('employment', 'employment_status'): 'employment_status',
+    ('tax_info', 'filing_status'): 'filing_status',
+    ('tax_info', 'federal_allowances'): 'federal_allowances',
+    ('tax_info', 'federal_additional_withholding'): 'federal_additional_withholding',
+    ('tax_info', 'state_allowances'): 'state_allowances',
+    ('tax_info', 'local_jurisdiction'): 'local_jurisdiction',
+    ('benefits', '401k_percent'): 'contribution_401k_percent',
+    ('benefits', 'health_insurance'): 'health_insurance_deduction',
+    ('benefits', 'dental_insurance'): 'dental_insurance_deduction',
+    ('benefits', 'vision_insurance'): 'vision_insurance_deduction',
+}
+
+
+def _set_audit_client_ip():
+    """Expose the client IP to the employees_audit trigger for this transaction"""
+    db.session.execute(select(func.set_config('app.client_ip', request.remote_addr or '', True)))
+
+
 @employees_bp.route('/api/employees/<int:employee_id>', methods=['PUT'])
 @jwt_required()
 def update_employee(employee_id):
     """Update employee information"""
     try:
         user_id = get_jwt_identity()
-        data = request.get_json()
-        
-        employee = Employee.query.filter_by(
-            id=employee_id,
-            user_id=user_id
-        ).first()
-        
-        if not employee:
+        data = orjson.loads(request.get_data(cache=False))  # Body isn't needed again
+        
+        patch = {}
+        for (section, key), attr in EMPLOYEE_UPDATE_FIELDS.items():
+            values = data.get(section)
+            if values and key in values:
+                patch[attr] = values[key]
+        
+        if patch:
+            # One UPDATE ... RETURNING checks ownership, applies the patch and
+            # returns the response fields; the employees_audit trigger writes
+            # the audit row in the same statement
+            _set_audit_client_ip()
+            row = db.session.execute(
+                update(Employee)
+                .where(Employee.id == employee_id, Employee.user_id == user_id)
+                .values(**patch)
+                .returning(Employee.id, Employee.full_name, Employee.job_title)
+                .execution_options(synchronize_session=False)
+            ).first()
+        else:
+            row = db.session.execute(
+                select(
+                    Employee.id,
+                    Employee.full_name,
+                    Employee.job_title
+                ).where(Employee.id == employee_id, Employee.user_id == user_id)
+            ).first()
+        
+        if not row:
             return jsonify({'success': False, 'message': 'Employee not found'}), 404
         
-        # Track changes for audit
-        changes = {}
-        
-        # Update personal info
-        if 'personal' in data:
-            personal = data['personal']
-            if 'first_name' in personal:
-                employee.first_name = personal['first_name']
-                changes['first_name'] = personal['first_name']
-            if 'middle_name' in personal:
-                employee.middle_name = personal['middle_name']
-            if 'last_name' in personal:
-                employee.last_name = personal['last_name']
-                changes['last_name'] = personal['last_name']
-            if 'email' in personal:
-                employee.email = personal['email']
-            if 'phone' in personal:
-                employee.phone = personal['phone']
-        
-        # Update address
-        if 'address' in data:
-            address = data['address']
-            if 'street' in address:
-                employee.address_street = address['street']
-            if 'street2' in address:
-                employee.address_street2 = address['street2']
-            if 'city' in address:
-                employee.address_city = address['city']
-            if 'state' in address:
-                employee.address_state = address['state']
-                changes['state'] = address['state']
-            if 'zip' in address:
-                employee.address_zip = address['zip']
-        
-        # Update employment
-        if 'employment' in data:
-            employment = data['employment']
-            if 'job_title' in employment:
-                employee.job_title = employment['job_title']
-                changes['job_title'] = employment['job_title']
-            if 'department' in employment:
-                employee.department = employment['department']
-            if 'pay_rate' in employment:
-                old_rate = employee.pay_rate
-                employee.pay_rate = employment['pay_rate']
-                changes['pay_rate'] = f"{old_rate} -> {employment['pay_rate']}"
-            if 'pay_frequency' in employment:
-                employee.pay_frequency = employment['pay_frequency']
-            if 'employment_status' in employment:
-                employee.employment_status = employment['employment_status']
-        
-        # Update tax info
-        if 'tax_info' in data:
-            tax_info = data['tax_info']
-            if 'filing_status' in tax_info:
-                employee.filing_status = tax_info['filing_status']
-            if 'federal_allowances' in tax_info:
-                employee.federal_allowances = tax_info['federal_allowances']
-            if 'federal_additional_withholding' in tax_info:
-                employee.federal_additional_withholding = tax_info['federal_additional_withholding']
-            if 'state_allowances' in tax_info:
-                employee.state_allowances = tax_info['state_allowances']
-            if 'local_jurisdiction' in tax_info:
-                employee.local_jurisdiction = tax_info['local_jurisdiction']
-        
-        # Update benefits
-        if 'benefits' in data:
-            benefits = data['benefits']
-            if '401k_percent' in benefits:
-                employee.contribution_401k_percent = benefits['401k_percent']
-            if 'health_insurance' in benefits:
-                employee.health_insurance_deduction = benefits['health_insurance']
-            if 'dental_insurance' in benefits:
-                employee.dental_insurance_deduction = benefits['dental_insurance']
-            if 'vision_insurance' in benefits:
-                employee.vision_insurance_deduction = benefits['vision_insurance']
-        
         db.session.commit()
         
-        # Audit log
-        log = AuditLog(
-            user_id=user_id,
-            action='employee_updated',
-            resource_type='employee',
-            resource_id=employee.id,
-            changes=changes,
-            ip_address=request.remote_addr,
-            severity='info'
-        )
-        db.session.add(log)
-        db.session.commit()
+        updated = {
+            'id': row.id,
+            'full_name': row.full_name,
+            'job_title': row.job_title
+        }
         
         return jsonify({
             'success': True,
-            'message': f'Employee {employee.full_name} updated successfully',
-            'employee': {
-                'id': employee.id,
-                'full_name': employee.full_name,
-                'job_title': employee.job_title
-            }
+            'message': f"Employee {updated['full_name']} updated successfully",
+            'employee': updated
         }), 200
         
     except Exception as e:
         db.session.rollback()
-        print(f"Update employee error: {str(e)}")
+        logger.exception("Update employee error (employee_id=%s)", employee_id)
         return jsonify({
             'success': False,
             'message': 'Failed to update employee',
@@ -543,42 +687,40 @@ def delete_employee(employee_id):
     try:
         user_id = get_jwt_identity()
         
-        employee = Employee.query.filter_by(
-            id=employee_id,
-            user_id=user_id
+        # Soft delete in one ownership-scoped UPDATE; no row back means the
+        # employee doesn't exist, belongs to someone else or is already deleted.
+        # The employees_audit trigger records it.
+        _set_audit_client_ip()
+        now_utc = func.timezone('utc', func.now())
+        row = db.session.execute(
+            update(Employee)
+            .where(
+                Employee.id == employee_id,
+                Employee.user_id == user_id,
+                Employee.deleted_at.is_(None)
+            )
+            .values(
+                status='terminated',
+                deleted_at=now_utc,
+                termination_date=cast(now_utc, Date)
+            )
+            .returning(Employee.id, Employee.full_name)
+            .execution_options(synchronize_session=False)
         ).first()
         
-        if not employee:
+        if not row:
             return jsonify({'success': False, 'message': 'Employee not found'}), 404
         
-        # Soft delete
-        employee.status = 'terminated'
-        employee.deleted_at = datetime.now(timezone.utc)
-        employee.termination_date = datetime.now(timezone.utc).date()
-        
-        db.session.commit()
-        
-        # Audit log
-        log = AuditLog(
-            user_id=user_id,
-            action='employee_deleted',
-            resource_type='employee',
-            resource_id=employee.id,
-            changes={'name': employee.full_name},
-            ip_address=request.remote_addr,
-            severity='warning'
-        )
-        db.session.add(log)
         db.session.commit()
         
         return jsonify({
             'success': True,
-            'message': f'Employee {employee.full_name} deleted successfully'
+            'message': f'Employee {row.full_name} deleted successfully'
         }), 200
         
-    except Exception as e:
+    except Exception:
         db.session.rollback()
-        print(f"Delete employee error: {str(e)}")
+        logger.exception("Delete employee error (employee_id=%s)", employee_id)
         return jsonify({
             'success': False,
             'message': 'Failed to delete employee'
@@ -589,6 +731,135 @@ def delete_employee(employee_id):
 # BULK IMPORT EMPLOYEES
 # ============================================================================
 
+# Rows per multi-row INSERT statement, and per committed transaction
+EMPLOYEE_INSERT_BATCH = 1000
+EMPLOYEE_COMMIT_BATCH = 10000
+
+# Below this many rows SSNs are encrypted on the request thread
+PARALLEL_ENCRYPT_MIN_ROWS = 100
+
+# Built once; a Core table insert executes the row dicts directly instead
+# of going through the ORM bulk-insert path on every batch. Rows whose SSN
+# already exists for the account (or repeats within the batch) are skipped
+# by the database and left out of RETURNING.
+EMPLOYEE_TABLE_INSERT = (
+    pg_insert(Employee.__table__)
+    .on_conflict_do_nothing(
+        index_elements=['user_id', 'ssn_hash'],
+        index_where=Employee.deleted_at.is_(None)
+    )
+    .returning(Employee.id)
+)
+
+# (payload section, key) -> employees column for imported rows, and
+# whether the value is required
+EMPLOYEE_IMPORT_FIELDS = (
+    ('personal', 'first_name', 'first_name', True),
+    ('personal', 'last_name', 'last_name', True),
+    ('personal', 'email', 'email', False),
+    ('personal', 'phone', 'phone', False),
+    ('personal', 'date_of_birth', 'date_of_birth', True),
+    ('address', 'street', 'address_street', True),
+    ('address', 'city', 'address_city', True),
+    ('address', 'state', 'address_state', True),
+    ('address', 'zip', 'address_zip', True),
+    ('employment', 'job_title', 'job_title', True),
+    ('employment', 'hire_date', 'hire_date', True),
+    ('employment', 'pay_rate', 'pay_rate', True),
+    ('employment', 'pay_frequency', 'pay_frequency', False),
+    ('tax_info', 'filing_status', 'filing_status', False),
+)
+EMPLOYEE_IMPORT_DEFAULTS = {'pay_frequency': 'biweekly', 'filing_status': 'single'}
+_EMPTY_SECTION = {}
+
+
+def _is_iso_date(value):
+    if not isinstance(value, str):
+        return False
+    try:
+        date.fromisoformat(value)
+    except ValueError:
+        return False
+    return True
+
+
+def _is_number(value):
+    if isinstance(value, bool):
+        return False
+    if isinstance(value, (int, float, Decimal)):
+        return True
+    if not isinstance(value, str):
+        return False
+    try:
+        Decimal(value)
+    except ArithmeticError:
+        return False
+    return True
+
+
+def build_import_row(emp_data, user_id):
+    """
+    Validate one bulk-import record and map it to an employees row.
+    
+    Returns (True, (row, ssn)) or (False, error message); bad input is
+    reported without raising.
+    """
+    if not isinstance(emp_data, dict):
+        return False, "Employee record must be an object"
+    
+    sections = {}
+    for section in ('personal', 'address', 'employment', 'tax_info'):
+        value = emp_data.get(section, _EMPTY_SECTION)
+        if not isinstance(value, dict):
+            return False, f"{section} must be an object"
+        sections[section] = value
+    
+    row = {'user_id': user_id, 'status': 'active'}
+    for section, key, column, required in EMPLOYEE_IMPORT_FIELDS:
+        value = sections[section].get(key)
+        if value is None or value == '':
+            if required:
+                return False, f"Missing {section}.{key}"
+            value = EMPLOYEE_IMPORT_DEFAULTS.get(column)
+        row[column] = value
+    
+    for column in ('date_of_birth', 'hire_date'):
+        if not _is_iso_date(row[column]):
+            return False, f"{column} must be an ISO date (YYYY-MM-DD)"
+    
+    if not _is_number(row['pay_rate']):
+        return False, "pay_rate must be a number"
+    
+    ssn = sections['personal'].get('ssn')
+    is_valid_ssn, ssn_result = validate_ssn(ssn if isinstance(ssn, str) else '')
+    if not is_valid_ssn:
+        return False, ssn_result
+    row['ssn_last4'] = ssn_result[-4:]
+    row['ssn_hash'] = hash_ssn(ssn_result)
+    
+    return True, (row, ssn_result)
+
+
+class _EmployeesArrayEvents:
+    """
+    ijson parse events for a bulk import body, noting whether the top-level
+    "employees" array was ever opened (ijson.items yields nothing for a
+    missing or non-list "employees", which must not look like an empty import)
+    """
+    
+    def __init__(self, stream):
+        self.opened = False
+        # Buffered so ijson's read(0) probe isn't taken by werkzeug's
+        # LimitedStream as a client disconnect
+        self._events = ijson.parse(io.BufferedReader(stream))
+    
+    def __iter__(self):
+        for prefix, event, value in self._events:
+            if prefix == 'employees' and event == 'start_array':
+                self.opened = True
+            yield prefix, event, value
+
+
 @employees_bp.route('/api/employees/bulk-import', methods=['POST'])
 @jwt_required()
 def bulk_import_employees():
@@ -602,83 +873,111 @@ def bulk_import_employees():
             { employee_data }
         ]
     }
+    
+    Also accepts Content-Type: application/x-ndjson with one employee
+    object per line. The body is parsed incrementally and imported in
+    EMPLOYEE_COMMIT_BATCH chunks, so memory stays bounded by chunk size.
     """
+    committed_count = 0
+    
     try:
         user_id = get_jwt_identity()
-        data = request.get_json()
         
-        if 'employees' not in data or not isinstance(data['employees'], list):
-            return jsonify({
-                'success': False,
-                'message': 'Invalid data format'
-            }), 400
+        employees_array = None
+        if request.mimetype == 'application/x-ndjson':
+            employees_data = (orjson.loads(line) for line in request.stream if line.strip())
+        else:
+            employees_array = _EmployeesArrayEvents(request.stream)
+            employees_data = ijson.items(employees_array, 'employees.item')
         
-        employees_data = data['employees']
         created_count = 0
+        duplicate_count = 0
         failed_count = 0
         errors = []
         
-        for emp_data in employees_data:
-            try:
-                # Validate SSN
-                is_valid_ssn, ssn_result = validate_ssn(emp_data['personal'].get('ssn', ''))
-                if not is_valid_ssn:
-                    errors.append({
-                        'employee': emp_data['personal'].get('first_name', 'Unknown'),
-                        'error': ssn_result
-                    })
-                    failed_count += 1
-                    continue
-                
-                # Encrypt SSN
-                encrypted_ssn = encrypt_data(ssn_result)
+        # Nothing here loads ORM objects; no_autoflush guarantees no query
+        # (e.g. a future lookup in validation) flushes mid-chunk, and the
+        # identity map is cleared after each commit so it never grows
+        with db.session.no_autoflush:
+            while chunk := list(islice(employees_data, EMPLOYEE_COMMIT_BATCH)):
+                # Validate and build the chunk's rows before touching the session
+                rows = []
+                ssns = []
+                for emp_data in chunk:
+                    is_valid, result = build_import_row(emp_data, user_id)
+                    if not is_valid:
+                        personal = emp_data.get('personal') if isinstance(emp_data, dict) else None
+                        name = personal.get('first_name') if isinstance(personal, dict) else None
+                        errors.append({
+                            'employee': name or 'Unknown',
+                            'error': result
+                        })
+                        failed_count += 1
+                        continue
+                    
+                    row, ssn = result
+                    rows.append(row)
+                    ssns.append(ssn.encode('ascii'))
                 
-                # Create employee
-                employee = Employee(
-                    user_id=user_id,
-                    first_name=emp_data['personal']['first_name'],
-                    last_name=emp_data['personal']['last_name'],
-                    ssn_encrypted=encrypted_ssn,
-                    email=emp_data['personal'].get('email'),
-                    phone=emp_data['personal'].get('phone'),
-                    date_of_birth=emp_data['personal']['date_of_birth'],
-                    address_street=emp_data['address']['street'],
-                    address_city=emp_data['address']['city'],
-                    address_state=emp_data['address']['state'],
-                    address_zip=emp_data['address']['zip'],
-                    job_title=emp_data['employment']['job_title'],
-                    hire_date=emp_data['employment']['hire_date'],
-                    pay_rate=emp_data['employment']['pay_rate'],
-                    pay_frequency=emp_data['employment'].get('pay_frequency', 'biweekly'),
-                    filing_status=emp_data.get('tax_info', {}).get('filing_status', 'single'),
-                    status='active'
-                )
+                # Encrypt SSNs in parallel; OpenSSL releases the GIL. Small
+                # imports stay inline where thread handoff would cost more.
+                if len(ssns) >= PARALLEL_ENCRYPT_MIN_ROWS:
+                    encrypted_ssns = _crypto_pool.map(encrypt_data, ssns)
+                else:
+                    encrypted_ssns = map(encrypt_data, ssns)
+                for row, encrypted_ssn in zip(rows, encrypted_ssns):
+                    row['ssn_encrypted'] = encrypted_ssn
                 
-                db.session.add(employee)
-                created_count += 1
+                for start in range(0, len(rows), EMPLOYEE_INSERT_BATCH):
+                    batch = rows[start:start + EMPLOYEE_INSERT_BATCH]
+                    inserted = len(db.session.execute(EMPLOYEE_TABLE_INSERT, batch).all())
+                    created_count += inserted
+                    duplicate_count += len(batch) - inserted
                 
-            except Exception as e:
-                errors.append({
-                    'employee': emp_data.get('personal', {}).get('first_name', 'Unknown'),
-                    'error': str(e)
-                })
-                failed_count += 1
+                # Commit per chunk so large imports don't hold one long
+                # transaction open
+                db.session.commit()
+                db.session.expunge_all()
+                committed_count = created_count
         
-        db.session.commit()
+        if employees_array is not None and not employees_array.opened:
+            return jsonify({
+                'success': False,
+                'message': 'Invalid data format'
+            }), 400
         
         return jsonify({
             'success': True,
             'message': f'Imported {created_count} employees',
             'created': created_count,
+            'duplicates': duplicate_count,
             'failed': failed_count,
             'errors': errors if errors else None
         }), 201
+    
+    except (ijson.JSONError, orjson.JSONDecodeError) as e:
+        db.session.rollback()
+        return jsonify({
+            'success': False,
+            'message': 'Invalid data format',
+            'created': committed_count,
+            'error': str(e)
+        }), 400
+    
+    except RequestEntityTooLarge:
+        db.session.rollback()
+        return jsonify({
+            'success': False,
+            'message': 'Import too large',
+            'created': committed_count
+        }), 413
         
     except Exception as e:
         db.session.rollback()
-        print(f"Bulk import error: {str(e)}")
+        logger.exception("Bulk import error after %d committed rows", committed_count)
         return jsonify({
             'success': False,
             'message': 'Bulk import failed',
+            'created': committed_count,  # Rows from chunks committed before the failure
             'error': str(e)
-        }), 500
\ No newline at end of file
+        }), 500
@@ -6,17 +6,22 @@ Connected to snappt_compliant_generator.py (DO NOT MODIFY)
 
 from flask import Blueprint, request, jsonify, send_file
 from flask_jwt_extended import jwt_required, get_jwt_identity
-from models import db, User, Employee, Paystub, AuditLog
+from models import db, User, Employee, Paystub, AuditLog, PAYROLL_STATE_GROUP
+from sqlalchemy import func, insert, lambda_stmt, select
+from sqlalchemy.orm import undefer_group
 from utils.tax_calculator import calculate_all_taxes
 from utils.saurellius_multicolor import SaurrelliusMultiThemeGenerator
+from utils.paystub_rollup import schedule_rollup_refresh
 from datetime import datetime, timezone, timedelta
 from decimal import Decimal, ROUND_HALF_UP
 import boto3
 import os
 import hashlib
+import logging
 import uuid
 
 paystubs_bp = Blueprint('paystubs', __name__)
+logger = logging.getLogger(__name__)
 
 # Initialize Saurellius Playwright-based generator
 saurellius_generator = SaurrelliusMultiThemeGenerator()
@@ -140,8 +145,8 @@ def upload_to_s3(file_bytes, key):
         )
         
         return url
-    except Exception as e:
-        print(f"S3 upload error: {str(e)}")
+    except Exception:
+        logger.exception("S3 upload error")
         return None
 
 
@@ -199,13 +204,11 @@ def generate_complete_paystub():
             }), 403
         
         # Get employee
-        employee = Employee.query.filter_by(
-            id=data['employee_id'],
-            user_id=user_id,
-            status='active'
-        ).first()
+        employee = db.session.get(
+            Employee, data['employee_id'], options=[undefer_group(PAYROLL_STATE_GROUP)]
+        )
         
-        if not employee:
+        if employee is None or employee.user_id != user_id or employee.status != 'active':
             return jsonify({'success': False, 'message': 'Employee not found'}), 404
         
         # ====================================================================
@@ -386,7 +389,7 @@ def generate_complete_paystub():
             'employee': {
                 'name': employee.full_name,
                 'state': employee.address_state,
-                'ssn_masked': f"XXX-XX-{employee.ssn_encrypted[-4:]}"
+                'ssn_masked': f"XXX-XX-{employee.ssn_last4 or 'XXXX'}"
             },
             'pay_info': {
                 'period_start': data['pay_info']['period_start'],
@@ -565,7 +568,7 @@ def generate_complete_paystub():
         # AUDIT LOG
         # ====================================================================
         
-        log = AuditLog(
+        db.session.execute(insert(AuditLog).values(
             user_id=user_id,
             action='paystub_generated',
             resource_type='paystub',
@@ -578,10 +581,10 @@ def generate_complete_paystub():
             },
             ip_address=request.remote_addr,
             severity='info'
-        )
-        db.session.add(log)
+        ))
         
         db.session.commit()
+        schedule_rollup_refresh()
         
         return jsonify({
             'success': True,
@@ -609,9 +612,7 @@ def generate_complete_paystub():
         
     except Exception as e:
         db.session.rollback()
-        print(f"Paystub generation error: {str(e)}")
-        import traceback
-        traceback.print_exc()
+        logger.exception("Paystub generation error")
         return jsonify({
             'success': False,
             'message': 'Paystub generation failed',
@@ -630,12 +631,11 @@ def get_ytd_continuation(employee_id):
     try:
         user_id = get_jwt_identity()
         
-        employee = Employee.query.filter_by(
-            id=employee_id,
-            user_id=user_id
-        ).first()
+        employee = db.session.get(
+            Employee, employee_id, options=[undefer_group(PAYROLL_STATE_GROUP)]
+        )
         
-        if not employee:
+        if employee is None or employee.user_id != user_id:
             return jsonify({'success': False, 'message': 'Employee not found'}), 404
         
         # Get last paystub
@@ -679,8 +679,8 @@ def get_ytd_continuation(employee_id):
             }
         }), 200
         
-    except Exception as e:
-        print(f"Get paystubs history error: {str(e)}")
+    except Exception:
+        logger.exception("Get paystubs history error")
         return jsonify({
             'success': False,
             'message': 'Failed to get paystub history'
@@ -766,8 +766,8 @@ def get_paystub(paystub_id):
             }
         }), 200
         
-    except Exception as e:
-        print(f"Get paystub error: {str(e)}")
+    except Exception:
+        logger.exception("Get paystub error")
         return jsonify({
             'success': False,
             'message': 'Failed to get paystub'
@@ -809,8 +809,8 @@ def download_paystub(paystub_id):
             'filename': f"paystub_{paystub.verification_id}.pdf"
         }), 200
         
-    except Exception as e:
-        print(f"Download paystub error: {str(e)}")
+    except Exception:
+        logger.exception("Download paystub error")
         return jsonify({
             'success': False,
             'message': 'Failed to generate download link'
@@ -829,10 +829,9 @@ def void_paystub(paystub_id):
         user_id = get_jwt_identity()
         data = request.get_json()
         
-        paystub = Paystub.query.filter_by(
-            id=paystub_id,
-            user_id=user_id
-        ).first()
+        paystub = db.session.execute(lambda_stmt(
+            lambda: select(Paystub).where(Paystub.id == paystub_id, Paystub.user_id == user_id)
+        )).scalars().first()
         
         if not paystub:
             return jsonify({'success': False, 'message': 'Paystub not found'}), 404
@@ -841,7 +840,9 @@ def void_paystub(paystub_id):
             return jsonify({'success': False, 'message': 'Paystub already voided'}), 400
         
         # Reverse YTD calculations
-        employee = paystub.employee
+        employee = db.session.get(
+            Employee, paystub.employee_id, options=[undefer_group(PAYROLL_STATE_GROUP)]
+        )
         employee.ytd_gross_pay -= Decimal(str(paystub.gross_pay))
         employee.ytd_net_pay -= Decimal(str(paystub.net_pay))
         employee.ytd_federal_tax -= Decimal(str(paystub.federal_income_tax))
@@ -859,36 +860,37 @@ def void_paystub(paystub_id):
         
         # Update paystub status
         paystub.status = 'voided'
-        paystub.voided_at = datetime.now(timezone.utc)
-        paystub.void_reason = data.get('reason', 'User requested void')
+        paystub.voided_at = func.timezone('utc', func.now())  # Stamped by Postgres in the UPDATE
+        void_reason = data.get('reason', 'User requested void')
+        paystub.void_reason = void_reason
         
         # Reverse user usage count
         user = User.query.get(user_id)
         if user.paystubs_used_this_month > 0:
             user.paystubs_used_this_month -= 1
         
-        # Audit log
-        log = AuditLog(
+        # Audit log, committed with the void it records
+        db.session.execute(insert(AuditLog).values(
             user_id=user_id,
             action='paystub_voided',
             resource_type='paystub',
-            resource_id=paystub.id,
-            changes={'reason': paystub.void_reason},
+            resource_id=paystub_id,
+            changes={'reason': void_reason},
             ip_address=request.remote_addr,
             severity='warning'
-        )
-        db.session.add(log)
+        ))
         
         db.session.commit()
+        schedule_rollup_refresh()
         
         return jsonify({
             'success': True,
             'message': 'Paystub voided successfully'
         }), 200
         
-    except Exception as e:
+    except Exception:
         db.session.rollback()
-        print(f"Void paystub error: {str(e)}")
+        logger.exception("Void paystub error")
         return jsonify({
             'success': False,
             'message': 'Failed to void paystub'
@@ -903,9 +905,9 @@ def void_paystub(paystub_id):
 def verify_paystub(verification_id):
     """Verify paystub authenticity (public endpoint)"""
     try:
-        paystub = Paystub.query.filter_by(
-            verification_id=verification_id
-        ).first()
+        paystub = db.session.execute(lambda_stmt(
+            lambda: select(Paystub).where(Paystub.verification_id == verification_id)
+        )).scalars().first()
         
         if not paystub:
             return jsonify({
@@ -940,16 +942,16 @@ def verify_paystub(verification_id):
             }
         }), 200
         
-    except Exception as e:
-        print(f"Verify paystub error: {str(e)}")
+    except Exception:
+        logger.exception("Verify paystub error")
         return jsonify({
             'success': False,
             'verified': False,
             'message': 'Verification failed'
         }), 500
         
-    except Exception as e:
-        print(f"YTD continuation error: {str(e)}")
+    except Exception:
+        logger.exception("YTD continuation error")
         return jsonify({
             'success': False,
             'message': 'Failed to get continuation data'
@@ -971,15 +973,19 @@ def get_paystubs_history():
         offset = request.args.get('offset', 0, type=int)
         employee_id = request.args.get('employee_id', type=int)
         
-        query = Paystub.query.filter_by(user_id=user_id)
+        # Lambda statements cache their compiled SQL keyed on the lambda code,
+        # so repeat calls only bind new parameters
+        stmt = lambda_stmt(lambda: select(Paystub).where(Paystub.user_id == user_id))
         
         if employee_id:
-            query = query.filter_by(employee_id=employee_id)
+            stmt += lambda s: s.where(Paystub.employee_id == employee_id)
+        
+        stmt += lambda s: s.order_by(Paystub.pay_date.desc(), Paystub.id.desc()).limit(limit).offset(offset)
+        paystubs = db.session.execute(stmt).scalars().all()
         
-        paystubs = query.order_by(Paystub.pay_date.desc())\
-            .limit(limit)\
-            .offset(offset)\
-            .all()
+        total = db.session.execute(lambda_stmt(
+            lambda: select(func.count(Paystub.id)).where(Paystub.user_id == user_id)
+        )).scalar()
         
         return jsonify({
             'success': True,
@@ -988,16 +994,16 @@ def get_paystubs_history():
                 'verification_id': stub.verification_id,
                 'employee_id': stub.employee_id,
                 'employee_name': stub.employee.full_name,
-                'pay_date': stub.pay_date.isoformat(),
-                'period_start': stub.period_start.isoformat(),
-                'period_end': stub.period_end.isoformat(),
-                'gross_pay': float(stub.gross_pay),
-                'net_pay': float(stub.net_pay),
+                'pay_date': stub.pay_date,
+                'period_start': stub.period_start,
+                'period_end': stub.period_end,
+                'gross_pay': stub.gross_pay,
+                'net_pay': stub.net_pay,
                 'pdf_url': stub.pdf_url,
                 'verification_status': stub.verification_status,
-                'created_at': stub.created_at.isoformat()
+                'created_at': stub.created_at
             } for stub in paystubs],
-            'total': Paystub.query.filter_by(user_id=user_id).count()
+            'total': total
         }), 200
     except Exception as e:
         return jsonify({'success': False, 'message': str(e)}), 500
\ No newline at end of file
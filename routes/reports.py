@@ -4,17 +4,26 @@ Saurellius Platform - Reports Routes
 Complete reporting system for payroll, taxes, earnings, and PTO
 """
 
-from flask import Blueprint, request, jsonify, send_file
+from flask import Blueprint, Response, request, jsonify, stream_with_context
 from flask_jwt_extended import jwt_required, get_jwt_identity
-from models import db, User, Employee, Paystub
-from sqlalchemy import func, extract
-from datetime import datetime, timezone, timedelta
+from models import db, User, Employee, Paystub, EMPLOYEE_PTO_HOURS_FLOAT
+from sqlalchemy import Float, cast, func, tuple_
+from cachetools import TTLCache
+from datetime import datetime, timezone
 from decimal import Decimal
 import io
 import csv
+import tempfile
+import threading
 
 reports_bp = Blueprint('reports', __name__)
 
+# Index 1-12 -> English month name (report labels were always English)
+_MONTH_NAMES = (
+    '', 'January', 'February', 'March', 'April', 'May', 'June',
+    'July', 'August', 'September', 'October', 'November', 'December'
+)
+
 # ============================================================================
 # PAYROLL SUMMARY REPORT
 # ============================================================================
@@ -46,45 +55,40 @@ def payroll_summary():
                 'message': 'start_date and end_date are required'
             }), 400
         
-        # Query paystubs
-        paystubs = Paystub.query.filter(
-            Paystub.user_id == user_id,
-            Paystub.status == 'finalized',
-            Paystub.pay_date >= start_date,
-            Paystub.pay_date <= end_date
-        ).all()
-        
-        # Calculate totals
-        total_gross = sum([p.gross_pay for p in paystubs])
-        total_net = sum([p.net_pay for p in paystubs])
-        total_taxes = sum([p.total_taxes for p in paystubs])
-        total_deductions = sum([p.total_deductions for p in paystubs])
-        
-        # Breakdown by category
-        federal_tax = sum([p.federal_income_tax for p in paystubs])
-        ss_tax = sum([p.social_security_tax for p in paystubs])
-        medicare_tax = sum([p.medicare_tax for p in paystubs])
-        state_tax = sum([p.state_income_tax for p in paystubs])
-        
-        # Monthly breakdown
-        monthly_data = db.session.query(
-            extract('month', Paystub.pay_date).label('month'),
+        # Monthly rows plus the grand total in one pass: GROUPING SETS
+        # ((month), ()) makes the database aggregate both from one scan
+        month = Paystub.pay_month
+        summary_rows = db.session.query(
+            month.label('month'),
+            func.grouping(month).label('is_total'),
+            func.count(Paystub.id).label('count'),
             func.sum(Paystub.gross_pay).label('gross'),
             func.sum(Paystub.net_pay).label('net'),
             func.sum(Paystub.total_taxes).label('taxes'),
-            func.count(Paystub.id).label('count')
+            func.sum(Paystub.total_deductions).label('deductions'),
+            func.sum(Paystub.federal_income_tax).label('federal'),
+            func.sum(Paystub.social_security_tax).label('ss'),
+            func.sum(Paystub.medicare_tax).label('medicare'),
+            func.sum(Paystub.state_income_tax).label('state')
         ).filter(
             Paystub.user_id == user_id,
             Paystub.status == 'finalized',
             Paystub.pay_date >= start_date,
             Paystub.pay_date <= end_date
-        ).group_by('month').order_by('month').all()
+        ).group_by(
+            func.grouping_sets(tuple_(month), tuple_())
+        ).order_by(month).all()
         
+        # The () set always yields exactly one grand-total row, even when
+        # no paystubs match
         monthly_breakdown = []
-        for row in monthly_data:
+        for row in summary_rows:
+            if row.is_total:
+                totals = row
+                continue
             monthly_breakdown.append({
                 'month': int(row.month),
-                'month_name': datetime(2025, int(row.month), 1).strftime('%B'),
+                'month_name': _MONTH_NAMES[int(row.month)],
                 'gross_pay': float(row.gross or 0),
                 'net_pay': float(row.net or 0),
                 'taxes': float(row.taxes or 0),
@@ -98,17 +102,17 @@ def payroll_summary():
                 'end_date': end_date
             },
             'summary': {
-                'total_paystubs': len(paystubs),
-                'total_gross_pay': float(total_gross),
-                'total_net_pay': float(total_net),
-                'total_taxes': float(total_taxes),
-                'total_deductions': float(total_deductions)
+                'total_paystubs': totals.count,
+                'total_gross_pay': float(totals.gross or 0),
+                'total_net_pay': float(totals.net or 0),
+                'total_taxes': float(totals.taxes or 0),
+                'total_deductions': float(totals.deductions or 0)
             },
             'tax_breakdown': {
-                'federal_income_tax': float(federal_tax),
-                'social_security_tax': float(ss_tax),
-                'medicare_tax': float(medicare_tax),
-                'state_income_tax': float(state_tax)
+                'federal_income_tax': float(totals.federal or 0),
+                'social_security_tax': float(totals.ss or 0),
+                'medicare_tax': float(totals.medicare or 0),
+                'state_income_tax': float(totals.state or 0)
             },
             'monthly_breakdown': monthly_breakdown
         }
@@ -135,6 +139,137 @@ def payroll_summary():
 # TAX SUMMARY REPORT
 # ============================================================================
 
+# Built reports keyed by (user_id, etag); a new etag simply misses, so
+# entries never need explicit invalidation
+TAX_SUMMARY_CACHE_TTL = 300
+_tax_summary_cache = TTLCache(maxsize=1000, ttl=TAX_SUMMARY_CACHE_TTL)
+_tax_summary_cache_lock = threading.Lock()
+
+
+def _tax_summary_etag(user_id, year):
+    """Version stamp for a user's tax summary, from one small aggregate query"""
+    paystub_stamp = db.session.query(
+        func.count(Paystub.id), func.max(Paystub.updated_at)
+    ).filter(
+        Paystub.user_id == user_id,
+        Paystub.pay_year == year
+    ).subquery()
+    employee_stamp = db.session.query(
+        func.max(Employee.updated_at)
+    ).filter(Employee.user_id == user_id).scalar_subquery()
+    
+    count, paystubs_updated, employees_updated = db.session.query(
+        *paystub_stamp.c, employee_stamp
+    ).one()
+    
+    def micros(value):
+        return int(value.timestamp() * 1000000) if value else 0
+    
+    return f"tax-{year}-{count}-{micros(paystubs_updated)}-{micros(employees_updated)}"
+
+
+def _build_tax_summary(user_id, year):
+    # Quarterly rows plus the yearly totals in one statement; the ()
+    # grouping set always yields the year row, even with no paystubs
+    quarter = (Paystub.pay_month + 2) // 3
+    tax_rows = db.session.query(
+        quarter.label('quarter'),
+        func.grouping(quarter).label('is_total'),
+        func.sum(Paystub.federal_income_tax).label('federal'),
+        func.sum(Paystub.social_security_tax).label('ss'),
+        func.sum(Paystub.medicare_tax).label('medicare'),
+        func.sum(Paystub.state_income_tax).label('state'),
+        func.sum(Paystub.state_disability_tax).label('sdi'),
+        func.sum(Paystub.local_income_tax).label('local'),
+        func.sum(Paystub.total_taxes).label('total'),
+        func.sum(Paystub.gross_pay).label('gross')
+    ).filter(
+        Paystub.user_id == user_id,
+        Paystub.status == 'finalized',
+        Paystub.pay_year == year
+    ).group_by(
+        func.grouping_sets(tuple_(quarter), tuple_())
+    ).all()
+    
+    by_quarter = {}
+    for row in tax_rows:
+        if row.is_total:
+            tax_summary_data = row
+        else:
+            by_quarter[int(row.quarter)] = row
+    
+    # Quarterly breakdown; quarters without paystubs report zeros
+    quarterly = []
+    for quarter_number in range(1, 5):
+        q_data = by_quarter.get(quarter_number)
+        total_taxes = float(q_data.total or 0) if q_data else 0.0
+        gross_pay = float(q_data.gross or 0) if q_data else 0.0
+        quarterly.append({
+            'quarter': quarter_number,
+            'period': f'Q{quarter_number} {year}',
+            'total_taxes': total_taxes,
+            'gross_pay': gross_pay,
+            'federal': float(q_data.federal or 0) if q_data else 0.0,
+            'social_security': float(q_data.ss or 0) if q_data else 0.0,
+            'medicare': float(q_data.medicare or 0) if q_data else 0.0,
+            'state': float(q_data.state or 0) if q_data else 0.0,
+            'effective_rate': round((total_taxes / (gross_pay or 1)) * 100, 2)
+        })
+    
+    # Employee breakdown
+    employee_taxes = db.session.query(
+        Employee.id,
+        Employee.full_name,
+        # Summed as float8 in SQL; the driver hands back floats instead
+        # of a Decimal per cell that would only be converted here
+        cast(func.sum(Paystub.federal_income_tax), Float).label('federal'),
+        cast(func.sum(Paystub.social_security_tax), Float).label('ss'),
+        cast(func.sum(Paystub.medicare_tax), Float).label('medicare'),
+        cast(func.sum(Paystub.state_income_tax), Float).label('state'),
+        cast(func.sum(Paystub.total_taxes), Float).label('total')
+    ).join(
+        Paystub, Paystub.employee_id == Employee.id
+    ).filter(
+        Employee.user_id == user_id,
+        Paystub.status == 'finalized',
+        Paystub.pay_year == year
+    ).group_by(
+        Employee.id, Employee.full_name
+    ).all()
+    
+    employee_breakdown = []
+    for emp in employee_taxes:
+        employee_breakdown.append({
+            'employee_id': emp.id,
+            'employee_name': emp.full_name,
+            'federal_tax': emp.federal or 0.0,
+            'social_security': emp.ss or 0.0,
+            'medicare': emp.medicare or 0.0,
+            'state_tax': emp.state or 0.0,
+            'total_taxes': emp.total or 0.0
+        })
+    
+    report_data = {
+        'report_type': 'Tax Summary',
+        'year': year,
+        'summary': {
+            'total_gross_pay': float(tax_summary_data.gross or 0),
+            'total_taxes': float(tax_summary_data.total or 0),
+            'effective_tax_rate': round((float(tax_summary_data.total or 0) / float(tax_summary_data.gross or 1)) * 100, 2),
+            'federal_income_tax': float(tax_summary_data.federal or 0),
+            'social_security': float(tax_summary_data.ss or 0),
+            'medicare': float(tax_summary_data.medicare or 0),
+            'state_income_tax': float(tax_summary_data.state or 0),
+            'state_disability': float(tax_summary_data.sdi or 0),
+            'local_income_tax': float(tax_summary_data.local or 0)
+        },
+        'quarterly_breakdown': quarterly,
+        'employee_breakdown': employee_breakdown
+    }
+    
+    return report_data
+
+
 @reports_bp.route('/api/reports/tax-summary', methods=['GET'])
 @jwt_required()
 def tax_summary():
@@ -149,121 +284,32 @@ def tax_summary():
         year = request.args.get('year', datetime.now().year, type=int)
         format_type = request.args.get('format', 'json')
         
-        year_start = datetime(year, 1, 1).date()
-        year_end = datetime(year, 12, 31).date()
-        
-        # Get tax totals by type
-        tax_summary_data = db.session.query(
-            func.sum(Paystub.federal_income_tax).label('federal'),
-            func.sum(Paystub.social_security_tax).label('ss'),
-            func.sum(Paystub.medicare_tax).label('medicare'),
-            func.sum(Paystub.state_income_tax).label('state'),
-            func.sum(Paystub.state_disability_tax).label('sdi'),
-            func.sum(Paystub.local_income_tax).label('local'),
-            func.sum(Paystub.total_taxes).label('total'),
-            func.sum(Paystub.gross_pay).label('gross')
-        ).filter(
-            Paystub.user_id == user_id,
-            Paystub.status == 'finalized',
-            Paystub.pay_date >= year_start,
-            Paystub.pay_date <= year_end
-        ).first()
-        
-        # Quarterly breakdown
-        quarterly = []
-        for quarter in range(1, 5):
-            q_start = datetime(year, (quarter-1)*3 + 1, 1).date()
-            if quarter == 4:
-                q_end = year_end
-            else:
-                q_end_month = quarter * 3
-                next_month = datetime(year, q_end_month, 1) + timedelta(days=32)
-                q_end = next_month.replace(day=1) - timedelta(days=1)
-            
-            q_data = db.session.query(
-                func.sum(Paystub.total_taxes).label('total_taxes'),
-                func.sum(Paystub.gross_pay).label('gross_pay'),
-                func.sum(Paystub.federal_income_tax).label('federal'),
-                func.sum(Paystub.social_security_tax).label('ss'),
-                func.sum(Paystub.medicare_tax).label('medicare'),
-                func.sum(Paystub.state_income_tax).label('state')
-            ).filter(
-                Paystub.user_id == user_id,
-                Paystub.status == 'finalized',
-                Paystub.pay_date >= q_start,
-                Paystub.pay_date <= q_end
-            ).first()
-            
-            quarterly.append({
-                'quarter': quarter,
-                'period': f'Q{quarter} {year}',
-                'total_taxes': float(q_data.total_taxes or 0),
-                'gross_pay': float(q_data.gross_pay or 0),
-                'federal': float(q_data.federal or 0),
-                'social_security': float(q_data.ss or 0),
-                'medicare': float(q_data.medicare or 0),
-                'state': float(q_data.state or 0),
-                'effective_rate': round((float(q_data.total_taxes or 0) / float(q_data.gross_pay or 1)) * 100, 2)
-            })
-        
-        # Employee breakdown
-        employee_taxes = db.session.query(
-            Employee.id,
-            Employee.first_name,
-            Employee.last_name,
-            func.sum(Paystub.federal_income_tax).label('federal'),
-            func.sum(Paystub.social_security_tax).label('ss'),
-            func.sum(Paystub.medicare_tax).label('medicare'),
-            func.sum(Paystub.state_income_tax).label('state'),
-            func.sum(Paystub.total_taxes).label('total')
-        ).join(
-            Paystub, Paystub.employee_id == Employee.id
-        ).filter(
-            Employee.user_id == user_id,
-            Paystub.status == 'finalized',
-            Paystub.pay_date >= year_start,
-            Paystub.pay_date <= year_end
-        ).group_by(
-            Employee.id, Employee.first_name, Employee.last_name
-        ).all()
-        
-        employee_breakdown = []
-        for emp in employee_taxes:
-            employee_breakdown.append({
-                'employee_id': emp.id,
-                'employee_name': f"{emp.first_name} {emp.last_name}",
-                'federal_tax': float(emp.federal or 0),
-                'social_security': float(emp.ss or 0),
-                'medicare': float(emp.medicare or 0),
-                'state_tax': float(emp.state or 0),
-                'total_taxes': float(emp.total or 0)
-            })
-        
-        report_data = {
-            'report_type': 'Tax Summary',
-            'year': year,
-            'summary': {
-                'total_gross_pay': float(tax_summary_data.gross or 0),
-                'total_taxes': float(tax_summary_data.total or 0),
-                'effective_tax_rate': round((float(tax_summary_data.total or 0) / float(tax_summary_data.gross or 1)) * 100, 2),
-                'federal_income_tax': float(tax_summary_data.federal or 0),
-                'social_security': float(tax_summary_data.ss or 0),
-                'medicare': float(tax_summary_data.medicare or 0),
-                'state_income_tax': float(tax_summary_data.state or 0),
-                'state_disability': float(tax_summary_data.sdi or 0),
-                'local_income_tax': float(tax_summary_data.local or 0)
-            },
-            'quarterly_breakdown': quarterly,
-            'employee_breakdown': employee_breakdown
-        }
+        # Cheap version probe: paystub changes (including voids, which bump
+        # updated_at) and employee renames all move the stamp
+        etag = _tax_summary_etag(user_id, year)
+        if format_type != 'csv' and request.if_none_match.contains_weak(etag):
+            response = Response(status=304)
+            response.set_etag(etag, weak=True)
+            return response
+        
+        cache_key = (user_id, etag)
+        with _tax_summary_cache_lock:
+            report_data = _tax_summary_cache.get(cache_key)
+        if report_data is None:
+            report_data = _build_tax_summary(user_id, year)
+            with _tax_summary_cache_lock:
+                _tax_summary_cache[cache_key] = report_data
         
         if format_type == 'csv':
             return generate_csv_report(report_data, 'tax_summary')
         
-        return jsonify({
+        response = jsonify({
             'success': True,
             'report': report_data
-        }), 200
+        })
+        response.set_etag(etag, weak=True)
+        response.headers['Cache-Control'] = 'private, must-revalidate'
+        return response, 200
         
     except Exception as e:
         print(f"Tax summary error: {str(e)}")
@@ -300,8 +346,7 @@ def employee_earnings():
         # Build query
         query = db.session.query(
             Employee.id,
-            Employee.first_name,
-            Employee.last_name,
+            Employee.full_name,
             Employee.job_title,
             Employee.address_state,
             Employee.ytd_gross_pay,
@@ -310,17 +355,24 @@ def employee_earnings():
             Employee.ytd_ss_tax,
             Employee.ytd_medicare_tax,
             Employee.ytd_state_tax,
+            (
+                Employee.ytd_federal_tax + Employee.ytd_ss_tax +
+                Employee.ytd_medicare_tax + Employee.ytd_state_tax
+            ).label('ytd_total_tax'),
             func.count(Paystub.id).label('paystub_count'),
             func.sum(Paystub.regular_pay).label('regular_earnings'),
             func.sum(Paystub.overtime_pay).label('overtime_earnings'),
-            func.sum(Paystub.bonus).label('bonus_earnings')
+            func.sum(Paystub.bonus).label('bonus_earnings'),
+            # Report-wide totals, repeated on every row by the window
+            func.sum(Employee.ytd_gross_pay).over().label('total_ytd_gross'),
+            func.sum(Employee.ytd_net_pay).over().label('total_ytd_net')
         ).outerjoin(
             Paystub, Paystub.employee_id == Employee.id
         ).filter(
             Employee.user_id == user_id,
             Employee.status == 'active'
         ).group_by(
-            Employee.id, Employee.first_name, Employee.last_name,
+            Employee.id, Employee.full_name,
             Employee.job_title, Employee.address_state,
             Employee.ytd_gross_pay, Employee.ytd_net_pay,
             Employee.ytd_federal_tax, Employee.ytd_ss_tax,
@@ -330,13 +382,33 @@ def employee_earnings():
         if employee_id:
             query = query.filter(Employee.id == employee_id)
         
-        employees = query.all()
-        
+        if format_type == 'csv':
+            # Same rows, formatted by Postgres and streamed out through COPY
+            csv_query = query.with_entities(
+                Employee.full_name,
+                Employee.job_title,
+                Employee.address_state,
+                _sql_money(Employee.ytd_gross_pay),
+                _sql_money(Employee.ytd_net_pay),
+                _sql_money(func.sum(Paystub.regular_pay)),
+                _sql_money(func.sum(Paystub.overtime_pay)),
+                _sql_money(func.sum(Paystub.bonus)),
+                func.count(Paystub.id)
+            )
+            return _copy_csv_response(csv_query, (
+                _EARNINGS_TITLE, ('Year:', year), (), _EARNINGS_COLUMNS
+            ), 'employee_earnings')
+        
+        # Stream rows from a server-side cursor while building the list
         earnings_report = []
-        for emp in employees:
+        total_ytd_gross = total_ytd_net = 0
+        for emp in query.yield_per(500):
+            if not earnings_report:
+                total_ytd_gross = float(emp.total_ytd_gross)
+                total_ytd_net = float(emp.total_ytd_net)
             earnings_report.append({
                 'employee_id': emp.id,
-                'employee_name': f"{emp.first_name} {emp.last_name}",
+                'employee_name': emp.full_name,
                 'job_title': emp.job_title,
                 'state': emp.address_state,
                 'ytd_gross': float(emp.ytd_gross_pay),
@@ -346,7 +418,7 @@ def employee_earnings():
                     'social_security': float(emp.ytd_ss_tax),
                     'medicare': float(emp.ytd_medicare_tax),
                     'state': float(emp.ytd_state_tax),
-                    'total': float(emp.ytd_federal_tax + emp.ytd_ss_tax + emp.ytd_medicare_tax + emp.ytd_state_tax)
+                    'total': float(emp.ytd_total_tax)
                 },
                 'earnings_breakdown': {
                     'regular': float(emp.regular_earnings or 0),
@@ -360,14 +432,11 @@ def employee_earnings():
             'report_type': 'Employee Earnings',
             'year': year,
             'employee_count': len(earnings_report),
-            'total_ytd_gross': sum([e['ytd_gross'] for e in earnings_report]),
-            'total_ytd_net': sum([e['ytd_net'] for e in earnings_report]),
+            'total_ytd_gross': total_ytd_gross,
+            'total_ytd_net': total_ytd_net,
             'employees': earnings_report
         }
         
-        if format_type == 'csv':
-            return generate_csv_report(report_data, 'employee_earnings')
-        
         return jsonify({
             'success': True,
             'report': report_data
@@ -404,19 +473,10 @@ def pto_report():
         # Build query
         query = db.session.query(
             Employee.id,
-            Employee.first_name,
-            Employee.last_name,
+            Employee.full_name,
             Employee.job_title,
             Employee.hire_date,
-            Employee.vacation_hours_accrued,
-            Employee.vacation_hours_used,
-            Employee.vacation_hours_balance,
-            Employee.sick_hours_accrued,
-            Employee.sick_hours_used,
-            Employee.sick_hours_balance,
-            Employee.personal_hours_accrued,
-            Employee.personal_hours_used,
-            Employee.personal_hours_balance,
+            *EMPLOYEE_PTO_HOURS_FLOAT,
             Employee.pto_accrual_rate
         ).filter(
             Employee.user_id == user_id,
@@ -426,33 +486,49 @@ def pto_report():
         if employee_id:
             query = query.filter(Employee.id == employee_id)
         
-        employees = query.all()
-        
+        if format_type == 'csv':
+            # Same rows, formatted by Postgres and streamed out through COPY
+            csv_query = query.with_entities(
+                Employee.full_name,
+                Employee.job_title,
+                _sql_hours(Employee.vacation_hours_balance),
+                _sql_hours(Employee.sick_hours_balance),
+                _sql_hours(Employee.personal_hours_balance),
+                _sql_hours(
+                    Employee.vacation_hours_balance + Employee.sick_hours_balance +
+                    Employee.personal_hours_balance
+                )
+            )
+            return _copy_csv_response(csv_query, (
+                _PTO_TITLE, ('Generated:', datetime.now(timezone.utc).isoformat()), (), _PTO_COLUMNS
+            ), 'pto_report')
+        
+        # Stream rows from a server-side cursor while building the list
         pto_data = []
-        for emp in employees:
-            total_accrued = float(emp.vacation_hours_accrued + emp.sick_hours_accrued + emp.personal_hours_accrued)
-            total_used = float(emp.vacation_hours_used + emp.sick_hours_used + emp.personal_hours_used)
-            total_balance = float(emp.vacation_hours_balance + emp.sick_hours_balance + emp.personal_hours_balance)
+        for emp in query.yield_per(500):
+            total_accrued = emp.vacation_hours_accrued + emp.sick_hours_accrued + emp.personal_hours_accrued
+            total_used = emp.vacation_hours_used + emp.sick_hours_used + emp.personal_hours_used
+            total_balance = emp.vacation_hours_balance + emp.sick_hours_balance + emp.personal_hours_balance
             
             pto_data.append({
                 'employee_id': emp.id,
-                'employee_name': f"{emp.first_name} {emp.last_name}",
+                'employee_name': emp.full_name,
                 'job_title': emp.job_title,
                 'hire_date': emp.hire_date.isoformat(),
                 'vacation': {
-                    'accrued': float(emp.vacation_hours_accrued),
-                    'used': float(emp.vacation_hours_used),
-                    'balance': float(emp.vacation_hours_balance)
+                    'accrued': emp.vacation_hours_accrued,
+                    'used': emp.vacation_hours_used,
+                    'balance': emp.vacation_hours_balance
                 },
                 'sick': {
-                    'accrued': float(emp.sick_hours_accrued),
-                    'used': float(emp.sick_hours_used),
-                    'balance': float(emp.sick_hours_balance)
+                    'accrued': emp.sick_hours_accrued,
+                    'used': emp.sick_hours_used,
+                    'balance': emp.sick_hours_balance
                 },
                 'personal': {
-                    'accrued': float(emp.personal_hours_accrued),
-                    'used': float(emp.personal_hours_used),
-                    'balance': float(emp.personal_hours_balance)
+                    'accrued': emp.personal_hours_accrued,
+                    'used': emp.personal_hours_used,
+                    'balance': emp.personal_hours_balance
                 },
                 'totals': {
                     'accrued': total_accrued,
@@ -470,9 +546,6 @@ def pto_report():
             'employees': pto_data
         }
         
-        if format_type == 'csv':
-            return generate_csv_report(report_data, 'pto_report')
-        
         return jsonify({
             'success': True,
             'report': report_data
@@ -492,104 +565,169 @@ def pto_report():
 # CSV EXPORT HELPER
 # ============================================================================
 
-def generate_csv_report(report_data, report_type):
-    """Generate CSV file from report data"""
+# Buffered CSV text is flushed to the client once it reaches this size
+CSV_FLUSH_BYTES = 64 * 1024
+
+# COPY exports are held in memory up to this size, then spooled to disk
+CSV_SPOOL_BYTES = 1024 * 1024
+
+# to_char() patterns matching the Python money/hours formatting
+SQL_MONEY_FORMAT = 'FM999,999,999,990.00'
+SQL_HOURS_FORMAT = 'FM999999990.00'
+
+# Money cells in the summary CSVs
+_format_money = '${:,.2f}'.format
+
+# Static CSV title/section/header rows, shared by every export
+_PAYROLL_SUMMARY_TITLE = ('Payroll Summary Report',)
+_TAX_SUMMARY_TITLE = ('Tax Summary Report',)
+_SUMMARY_SECTION = ((), ('Summary',))
+_PAYROLL_MONTHLY_SECTION = (
+    (),
+    ('Monthly Breakdown',),
+    ('Month', 'Gross Pay', 'Net Pay', 'Taxes', 'Paystub Count')
+)
+_TAX_QUARTERLY_SECTION = (
+    (),
+    ('Quarterly Breakdown',),
+    ('Quarter', 'Gross Pay', 'Total Taxes', 'Federal', 'Social Security', 'Medicare', 'State', 'Rate')
+)
+_EARNINGS_TITLE = ('Employee Earnings Report',)
+_EARNINGS_COLUMNS = ('Employee Name', 'Job Title', 'State', 'YTD Gross', 'YTD Net', 'Regular', 'Overtime', 'Bonus', 'Paystub Count')
+_PTO_TITLE = ('PTO Report',)
+_PTO_COLUMNS = ('Employee Name', 'Job Title', 'Vacation Balance', 'Sick Balance', 'Personal Balance', 'Total Balance')
+
+
+def _csv_response(rows, report_type):
+    """
+    Stream an iterable of CSV rows as a file download.
+    
+    Rows are written and sent as they are produced, so row sources backed
+    by a server-side cursor never hold the whole report in memory.
+    """
+    def generate():
+        output = io.BytesIO()
+        # Rows are UTF-8 encoded as they are written, so each flushed chunk
+        # is already bytes rather than a str to be encoded again
+        text = io.TextIOWrapper(output, encoding='utf-8', newline='', write_through=True)
+        writer = csv.writer(text)
+        for row in rows:
+            writer.writerow(row)
+            if output.tell() >= CSV_FLUSH_BYTES:
+                yield output.getvalue()
+                output.seek(0)
+                output.truncate()
+        yield output.getvalue()
+    
+    filename = f'{report_type}_{datetime.now().strftime("%Y%m%d")}.csv'
+    return Response(
+        stream_with_context(generate()),
+        mimetype='text/csv',
+        headers={'Content-Disposition': f'attachment; filename={filename}'}
+    )
+
+
+def _sql_money(expr):
+    """SQL equivalent of f"${value:,.2f}" """
+    return func.concat('$', func.to_char(func.coalesce(expr, 0), SQL_MONEY_FORMAT))
+
+
+def _sql_hours(expr):
+    """SQL equivalent of f"{value:.2f}" """
+    return func.to_char(expr, SQL_HOURS_FORMAT)
+
+
+def _copy_csv_response(query, preamble, report_type):
+    """
+    Export a query as a CSV download using COPY ... TO STDOUT.
+    
+    Postgres formats every cell, so no rows or Decimals are built in
+    Python. psycopg2 can only COPY into a file object, so the output is
+    spooled (to disk past CSV_SPOOL_BYTES) and then streamed to the client
+    after the preamble rows.
+    """
+    # COPY terminates rows with \n; match it in the preamble
+    output = io.StringIO()
+    csv.writer(output, lineterminator='\n').writerows(preamble)
+    head = output.getvalue().encode()
+    
+    compiled = query.statement.compile(dialect=db.session.get_bind().dialect)
+    spool = tempfile.SpooledTemporaryFile(max_size=CSV_SPOOL_BYTES)
+    cursor = db.session.connection().connection.cursor()
     try:
-        output = io.StringIO()
-        writer = csv.writer(output)
-        
-        if report_type == 'payroll_summary':
-            writer.writerow(['Payroll Summary Report'])
-            writer.writerow(['Period:', f"{report_data['period']['start_date']} to {report_data['period']['end_date']}"])
-            writer.writerow([])
-            writer.writerow(['Summary'])
-            writer.writerow(['Total Paystubs', report_data['summary']['total_paystubs']])
-            writer.writerow(['Total Gross Pay', f"${report_data['summary']['total_gross_pay']:,.2f}"])
-            writer.writerow(['Total Net Pay', f"${report_data['summary']['total_net_pay']:,.2f}"])
-            writer.writerow(['Total Taxes', f"${report_data['summary']['total_taxes']:,.2f}"])
-            writer.writerow([])
-            writer.writerow(['Monthly Breakdown'])
-            writer.writerow(['Month', 'Gross Pay', 'Net Pay', 'Taxes', 'Paystub Count'])
-            for month in report_data['monthly_breakdown']:
-                writer.writerow([
-                    month['month_name'],
-                    f"${month['gross_pay']:,.2f}",
-                    f"${month['net_pay']:,.2f}",
-                    f"${month['taxes']:,.2f}",
-                    month['paystub_count']
-                ])
-        
-        elif report_type == 'tax_summary':
-            writer.writerow(['Tax Summary Report'])
-            writer.writerow(['Year:', report_data['year']])
-            writer.writerow([])
-            writer.writerow(['Summary'])
-            writer.writerow(['Total Gross Pay', f"${report_data['summary']['total_gross_pay']:,.2f}"])
-            writer.writerow(['Total Taxes', f"${report_data['summary']['total_taxes']:,.2f}"])
-            writer.writerow(['Effective Tax Rate', f"{report_data['summary']['effective_tax_rate']}%"])
-            writer.writerow([])
-            writer.writerow(['Quarterly Breakdown'])
-            writer.writerow(['Quarter', 'Gross Pay', 'Total Taxes', 'Federal', 'Social Security', 'Medicare', 'State', 'Rate'])
-            for q in report_data['quarterly_breakdown']:
-                writer.writerow([
-                    q['period'],
-                    f"${q['gross_pay']:,.2f}",
-                    f"${q['total_taxes']:,.2f}",
-                    f"${q['federal']:,.2f}",
-                    f"${q['social_security']:,.2f}",
-                    f"${q['medicare']:,.2f}",
-                    f"${q['state']:,.2f}",
-                    f"{q['effective_rate']}%"
-                ])
-        
-        elif report_type == 'employee_earnings':
-            writer.writerow(['Employee Earnings Report'])
-            writer.writerow(['Year:', report_data['year']])
-            writer.writerow([])
-            writer.writerow(['Employee Name', 'Job Title', 'State', 'YTD Gross', 'YTD Net', 'Regular', 'Overtime', 'Bonus', 'Paystub Count'])
-            for emp in report_data['employees']:
-                writer.writerow([
-                    emp['employee_name'],
-                    emp['job_title'],
-                    emp['state'],
-                    f"${emp['ytd_gross']:,.2f}",
-                    f"${emp['ytd_net']:,.2f}",
-                    f"${emp['earnings_breakdown']['regular']:,.2f}",
-                    f"${emp['earnings_breakdown']['overtime']:,.2f}",
-                    f"${emp['earnings_breakdown']['bonus']:,.2f}",
-                    emp['paystub_count']
-                ])
-        
-        elif report_type == 'pto_report':
-            writer.writerow(['PTO Report'])
-            writer.writerow(['Generated:', report_data['generated_at']])
-            writer.writerow([])
-            writer.writerow(['Employee Name', 'Job Title', 'Vacation Balance', 'Sick Balance', 'Personal Balance', 'Total Balance'])
-            for emp in report_data['employees']:
-                writer.writerow([
-                    emp['employee_name'],
-                    emp['job_title'],
-                    f"{emp['vacation']['balance']:.2f}",
-                    f"{emp['sick']['balance']:.2f}",
-                    f"{emp['personal']['balance']:.2f}",
-                    f"{emp['totals']['balance']:.2f}"
-                ])
-        
-        # Prepare response
-        output.seek(0)
-        return send_file(
-            io.BytesIO(output.getvalue().encode('utf-8')),
-            mimetype='text/csv',
-            as_attachment=True,
-            download_name=f'{report_type}_{datetime.now().strftime("%Y%m%d")}.csv'
-        )
-        
-    except Exception as e:
-        print(f"CSV generation error: {str(e)}")
-        return jsonify({
-            'success': False,
-            'message': 'Failed to generate CSV'
-        }), 500
+        select_sql = cursor.mogrify(str(compiled), compiled.params).decode()
+        cursor.copy_expert(f"COPY ({select_sql}) TO STDOUT WITH CSV", spool)
+    except Exception:
+        spool.close()
+        raise
+    finally:
+        cursor.close()
+    spool.seek(0)
+    
+    def generate():
+        with spool:
+            yield head
+            while chunk := spool.read(CSV_FLUSH_BYTES):
+                yield chunk
+    
+    filename = f'{report_type}_{datetime.now().strftime("%Y%m%d")}.csv'
+    return Response(
+        generate(),
+        mimetype='text/csv',
+        headers={'Content-Disposition': f'attachment; filename={filename}'}
+    )
+
+
+def _payroll_summary_csv_rows(report_data):
+    yield _PAYROLL_SUMMARY_TITLE
+    yield ['Period:', f"{report_data['period']['start_date']} to {report_data['period']['end_date']}"]
+    yield from _SUMMARY_SECTION
+    yield ['Total Paystubs', report_data['summary']['total_paystubs']]
+    yield ['Total Gross Pay', _format_money(report_data['summary']['total_gross_pay'])]
+    yield ['Total Net Pay', _format_money(report_data['summary']['total_net_pay'])]
+    yield ['Total Taxes', _format_money(report_data['summary']['total_taxes'])]
+    yield from _PAYROLL_MONTHLY_SECTION
+    for month in report_data['monthly_breakdown']:
+        yield [
+            month['month_name'],
+            _format_money(month['gross_pay']),
+            _format_money(month['net_pay']),
+            _format_money(month['taxes']),
+            month['paystub_count']
+        ]
+
+
+def _tax_summary_csv_rows(report_data):
+    yield _TAX_SUMMARY_TITLE
+    yield ['Year:', report_data['year']]
+    yield from _SUMMARY_SECTION
+    yield ['Total Gross Pay', _format_money(report_data['summary']['total_gross_pay'])]
+    yield ['Total Taxes', _format_money(report_data['summary']['total_taxes'])]
+    yield ['Effective Tax Rate', f"{report_data['summary']['effective_tax_rate']}%"]
+    yield from _TAX_QUARTERLY_SECTION
+    for q in report_data['quarterly_breakdown']:
+        yield [
+            q['period'],
+            _format_money(q['gross_pay']),
+            _format_money(q['total_taxes']),
+            _format_money(q['federal']),
+            _format_money(q['social_security']),
+            _format_money(q['medicare']),
+            _format_money(q['state']),
+            f"{q['effective_rate']}%"
+        ]
+
+
+# report_type -> row generator for the aggregated summary exports
+_SUMMARY_CSV_ROWS = {
+    'payroll_summary': _payroll_summary_csv_rows,
+    'tax_summary': _tax_summary_csv_rows
+}
+
+
+def generate_csv_report(report_data, report_type):
+    """Generate CSV file from an aggregated (payroll/tax summary) report"""
+    return _csv_response(_SUMMARY_CSV_ROWS[report_type](report_data), report_type)
 
 
 # ============================================================================
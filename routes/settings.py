@@ -7,10 +7,128 @@ Company settings, account preferences, notifications, subscription management
 from flask import Blueprint, request, jsonify
 from flask_jwt_extended import jwt_required, get_jwt_identity
 from models import db, User, AuditLog
+from sqlalchemy import insert
+from sqlalchemy.orm import load_only
+from cachetools import TTLCache
+from blake3 import blake3
 from datetime import datetime, timezone
+import logging
 import os
+import threading
 
 settings_bp = Blueprint('settings', __name__)
+logger = logging.getLogger(__name__)
+
+# ============================================================================
+# SETTINGS CACHE
+# ============================================================================
+
+# Dashboards poll the settings GETs, so responses are memoized per user for a
+# few seconds. The matching PUT drops the entry in this worker; other workers
+# and out-of-band writers (Stripe webhooks, 2FA setup) are at most
+# SETTINGS_CACHE_TTL seconds stale.
+SETTINGS_CACHE_TTL = 5
+
+_settings_cache = TTLCache(maxsize=10000, ttl=SETTINGS_CACHE_TTL)
+_settings_cache_lock = threading.Lock()
+
+
+def _get_cached_settings(section, user_id):
+    with _settings_cache_lock:
+        return _settings_cache.get((section, user_id))
+
+
+def _cache_settings(section, user_id, payload):
+    with _settings_cache_lock:
+        _settings_cache[(section, user_id)] = payload
+
+
+def _invalidate_cached_settings(section, user_id):
+    with _settings_cache_lock:
+        _settings_cache.pop((section, user_id), None)
+
+
+# ============================================================================
+# RESPONSE PAYLOADS & CHANGE DETECTION
+# ============================================================================
+
+# Request key -> User attribute for each editable section
+COMPANY_FIELDS = {
+    'name': 'company_name',
+    'ein': 'company_ein',
+    'address': 'company_address',
+    'phone': 'company_phone',
+    'logo_url': 'company_logo_url'
+}
+ACCOUNT_FIELDS = {
+    'name': 'name',
+    'email': 'email',
+    'phone': 'phone',
+    'timezone': 'timezone',
+    'locale': 'locale'
+}
+NOTIFICATION_FIELDS = {
+    'email': 'notification_email',
+    'sms': 'notification_sms',
+    'push': 'notification_push',
+    'marketing': 'notification_marketing'
+}
+PREFERENCE_FIELDS = {
+    'default_template': 'default_template',
+    'auto_calculate_taxes': 'auto_calculate_taxes',
+    'require_2fa_for_paystubs': 'require_2fa_for_paystubs',
+    'theme_preference': 'theme_preference'
+}
+
+
+def _has_changes(user, data, fields):
+    """True if any submitted field differs from the user's current value"""
+    return any(
+        key in data and data[key] != getattr(user, attr)
+        for key, attr in fields.items()
+    )
+
+
+def _company_payload(user):
+    return {
+        'name': user.company_name,
+        'ein': user.company_ein,
+        'address': user.company_address,
+        'phone': user.company_phone,
+        'logo_url': user.company_logo_url
+    }
+
+
+def _account_payload(user):
+    return {
+        'name': user.name,
+        'email': user.email,
+        'phone': user.phone,
+        'timezone': user.timezone,
+        'locale': user.locale,
+        'email_verified': user.email_verified,
+        'phone_verified': user.phone_verified,
+        'two_factor_enabled': user.two_factor_enabled
+    }
+
+
+def _notifications_payload(user):
+    return {
+        'email': user.notification_email,
+        'sms': user.notification_sms,
+        'push': user.notification_push,
+        'marketing': user.notification_marketing
+    }
+
+
+def _preferences_payload(user):
+    return {
+        'default_template': user.default_template,
+        'auto_calculate_taxes': user.auto_calculate_taxes,
+        'require_2fa_for_paystubs': user.require_2fa_for_paystubs,
+        'theme_preference': user.theme_preference
+    }
+
 
 # ============================================================================
 # COMPANY SETTINGS
@@ -26,24 +144,22 @@ def get_company_settings():
     """
     try:
         user_id = get_jwt_identity()
+        cached = _get_cached_settings('company', user_id)
+        if cached is not None:
+            return jsonify({'success': True, 'company': cached}), 200
+        
         user = User.query.get(user_id)
         
         if not user:
             return jsonify({'success': False, 'message': 'User not found'}), 404
         
-        return jsonify({
-            'success': True,
-            'company': {
-                'name': user.company_name,
-                'ein': user.company_ein,
-                'address': user.company_address,
-                'phone': user.company_phone,
-                'logo_url': user.company_logo_url
-            }
-        }), 200
+        company = _company_payload(user)
+        _cache_settings('company', user_id, company)
+        
+        return jsonify({'success': True, 'company': company}), 200
         
-    except Exception as e:
-        print(f"Get company settings error: {str(e)}")
+    except Exception:
+        logger.exception("Get company settings error")
         return jsonify({
             'success': False,
             'message': 'Failed to get company settings'
@@ -73,6 +189,15 @@ def update_company_settings():
         if not user:
             return jsonify({'success': False, 'message': 'User not found'}), 404
         
+        # Forms resubmit every field; skip the commit, audit row and cache
+        # invalidation when nothing actually changed
+        if not _has_changes(user, data, COMPANY_FIELDS):
+            return jsonify({
+                'success': True,
+                'message': 'Company settings updated successfully',
+                'company': _company_payload(user)
+            }), 200
+        
         # Track changes
         changes = {}
         
@@ -97,35 +222,27 @@ def update_company_settings():
             user.company_logo_url = data['logo_url']
             changes['company_logo'] = 'updated'
         
-        db.session.commit()
-        
-        # Audit log
-        log = AuditLog(
+        # Audit row rides in the same transaction as the update
+        db.session.execute(insert(AuditLog).values(
             user_id=user_id,
             action='company_settings_updated',
             resource_type='settings',
             changes=changes,
             ip_address=request.remote_addr,
             severity='info'
-        )
-        db.session.add(log)
+        ))
         db.session.commit()
+        _invalidate_cached_settings('company', user_id)
         
         return jsonify({
             'success': True,
             'message': 'Company settings updated successfully',
-            'company': {
-                'name': user.company_name,
-                'ein': user.company_ein,
-                'address': user.company_address,
-                'phone': user.company_phone,
-                'logo_url': user.company_logo_url
-            }
+            'company': _company_payload(user)
         }), 200
         
-    except Exception as e:
+    except Exception:
         db.session.rollback()
-        print(f"Update company settings error: {str(e)}")
+        logger.exception("Update company settings error")
         return jsonify({
             'success': False,
             'message': 'Failed to update company settings'
@@ -146,27 +263,22 @@ def get_account_settings():
     """
     try:
         user_id = get_jwt_identity()
+        cached = _get_cached_settings('account', user_id)
+        if cached is not None:
+            return jsonify({'success': True, 'account': cached}), 200
+        
         user = User.query.get(user_id)
         
         if not user:
             return jsonify({'success': False, 'message': 'User not found'}), 404
         
-        return jsonify({
-            'success': True,
-            'account': {
-                'name': user.name,
-                'email': user.email,
-                'phone': user.phone,
-                'timezone': user.timezone,
-                'locale': user.locale,
-                'email_verified': user.email_verified,
-                'phone_verified': user.phone_verified,
-                'two_factor_enabled': user.two_factor_enabled
-            }
-        }), 200
+        account = _account_payload(user)
+        _cache_settings('account', user_id, account)
+        
+        return jsonify({'success': True, 'account': account}), 200
         
-    except Exception as e:
-        print(f"Get account settings error: {str(e)}")
+    except Exception:
+        logger.exception("Get account settings error")
         return jsonify({
             'success': False,
             'message': 'Failed to get account settings'
@@ -196,6 +308,15 @@ def update_account_settings():
         if not user:
             return jsonify({'success': False, 'message': 'User not found'}), 404
         
+        # Forms resubmit every field; skip the commit, audit row and cache
+        # invalidation when nothing actually changed
+        if not _has_changes(user, data, ACCOUNT_FIELDS):
+            return jsonify({
+                'success': True,
+                'message': 'Account settings updated successfully',
+                'account': _account_payload(user)
+            }), 200
+        
         # Track changes
         changes = {}
         
@@ -230,37 +351,27 @@ def update_account_settings():
             user.locale = data['locale']
             changes['locale'] = data['locale']
         
-        db.session.commit()
-        
-        # Audit log
-        log = AuditLog(
+        # Audit row rides in the same transaction as the update
+        db.session.execute(insert(AuditLog).values(
             user_id=user_id,
             action='account_settings_updated',
             resource_type='settings',
             changes=changes,
             ip_address=request.remote_addr,
             severity='info'
-        )
-        db.session.add(log)
+        ))
         db.session.commit()
+        _invalidate_cached_settings('account', user_id)
         
         return jsonify({
             'success': True,
             'message': 'Account settings updated successfully',
-            'account': {
-                'name': user.name,
-                'email': user.email,
-                'phone': user.phone,
-                'timezone': user.timezone,
-                'locale': user.locale,
-                'email_verified': user.email_verified,
-                'phone_verified': user.phone_verified
-            }
+            'account': _account_payload(user)
         }), 200
         
-    except Exception as e:
+    except Exception:
         db.session.rollback()
-        print(f"Update account settings error: {str(e)}")
+        logger.exception("Update account settings error")
         return jsonify({
             'success': False,
             'message': 'Failed to update account settings'
@@ -281,23 +392,22 @@ def get_notification_settings():
     """
     try:
         user_id = get_jwt_identity()
+        cached = _get_cached_settings('notifications', user_id)
+        if cached is not None:
+            return jsonify({'success': True, 'notifications': cached}), 200
+        
         user = User.query.get(user_id)
         
         if not user:
             return jsonify({'success': False, 'message': 'User not found'}), 404
         
-        return jsonify({
-            'success': True,
-            'notifications': {
-                'email': user.notification_email,
-                'sms': user.notification_sms,
-                'push': user.notification_push,
-                'marketing': user.notification_marketing
-            }
-        }), 200
+        notifications = _notifications_payload(user)
+        _cache_settings('notifications', user_id, notifications)
+        
+        return jsonify({'success': True, 'notifications': notifications}), 200
         
-    except Exception as e:
-        print(f"Get notification settings error: {str(e)}")
+    except Exception:
+        logger.exception("Get notification settings error")
         return jsonify({
             'success': False,
             'message': 'Failed to get notification settings'
@@ -326,6 +436,15 @@ def update_notification_settings():
         if not user:
             return jsonify({'success': False, 'message': 'User not found'}), 404
         
+        # Forms resubmit every field; skip the commit, audit row and cache
+        # invalidation when nothing actually changed
+        if not _has_changes(user, data, NOTIFICATION_FIELDS):
+            return jsonify({
+                'success': True,
+                'message': 'Notification settings updated successfully',
+                'notifications': _notifications_payload(user)
+            }), 200
+        
         # Update preferences
         if 'email' in data:
             user.notification_email = data['email']
@@ -339,34 +458,27 @@ def update_notification_settings():
         if 'marketing' in data:
             user.notification_marketing = data['marketing']
         
-        db.session.commit()
-        
-        # Audit log
-        log = AuditLog(
+        # Audit row rides in the same transaction as the update
+        db.session.execute(insert(AuditLog).values(
             user_id=user_id,
             action='notification_settings_updated',
             resource_type='settings',
             changes=data,
             ip_address=request.remote_addr,
             severity='info'
-        )
-        db.session.add(log)
+        ))
         db.session.commit()
+        _invalidate_cached_settings('notifications', user_id)
         
         return jsonify({
             'success': True,
             'message': 'Notification settings updated successfully',
-            'notifications': {
-                'email': user.notification_email,
-                'sms': user.notification_sms,
-                'push': user.notification_push,
-                'marketing': user.notification_marketing
-            }
+            'notifications': _notifications_payload(user)
         }), 200
         
-    except Exception as e:
+    except Exception:
         db.session.rollback()
-        print(f"Update notification settings error: {str(e)}")
+        logger.exception("Update notification settings error")
         return jsonify({
             'success': False,
             'message': 'Failed to update notification settings'
@@ -387,28 +499,32 @@ def get_subscription_settings():
     """
     try:
         user_id = get_jwt_identity()
+        cached = _get_cached_settings('subscription', user_id)
+        if cached is not None:
+            return jsonify({'success': True, 'subscription': cached}), 200
+        
         user = User.query.get(user_id)
         
         if not user:
             return jsonify({'success': False, 'message': 'User not found'}), 404
         
-        return jsonify({
-            'success': True,
-            'subscription': {
-                'tier': user.subscription_tier,
-                'status': user.subscription_status,
-                'starts_at': user.subscription_starts_at.isoformat() if user.subscription_starts_at else None,
-                'ends_at': user.subscription_ends_at.isoformat() if user.subscription_ends_at else None,
-                'renews_at': user.subscription_renews_at.isoformat() if user.subscription_renews_at else None,
-                'paystubs_limit': user.monthly_paystub_limit,
-                'paystubs_used': user.paystubs_used_this_month,
-                'stripe_customer_id': user.stripe_customer_id,
-                'stripe_subscription_id': user.stripe_subscription_id
-            }
-        }), 200
-        
-    except Exception as e:
-        print(f"Get subscription settings error: {str(e)}")
+        subscription = {
+            'tier': user.subscription_tier,
+            'status': user.subscription_status,
+            'starts_at': user.subscription_starts_at.isoformat() if user.subscription_starts_at else None,
+            'ends_at': user.subscription_ends_at.isoformat() if user.subscription_ends_at else None,
+            'renews_at': user.subscription_renews_at.isoformat() if user.subscription_renews_at else None,
+            'paystubs_limit': user.monthly_paystub_limit,
+            'paystubs_used': user.paystubs_used_this_month,
+            'stripe_customer_id': user.stripe_customer_id,
+            'stripe_subscription_id': user.stripe_subscription_id
+        }
+        _cache_settings('subscription', user_id, subscription)
+        
+        return jsonify({'success': True, 'subscription': subscription}), 200
+        
+    except Exception:
+        logger.exception("Get subscription settings error")
         return jsonify({
             'success': False,
             'message': 'Failed to get subscription settings'
@@ -429,23 +545,22 @@ def get_preferences():
     """
     try:
         user_id = get_jwt_identity()
+        cached = _get_cached_settings('preferences', user_id)
+        if cached is not None:
+            return jsonify({'success': True, 'preferences': cached}), 200
+        
         user = User.query.get(user_id)
         
         if not user:
             return jsonify({'success': False, 'message': 'User not found'}), 404
         
-        return jsonify({
-            'success': True,
-            'preferences': {
-                'default_template': user.default_template,
-                'auto_calculate_taxes': user.auto_calculate_taxes,
-                'require_2fa_for_paystubs': user.require_2fa_for_paystubs,
-                'theme_preference': user.theme_preference
-            }
-        }), 200
+        preferences = _preferences_payload(user)
+        _cache_settings('preferences', user_id, preferences)
         
-    except Exception as e:
-        print(f"Get preferences error: {str(e)}")
+        return jsonify({'success': True, 'preferences': preferences}), 200
+        
+    except Exception:
+        logger.exception("Get preferences error")
         return jsonify({
             'success': False,
             'message': 'Failed to get preferences'
@@ -474,6 +589,15 @@ def update_preferences():
         if not user:
             return jsonify({'success': False, 'message': 'User not found'}), 404
         
+        # Forms resubmit every field; skip the commit, audit row and cache
+        # invalidation when nothing actually changed
+        if not _has_changes(user, data, PREFERENCE_FIELDS):
+            return jsonify({
+                'success': True,
+                'message': 'Preferences updated successfully',
+                'preferences': _preferences_payload(user)
+            }), 200
+        
         # Update preferences
         if 'default_template' in data:
             user.default_template = data['default_template']
@@ -488,21 +612,17 @@ def update_preferences():
             user.theme_preference = data['theme_preference']
         
         db.session.commit()
+        _invalidate_cached_settings('preferences', user_id)
         
         return jsonify({
             'success': True,
             'message': 'Preferences updated successfully',
-            'preferences': {
-                'default_template': user.default_template,
-                'auto_calculate_taxes': user.auto_calculate_taxes,
-                'require_2fa_for_paystubs': user.require_2fa_for_paystubs,
-                'theme_preference': user.theme_preference
-            }
+            'preferences': _preferences_payload(user)
         }), 200
         
-    except Exception as e:
+    except Exception:
         db.session.rollback()
-        print(f"Update preferences error: {str(e)}")
+        logger.exception("Update preferences error")
         return jsonify({
             'success': False,
             'message': 'Failed to update preferences'
@@ -556,19 +676,15 @@ def change_password():
                 'message': 'Password must be at least 8 characters'
             }), 400
         
-        # Update password
+        # Update password and record the audit row in the same transaction
         user.password_hash = generate_password_hash(data['new_password'])
-        db.session.commit()
-        
-        # Audit log
-        log = AuditLog(
+        db.session.execute(insert(AuditLog).values(
             user_id=user_id,
             action='password_changed',
             resource_type='security',
             ip_address=request.remote_addr,
             severity='warning'
-        )
-        db.session.add(log)
+        ))
         db.session.commit()
         
         return jsonify({
@@ -576,9 +692,9 @@ def change_password():
             'message': 'Password changed successfully'
         }), 200
         
-    except Exception as e:
+    except Exception:
         db.session.rollback()
-        print(f"Change password error: {str(e)}")
+        logger.exception("Change password error")
         return jsonify({
             'success': False,
             'message': 'Failed to change password'
@@ -599,16 +715,20 @@ def get_api_key():
     """
     try:
         user_id = get_jwt_identity()
-        user = User.query.get(user_id)
+        user = db.session.get(User, user_id, options=[load_only(
+            User.api_key_display,
+            User.api_key_hash,
+            User.api_requests_this_month,
+            User.api_rate_limit
+        )])
         
         if not user:
             return jsonify({'success': False, 'message': 'User not found'}), 404
         
-        # Mask API key
-        if user.api_key_hash:
+        # Masked key is stored at regenerate time; derive it for keys issued before that
+        masked_key = user.api_key_display
+        if not masked_key and user.api_key_hash:
             masked_key = f"sk_live_...{user.api_key_hash[-8:]}"
-        else:
-            masked_key = None
         
         return jsonify({
             'success': True,
@@ -617,8 +737,8 @@ def get_api_key():
             'rate_limit': user.api_rate_limit
         }), 200
         
-    except Exception as e:
-        print(f"Get API key error: {str(e)}")
+    except Exception:
+        logger.exception("Get API key error")
         return jsonify({
             'success': False,
             'message': 'Failed to get API key'
@@ -635,7 +755,6 @@ def regenerate_api_key():
     """
     try:
         import secrets
-        import hashlib
         
         user_id = get_jwt_identity()
         user = User.query.get(user_id)
@@ -645,20 +764,18 @@ def regenerate_api_key():
         
         # Generate new API key
         new_key = f"sk_live_{secrets.token_urlsafe(32)}"
-        key_hash = hashlib.sha256(new_key.encode()).hexdigest()
+        key_hash = blake3(new_key.encode()).hexdigest()
         
         user.api_key_hash = key_hash
-        db.session.commit()
-        
-        # Audit log
-        log = AuditLog(
+        user.api_key_hash_prefix = key_hash[:8]
+        user.api_key_display = f"sk_live_...{key_hash[-8:]}"
+        db.session.execute(insert(AuditLog).values(
             user_id=user_id,
             action='api_key_regenerated',
             resource_type='security',
             ip_address=request.remote_addr,
             severity='warning'
-        )
-        db.session.add(log)
+        ))
         db.session.commit()
         
         return jsonify({
@@ -668,9 +785,9 @@ def regenerate_api_key():
             'warning': 'Save this key securely. It will not be shown again.'
         }), 200
         
-    except Exception as e:
+    except Exception:
         db.session.rollback()
-        print(f"Regenerate API key error: {str(e)}")
+        logger.exception("Regenerate API key error")
         return jsonify({
             'success': False,
             'message': 'Failed to regenerate API key'
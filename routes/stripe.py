@@ -6,16 +6,30 @@ Payment processing, subscriptions, webhooks
 
 from flask import Blueprint, request, jsonify, redirect
 from flask_jwt_extended import jwt_required, get_jwt_identity
-from models import db, User, AuditLog
+from models import db, User, AuditLog, StripeEvent, utc_now
+from sqlalchemy import case, func, insert, select, update
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from cachetools import TTLCache
+from utils.stripe_events import enqueue_stripe_event
 from datetime import datetime, timezone, timedelta
+from types import SimpleNamespace
 import stripe
+import logging
 import os
+import threading
 
 stripe_bp = Blueprint('stripe', __name__)
+logger = logging.getLogger(__name__)
 
 # Stripe configuration
 stripe.api_key = os.environ.get('STRIPE_SECRET_KEY')
 STRIPE_WEBHOOK_SECRET = os.environ.get('STRIPE_WEBHOOK_SECRET')
+FRONTEND_URL = os.environ.get('FRONTEND_URL', '')
+
+# Default redirect targets; {CHECKOUT_SESSION_ID} is filled in by Stripe
+DEFAULT_CHECKOUT_SUCCESS_URL = f"{FRONTEND_URL}/dashboard?success=true&session_id={{CHECKOUT_SESSION_ID}}"
+DEFAULT_CHECKOUT_CANCEL_URL = f"{FRONTEND_URL}/pricing?canceled=true"
+DEFAULT_PORTAL_RETURN_URL = f"{FRONTEND_URL}/settings"
 
 # Subscription tiers and prices
 SUBSCRIPTION_PLANS = {
@@ -89,8 +103,8 @@ def create_checkout_session():
             customer_id = user.stripe_customer_id
         
         # Create checkout session
-        success_url = data.get('success_url', f"{os.environ.get('FRONTEND_URL')}/dashboard?success=true&session_id={{CHECKOUT_SESSION_ID}}")
-        cancel_url = data.get('cancel_url', f"{os.environ.get('FRONTEND_URL')}/pricing?canceled=true")
+        success_url = data.get('success_url', DEFAULT_CHECKOUT_SUCCESS_URL)
+        cancel_url = data.get('cancel_url', DEFAULT_CHECKOUT_CANCEL_URL)
         
         checkout_session = stripe.checkout.Session.create(
             customer=user.stripe_customer_id,
@@ -134,14 +148,14 @@ def create_checkout_session():
         }), 200
         
     except stripe.error.StripeError as e:
-        print(f"Stripe error: {str(e)}")
+        logger.warning("Stripe error: %s", e)
         return jsonify({
             'success': False,
             'message': 'Payment processing error',
             'error': str(e)
         }), 400
-    except Exception as e:
-        print(f"Checkout session error: {str(e)}")
+    except Exception:
+        logger.exception("Checkout session error")
         return jsonify({
             'success': False,
             'message': 'Failed to create checkout session'
@@ -177,7 +191,7 @@ def create_portal_session():
                 'message': 'No active subscription found'
             }), 400
         
-        return_url = data.get('return_url', f"{os.environ.get('FRONTEND_URL')}/settings")
+        return_url = data.get('return_url', DEFAULT_PORTAL_RETURN_URL)
         
         # Create portal session
         portal_session = stripe.billing_portal.Session.create(
@@ -191,14 +205,14 @@ def create_portal_session():
         }), 200
         
     except stripe.error.StripeError as e:
-        print(f"Stripe error: {str(e)}")
+        logger.warning("Stripe error: %s", e)
         return jsonify({
             'success': False,
             'message': 'Portal creation error',
             'error': str(e)
         }), 400
-    except Exception as e:
-        print(f"Portal session error: {str(e)}")
+    except Exception:
+        logger.exception("Portal session error")
         return jsonify({
             'success': False,
             'message': 'Failed to create portal session'
@@ -209,6 +223,22 @@ def create_portal_session():
 # WEBHOOK HANDLER
 # ============================================================================
 
+# User columns the webhook handlers read or write
+WEBHOOK_USER_COLUMNS = (
+    User.id,
+    User.stripe_subscription_id,
+    User.subscription_tier,
+    User.subscription_status,
+    User.subscription_starts_at,
+    User.subscription_ends_at,
+    User.subscription_renews_at,
+    User.monthly_paystub_limit,
+    User.paystubs_used_this_month,
+    User.billing_cycle_starts_at,
+    User.reward_points,
+    User.total_lifetime_points,
+)
+
 @stripe_bp.route('/api/stripe/webhook', methods=['POST'])
 def stripe_webhook():
     """
@@ -224,41 +254,42 @@ def stripe_webhook():
             payload, sig_header, STRIPE_WEBHOOK_SECRET
         )
     except ValueError as e:
-        print(f"Invalid payload: {e}")
+        logger.warning("Invalid webhook payload: %s", e)
         return jsonify({'error': 'Invalid payload'}), 400
     except stripe.error.SignatureVerificationError as e:
-        print(f"Invalid signature: {e}")
+        logger.warning("Invalid webhook signature: %s", e)
         return jsonify({'error': 'Invalid signature'}), 400
     
-    # Handle the event
     event_type = event['type']
-    event_data = event['data']['object']
-    
-    print(f"Received Stripe event: {event_type}")
-    
-    # Subscription created
-    if event_type == 'customer.subscription.created':
-        handle_subscription_created(event_data)
-    
-    # Subscription updated
-    elif event_type == 'customer.subscription.updated':
-        handle_subscription_updated(event_data)
-    
-    # Subscription deleted
-    elif event_type == 'customer.subscription.deleted':
-        handle_subscription_deleted(event_data)
     
-    # Payment succeeded
-    elif event_type == 'invoice.payment_succeeded':
-        handle_payment_succeeded(event_data)
+    logger.info("Received Stripe event: %s", event_type)
     
-    # Payment failed
-    elif event_type == 'invoice.payment_failed':
-        handle_payment_failed(event_data)
-    
-    # Checkout session completed
-    elif event_type == 'checkout.session.completed':
-        handle_checkout_completed(event_data)
+    if event_type in WEBHOOK_HANDLERS:
+        # Persist the event before acknowledging it, then apply it in the
+        # background. Stripe redelivers an event id until it gets a 2xx, so
+        # a duplicate insert means it is already stored and queued.
+        try:
+            stored = db.session.execute(
+                pg_insert(StripeEvent)
+                .values(
+                    id=event['id'], event_type=event_type, payload=request.get_json()['data']['object'],
+                    source_ip=request.remote_addr
+                )
+                .on_conflict_do_nothing(index_elements=['id'])
+                .returning(StripeEvent.id)
+            ).scalar()
+            db.session.commit()
+        except Exception:
+            db.session.rollback()
+            logger.exception("Failed to store Stripe event %s", event['id'])
+            return jsonify({'error': 'Event not stored'}), 500
+        
+        if stored:
+            enqueue_stripe_event(stored)
+        elif db.session.query(StripeEvent.status).filter_by(id=event['id']).scalar() == 'pending':
+            # A redelivery of an event we hold but haven't applied yet (its
+            # worker may have restarted); queue it again here
+            enqueue_stripe_event(event['id'])
     
     return jsonify({'success': True}), 200
 
@@ -267,220 +298,437 @@ def stripe_webhook():
 # WEBHOOK EVENT HANDLERS
 # ============================================================================
 
-def handle_subscription_created(subscription):
+# Handlers take (event_object, user), where user is a plain snapshot of the
+# WEBHOOK_USER_COLUMNS (or None). They update the snapshot in place and
+# return the event's AuditLog row as a dict (or None); they never touch the
+# session or call the Stripe API, so process_stripe_events_batch can write a
+# whole batch at once without holding row locks across network calls.
+
+def handle_subscription_created(subscription, user):
     """Handle new subscription creation"""
-    try:
-        customer_id = subscription['customer']
-        user = User.query.filter_by(stripe_customer_id=customer_id).first()
-        
-        if not user:
-            print(f"User not found for customer: {customer_id}")
-            return
-        
-        # Get plan from metadata
-        plan = subscription['metadata'].get('plan', 'professional')
-        plan_info = SUBSCRIPTION_PLANS.get(plan, SUBSCRIPTION_PLANS['professional'])
-        
-        # Update user subscription
-        user.subscription_tier = plan
-        user.subscription_status = subscription['status']
-        user.stripe_subscription_id = subscription['id']
-        user.subscription_starts_at = datetime.fromtimestamp(subscription['current_period_start'], tz=timezone.utc)
-        user.subscription_ends_at = datetime.fromtimestamp(subscription['current_period_end'], tz=timezone.utc)
-        user.subscription_renews_at = datetime.fromtimestamp(subscription['current_period_end'], tz=timezone.utc)
-        user.monthly_paystub_limit = plan_info['paystub_limit']
-        
-        # Award bonus points for subscription
-        user.reward_points += 100
-        user.total_lifetime_points += 100
-        
-        db.session.commit()
-        
-        # Audit log
-        log = AuditLog(
-            user_id=user.id,
-            action='subscription_created',
-            resource_type='stripe',
-            changes={
-                'plan': plan,
-                'subscription_id': subscription['id']
-            },
-            severity='info'
-        )
-        db.session.add(log)
-        db.session.commit()
-        
-        print(f"Subscription created for user {user.id}: {plan}")
-        
-    except Exception as e:
-        print(f"Error handling subscription created: {str(e)}")
-        db.session.rollback()
+    if not user:
+        logger.warning("User not found for customer: %s", subscription['customer'])
+        return
+    
+    # Get plan from metadata
+    plan = subscription['metadata'].get('plan', 'professional')
+    plan_info = SUBSCRIPTION_PLANS.get(plan, SUBSCRIPTION_PLANS['professional'])
+    
+    # Update user subscription
+    user.subscription_tier = plan
+    user.subscription_status = subscription['status']
+    user.stripe_subscription_id = subscription['id']
+    period_end = datetime.fromtimestamp(subscription['current_period_end'], tz=timezone.utc)
+    user.subscription_starts_at = datetime.fromtimestamp(subscription['current_period_start'], tz=timezone.utc)
+    user.subscription_ends_at = period_end
+    user.subscription_renews_at = period_end
+    user.monthly_paystub_limit = plan_info['paystub_limit']
+    
+    # Award bonus points for subscription
+    user.reward_points += 100
+    user.total_lifetime_points += 100
+    
+    logger.info("Subscription created for user %s: %s", user.id, plan)
+    
+    # Audit log
+    return dict(
+        user_id=user.id,
+        action='subscription_created',
+        resource_type='stripe',
+        changes={
+            'plan': plan,
+            'subscription_id': subscription['id']
+        },
+        severity='info'
+    )
 
 
-def handle_subscription_updated(subscription):
+def handle_subscription_updated(subscription, user):
     """Handle subscription updates"""
-    try:
-        subscription_id = subscription['id']
-        user = User.query.filter_by(stripe_subscription_id=subscription_id).first()
-        
-        if not user:
-            print(f"User not found for subscription: {subscription_id}")
-            return
-        
-        # Update subscription status
-        user.subscription_status = subscription['status']
-        user.subscription_ends_at = datetime.fromtimestamp(subscription['current_period_end'], tz=timezone.utc)
-        user.subscription_renews_at = datetime.fromtimestamp(subscription['current_period_end'], tz=timezone.utc)
-        
-        db.session.commit()
-        
-        print(f"Subscription updated for user {user.id}")
-        
-    except Exception as e:
-        print(f"Error handling subscription updated: {str(e)}")
-        db.session.rollback()
+    subscription_id = subscription['id']
+    
+    # Ignore events for a subscription the user has since replaced
+    if not user or user.stripe_subscription_id != subscription_id:
+        logger.warning("User not found for subscription: %s", subscription_id)
+        return
+    
+    _invalidate_live_subscription_fields(subscription_id)
+    
+    # Update subscription status
+    period_end = datetime.fromtimestamp(subscription['current_period_end'], tz=timezone.utc)
+    user.subscription_status = subscription['status']
+    user.subscription_ends_at = period_end
+    user.subscription_renews_at = period_end
+    
+    logger.info("Subscription updated for user %s", user.id)
 
 
-def handle_subscription_deleted(subscription):
+def handle_subscription_deleted(subscription, user):
     """Handle subscription cancellation"""
-    try:
-        subscription_id = subscription['id']
-        user = User.query.filter_by(stripe_subscription_id=subscription_id).first()
-        
-        if not user:
-            print(f"User not found for subscription: {subscription_id}")
-            return
-        
-        # Update subscription status
-        user.subscription_status = 'canceled'
-        user.subscription_ends_at = datetime.now(timezone.utc)
-        
-        # Revert to free tier
-        user.subscription_tier = 'starter'
-        user.monthly_paystub_limit = 10
-        
-        db.session.commit()
-        
-        # Audit log
-        log = AuditLog(
-            user_id=user.id,
-            action='subscription_canceled',
-            resource_type='stripe',
-            changes={'subscription_id': subscription_id},
-            severity='warning'
-        )
-        db.session.add(log)
-        db.session.commit()
-        
-        print(f"Subscription canceled for user {user.id}")
-        
-    except Exception as e:
-        print(f"Error handling subscription deleted: {str(e)}")
-        db.session.rollback()
+    subscription_id = subscription['id']
+    
+    # Ignore events for a subscription the user has since replaced
+    if not user or user.stripe_subscription_id != subscription_id:
+        logger.warning("User not found for subscription: %s", subscription_id)
+        return
+    
+    _invalidate_live_subscription_fields(subscription_id)
+    
+    # Update subscription status
+    user.subscription_status = 'canceled'
+    user.subscription_ends_at = datetime.now(timezone.utc)
+    
+    # Revert to free tier
+    user.subscription_tier = 'starter'
+    user.monthly_paystub_limit = 10
+    
+    logger.info("Subscription canceled for user %s", user.id)
+    
+    # Audit log
+    return dict(
+        user_id=user.id,
+        action='subscription_canceled',
+        resource_type='stripe',
+        changes={'subscription_id': subscription_id},
+        severity='warning'
+    )
 
 
-def handle_payment_succeeded(invoice):
+def handle_payment_succeeded(invoice, user):
     """Handle successful payment"""
-    try:
-        customer_id = invoice['customer']
-        user = User.query.filter_by(stripe_customer_id=customer_id).first()
-        
-        if not user:
-            print(f"User not found for customer: {customer_id}")
-            return
-        
-        # Update payment status
-        user.subscription_status = 'active'
-        
-        # Reset monthly usage
-        if invoice['billing_reason'] == 'subscription_cycle':
-            user.paystubs_used_this_month = 0
-            user.billing_cycle_starts_at = datetime.now(timezone.utc)
-        
-        db.session.commit()
-        
-        # Audit log
-        log = AuditLog(
-            user_id=user.id,
-            action='payment_succeeded',
-            resource_type='stripe',
-            changes={
-                'amount': invoice['amount_paid'],
-                'invoice_id': invoice['id']
-            },
-            severity='info'
-        )
-        db.session.add(log)
-        db.session.commit()
-        
-        print(f"Payment succeeded for user {user.id}: ${invoice['amount_paid']/100}")
-        
-    except Exception as e:
-        print(f"Error handling payment succeeded: {str(e)}")
-        db.session.rollback()
+    if not user:
+        logger.warning("User not found for customer: %s", invoice['customer'])
+        return
+    
+    # Update payment status
+    user.subscription_status = 'active'
+    
+    # Reset monthly usage
+    if invoice['billing_reason'] == 'subscription_cycle':
+        user.paystubs_used_this_month = 0
+        user.billing_cycle_starts_at = datetime.now(timezone.utc)
+    
+    logger.info("Payment succeeded for user %s: $%s", user.id, invoice['amount_paid'] / 100)
+    
+    # Audit log
+    return dict(
+        user_id=user.id,
+        action='payment_succeeded',
+        resource_type='stripe',
+        changes={
+            'amount': invoice['amount_paid'],
+            'invoice_id': invoice['id']
+        },
+        severity='info'
+    )
 
 
-def handle_payment_failed(invoice):
+def handle_payment_failed(invoice, user):
     """Handle failed payment"""
-    try:
-        customer_id = invoice['customer']
-        user = User.query.filter_by(stripe_customer_id=customer_id).first()
-        
-        if not user:
-            print(f"User not found for customer: {customer_id}")
-            return
-        
-        # Update subscription status
-        user.subscription_status = 'past_due'
-        
-        db.session.commit()
-        
-        # Audit log
-        log = AuditLog(
-            user_id=user.id,
-            action='payment_failed',
-            resource_type='stripe',
-            changes={
-                'amount': invoice['amount_due'],
-                'invoice_id': invoice['id']
-            },
-            severity='error'
-        )
-        db.session.add(log)
-        db.session.commit()
-        
-        print(f"Payment failed for user {user.id}")
-        
-    except Exception as e:
-        print(f"Error handling payment failed: {str(e)}")
-        db.session.rollback()
+    if not user:
+        logger.warning("User not found for customer: %s", invoice['customer'])
+        return
+    
+    # Update subscription status
+    user.subscription_status = 'past_due'
+    
+    logger.info("Payment failed for user %s", user.id)
+    
+    # Audit log
+    return dict(
+        user_id=user.id,
+        action='payment_failed',
+        resource_type='stripe',
+        changes={
+            'amount': invoice['amount_due'],
+            'invoice_id': invoice['id']
+        },
+        severity='error'
+    )
 
 
-def handle_checkout_completed(session):
+def handle_checkout_completed(session, user):
     """Handle completed checkout session"""
+    if not user:
+        logger.warning("User not found for customer: %s", session['customer'])
+        return
+    
+    # The subscription arrives expanded (see _retrieve_checkout_subscriptions)
+    audit_row = None
+    if session.get('subscription'):
+        audit_row = handle_subscription_created(session['subscription'], user)
+    
+    logger.info("Checkout completed for user %s", user.id)
+    return audit_row
+
+
+# Webhook event type -> handler(event_object, user)
+WEBHOOK_HANDLERS = {
+    'customer.subscription.created': handle_subscription_created,
+    'customer.subscription.updated': handle_subscription_updated,
+    'customer.subscription.deleted': handle_subscription_deleted,
+    'invoice.payment_succeeded': handle_payment_succeeded,
+    'invoice.payment_failed': handle_payment_failed,
+    'checkout.session.completed': handle_checkout_completed
+}
+
+
+def _load_webhook_users(customer_ids):
+    """Plain snapshots of the users for a set of Stripe customer ids, keyed by customer id"""
+    if not customer_ids:
+        return {}
+    rows = db.session.execute(
+        select(*WEBHOOK_USER_COLUMNS, User.stripe_customer_id).where(
+            User.stripe_customer_id.in_(customer_ids)
+        )
+    ).mappings()
+    return {row['stripe_customer_id']: SimpleNamespace(**row) for row in rows}
+
+
+# Failed events are retried automatically, backing off from
+# STRIPE_EVENT_RETRY_BASE seconds and doubling up to STRIPE_EVENT_RETRY_MAX
+STRIPE_EVENT_RETRY_BASE = 30
+STRIPE_EVENT_RETRY_MAX = 3600
+
+# An event that has failed this many times is marked 'failed': sweeps stop
+# retrying it and it is logged as an error (`flask replay-stripe-events
+# --failed` puts it back once the cause is fixed)
+MAX_STRIPE_EVENT_ATTEMPTS = 10
+
+# Events received within this many seconds are presumably still queued in
+# the worker that stored them, so retry sweeps leave them alone
+STRIPE_EVENT_SWEEP_MIN_AGE = 60
+STRIPE_EVENT_SWEEP_BATCH = 500
+
+
+def _schedule_stripe_event_retries(event_ids):
+    """
+    Count a failed attempt for each event and push its next retry back;
+    events out of attempts are marked failed instead
+    """
+    backoff = func.least(
+        STRIPE_EVENT_RETRY_BASE * func.power(2, func.least(StripeEvent.attempts, 16)),
+        STRIPE_EVENT_RETRY_MAX
+    )
+    events = db.session.execute(
+        update(StripeEvent).where(StripeEvent.id.in_(event_ids)).values(
+            attempts=StripeEvent.attempts + 1,
+            status=case(
+                (StripeEvent.attempts + 1 >= MAX_STRIPE_EVENT_ATTEMPTS, 'failed'),
+                else_=StripeEvent.status
+            ),
+            next_attempt_at=utc_now + func.make_interval(0, 0, 0, 0, 0, 0, backoff)
+        ).returning(StripeEvent.id, StripeEvent.event_type, StripeEvent.status, StripeEvent.attempts)
+    ).all()
+    for event in events:
+        if event.status == 'failed':
+            logger.error(
+                "Stripe event %s (%s) failed %d times; marked failed and no longer retried",
+                event.id, event.event_type, event.attempts
+            )
+
+
+def process_stripe_event(event_id):
+    """Apply one stored webhook event (called by the background worker)"""
+    process_stripe_events_batch([event_id])
+
+
+def _retrieve_checkout_subscriptions(event_ids):
+    """
+    Fetch from Stripe the subscriptions of the pending checkout events
+    among event_ids, keyed by subscription id. Runs before
+    process_stripe_events_batch locks anything, so no transaction or row
+    lock is held across the API calls. Returns (subscriptions, ids of the
+    events whose subscription couldn't be fetched).
+    """
+    rows = db.session.execute(
+        select(StripeEvent.id, StripeEvent.payload['subscription'].astext).where(
+            StripeEvent.id.in_(event_ids),
+            StripeEvent.status == 'pending',
+            StripeEvent.event_type == 'checkout.session.completed'
+        )
+    ).all()
+    # End the read transaction before calling Stripe
+    db.session.rollback()
+    
+    subscriptions = {}
+    failed_ids = []
+    for event_id, subscription_id in rows:
+        if not subscription_id or subscription_id in subscriptions:
+            continue
+        try:
+            subscriptions[subscription_id] = stripe.Subscription.retrieve(subscription_id)
+        except stripe.error.StripeError:
+            logger.exception("Failed to retrieve subscription %s for Stripe event %s", subscription_id, event_id)
+            failed_ids.append(event_id)
+    return subscriptions, failed_ids
+
+
+def process_stripe_events_batch(event_ids):
+    """
+    Apply a batch of stored webhook events in one transaction.
+    
+    Subscriptions needed by checkout events are fetched from Stripe first,
+    before any lock is taken. Events are then row-locked (SKIP LOCKED, so
+    the worker, retry sweeps and replays never apply one twice) and their
+    users loaded with one query. Handlers run against in-memory user
+    snapshots; a handler that raises has its user's snapshot restored and
+    its event scheduled for retry.
+    The batch is then written with a bulk UPDATE of the changed users (one
+    executemany per set of changed columns), one multi-row INSERT of audit
+    rows and one UPDATE of the event rows.
+    If that write fails, the events are applied one at a time so a single
+    bad event can't hold back the rest. Returns the number of events applied.
+    """
+    subscriptions, fetch_failed_ids = _retrieve_checkout_subscriptions(event_ids)
+    if fetch_failed_ids:
+        _schedule_stripe_event_retries(fetch_failed_ids)
+        db.session.commit()
+        event_ids = [event_id for event_id in event_ids if event_id not in fetch_failed_ids]
+    
+    events = db.session.execute(
+        select(StripeEvent.id, StripeEvent.event_type, StripeEvent.payload, StripeEvent.source_ip).where(
+            StripeEvent.id.in_(event_ids),
+            StripeEvent.status == 'pending'
+        ).order_by(StripeEvent.received_at).with_for_update(skip_locked=True)
+    ).all()
+    if not events:
+        db.session.rollback()
+        return 0
+    
+    users = _load_webhook_users({
+        event.payload['customer'] for event in events if event.payload.get('customer')
+    })
+    loaded = {user.id: vars(user).copy() for user in users.values()}
+    
+    applied_ids = []
+    failed_ids = []
+    audit_rows = []
+    for event in events:
+        payload = event.payload
+        if event.event_type == 'checkout.session.completed' and payload.get('subscription'):
+            subscription = subscriptions.get(payload['subscription'])
+            if subscription is None:
+                # Became pending after the fetch above (a --failed replay);
+                # left pending for the next sweep
+                continue
+            payload = {**payload, 'subscription': subscription}
+        
+        user = users.get(payload.get('customer'))
+        before = vars(user).copy() if user else None
+        try:
+            audit_row = WEBHOOK_HANDLERS[event.event_type](payload, user)
+        except Exception:
+            logger.exception("Error handling Stripe event %s (%s)", event.id, event.event_type)
+            if user:
+                vars(user).update(before)
+            failed_ids.append(event.id)
+            continue
+        applied_ids.append(event.id)
+        if audit_row:
+            # Recorded as the webhook request's source address
+            audit_rows.append({**audit_row, 'ip_address': event.source_ip})
+    
+    user_changes = []
+    for user in users.values():
+        changes = {
+            key: value for key, value in vars(user).items()
+            if value != loaded[user.id][key]
+        }
+        if changes:
+            user_changes.append({'id': user.id, **changes})
+    
     try:
-        customer_id = session['customer']
-        user = User.query.filter_by(stripe_customer_id=customer_id).first()
-        
-        if not user:
-            print(f"User not found for customer: {customer_id}")
-            return
-        
-        # Get subscription if present
-        if session.get('subscription'):
-            subscription = stripe.Subscription.retrieve(session['subscription'])
-            handle_subscription_created(subscription)
-        
-        print(f"Checkout completed for user {user.id}")
+        if user_changes:
+            # ORM bulk UPDATE by primary key; rows with the same changed
+            # columns are kept adjacent so each set is one executemany
+            user_changes.sort(key=sorted)
+            db.session.execute(update(User), user_changes)
+        if audit_rows:
+            db.session.execute(insert(AuditLog), audit_rows)
+        if applied_ids:
+            db.session.execute(
+                update(StripeEvent).where(StripeEvent.id.in_(applied_ids)).values(
+                    status='processed', processed_at=utc_now
+                )
+            )
+        if failed_ids:
+            _schedule_stripe_event_retries(failed_ids)
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        if len(events) > 1:
+            logger.exception("Stripe event batch write failed; applying events one at a time")
+            return sum(process_stripe_events_batch([event.id]) for event in events)
         
-    except Exception as e:
-        print(f"Error handling checkout completed: {str(e)}")
+        logger.exception("Failed to write Stripe event %s", events[0].id)
+        try:
+            _schedule_stripe_event_retries([events[0].id])
+            db.session.commit()
+        except Exception:
+            db.session.rollback()
+            logger.exception("Failed to schedule retry of Stripe event %s", events[0].id)
+        return 0
+    
+    return len(applied_ids)
+
+
+def retry_pending_stripe_events():
+    """
+    Apply pending events that are due a retry (called periodically by the
+    background worker in every process). Covers events whose handler
+    failed, events dropped from a full queue and events queued in a
+    worker that restarted. Returns the number of events applied.
+    """
+    due = [
+        event_id for (event_id,) in db.session.query(StripeEvent.id).filter(
+            StripeEvent.status == 'pending',
+            StripeEvent.next_attempt_at <= utc_now,
+            StripeEvent.received_at <= utc_now - func.make_interval(0, 0, 0, 0, 0, 0, STRIPE_EVENT_SWEEP_MIN_AGE)
+        ).order_by(StripeEvent.next_attempt_at).limit(STRIPE_EVENT_SWEEP_BATCH)
+    ]
+    if not due:
+        return 0
+    return process_stripe_events_batch(due)
 
 
 # ============================================================================
 # GET SUBSCRIPTION STATUS
 # ============================================================================
 
+# Live Stripe fields shown by the subscription GET, memoized per subscription
+# so polling clients don't make a Stripe API call per request. Cancels and
+# subscription webhooks drop the entry in the worker that handles them;
+# other workers are at most STRIPE_SUBSCRIPTION_CACHE_TTL seconds stale, and
+# ?refresh=1 bypasses the cache.
+STRIPE_SUBSCRIPTION_CACHE_TTL = 60
+
+_stripe_subscription_cache = TTLCache(maxsize=10000, ttl=STRIPE_SUBSCRIPTION_CACHE_TTL)
+_stripe_subscription_cache_lock = threading.Lock()
+
+
+def _get_live_subscription_fields(subscription_id, refresh=False):
+    if not refresh:
+        with _stripe_subscription_cache_lock:
+            fields = _stripe_subscription_cache.get(subscription_id)
+        if fields is not None:
+            return fields
+    
+    subscription = stripe.Subscription.retrieve(subscription_id)
+    fields = {
+        'stripe_status': subscription['status'],
+        'cancel_at_period_end': subscription['cancel_at_period_end']
+    }
+    with _stripe_subscription_cache_lock:
+        _stripe_subscription_cache[subscription_id] = fields
+    return fields
+
+
+def _invalidate_live_subscription_fields(subscription_id):
+    with _stripe_subscription_cache_lock:
+        _stripe_subscription_cache.pop(subscription_id, None)
+
+
 @stripe_bp.route('/api/stripe/subscription', methods=['GET'])
 @jwt_required()
 def get_subscription_status():
@@ -488,6 +736,7 @@ def get_subscription_status():
     Get current subscription status
     
     GET /api/stripe/subscription
+    GET /api/stripe/subscription?refresh=1  (skip the cached Stripe fields)
     """
     try:
         user_id = get_jwt_identity()
@@ -509,9 +758,10 @@ def get_subscription_status():
         # Get Stripe subscription details if available
         if user.stripe_subscription_id:
             try:
-                subscription = stripe.Subscription.retrieve(user.stripe_subscription_id)
-                subscription_data['stripe_status'] = subscription['status']
-                subscription_data['cancel_at_period_end'] = subscription['cancel_at_period_end']
+                subscription_data.update(_get_live_subscription_fields(
+                    user.stripe_subscription_id,
+                    refresh=request.args.get('refresh') == '1'
+                ))
             except stripe.error.StripeError:
                 pass
         
@@ -520,8 +770,8 @@ def get_subscription_status():
             'subscription': subscription_data
         }), 200
         
-    except Exception as e:
-        print(f"Get subscription error: {str(e)}")
+    except Exception:
+        logger.exception("Get subscription error")
         return jsonify({
             'success': False,
             'message': 'Failed to get subscription status'
@@ -559,9 +809,10 @@ def cancel_subscription():
             cancel_at_period_end=True
         )
         
+        _invalidate_live_subscription_fields(user.stripe_subscription_id)
+        
         # Update user status
         user.subscription_status = 'canceling'
-        db.session.commit()
         
         # Audit log
         log = AuditLog(
@@ -582,14 +833,15 @@ def cancel_subscription():
         }), 200
         
     except stripe.error.StripeError as e:
-        print(f"Stripe error: {str(e)}")
+        logger.warning("Stripe error: %s", e)
         return jsonify({
             'success': False,
             'message': 'Cancellation error',
             'error': str(e)
         }), 400
-    except Exception as e:
-        print(f"Cancel subscription error: {str(e)}")
+    except Exception:
+        db.session.rollback()
+        logger.exception("Cancel subscription error")
         return jsonify({
             'success': False,
             'message': 'Failed to cancel subscription'
@@ -4,14 +4,27 @@ Saurellius Platform - Main Application
 Production-ready Flask application with all routes
 """
 
-from flask import Flask, send_from_directory, jsonify
+from flask import Flask, Response, send_from_directory, jsonify
 from flask_cors import CORS
+from flask_compress import Compress
 from flask_jwt_extended import JWTManager
+from sqlalchemy import create_engine, event, text
+from sqlalchemy.pool import NullPool
+from whitenoise import WhiteNoise
 from datetime import timedelta
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler
+import atexit
+import click
+import logging
+import orjson
 import os
+import queue
+import time
 
 # Import models and database
 from models import db
+from utils.json_provider import OrjsonProvider
+from utils.jwt_cache import enable_jwt_verification_cache
 
 # Import blueprints
 from routes.auth import auth_bp
@@ -19,6 +32,27 @@ from routes.paystubs import paystubs_bp
 from routes.employees import employees_bp
 from routes.dashboard import dashboard_bp
 
+# ============================================================================
+# JWT ERROR RESPONSES
+# ============================================================================
+
+# Bodies never change; encoded once so floods of rejected tokens skip the
+# per-request dict build and JSON encode
+_JWT_ERROR_BODIES = {
+    error: orjson.dumps({'success': False, 'message': message, 'error': error})
+    for error, message in (
+        ('token_expired', 'Token has expired'),
+        ('invalid_token', 'Invalid token'),
+        ('authorization_required', 'Authorization token required'),
+        ('token_revoked', 'Token has been revoked'),
+    )
+}
+
+
+def _jwt_error_response(error):
+    return Response(_JWT_ERROR_BODIES[error], status=401, mimetype='application/json')
+
+
 # ============================================================================
 # APPLICATION FACTORY
 # ============================================================================
@@ -27,6 +61,7 @@ def create_app():
     """Create and configure Flask application"""
     
     app = Flask(__name__, static_folder='static')
+    app.json = OrjsonProvider(app)
     
     # ========================================================================
     # CONFIGURATION
@@ -38,11 +73,42 @@ def create_app():
         'postgresql://localhost/saurellius'
     )
     app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
-    app.config['SQLALCHEMY_ENGINE_OPTIONS'] = {
-        'pool_size': 10,
-        'pool_recycle': 3600,
-        'pool_pre_ping': True
+    db_statement_timeout_ms = int(os.environ.get('DB_STATEMENT_TIMEOUT_MS', '30000'))
+    db_use_pgbouncer = bool(os.environ.get('DB_USE_PGBOUNCER'))
+    db_connect_args = {
+        'connect_timeout': 5
     }
+    if not db_use_pgbouncer:
+        # pgbouncer rejects the options startup parameter; it gets a
+        # per-transaction SET LOCAL instead (registered after db.init_app)
+        db_connect_args['options'] = f"-c statement_timeout={db_statement_timeout_ms}"
+    db_engine_options = {
+        # Compiled-statement cache per engine; the default 500 is too
+        # small for the number of distinct ORM/Core statements here
+        'query_cache_size': 1200,
+        # psycopg2: INSERT executemany becomes multi-row VALUES pages,
+        # UPDATE/DELETE executemany goes through execute_batch
+        'executemany_mode': 'values_plus_batch',
+        'insertmanyvalues_page_size': 1000,
+        'executemany_batch_page_size': 500,
+        'connect_args': db_connect_args
+    }
+    if db_use_pgbouncer:
+        # Transaction-mode pgbouncer already pools; don't pool twice
+        app.config['SQLALCHEMY_ENGINE_OPTIONS'] = {
+            **db_engine_options,
+            'poolclass': NullPool
+        }
+    else:
+        # Per worker process; size x workers must stay under max_connections
+        app.config['SQLALCHEMY_ENGINE_OPTIONS'] = {
+            **db_engine_options,
+            'pool_size': int(os.environ.get('DB_POOL_SIZE', 10)),
+            'max_overflow': int(os.environ.get('DB_MAX_OVERFLOW', 10)),
+            'pool_timeout': 5,
+            'pool_recycle': 1800,
+            'pool_pre_ping': True
+        }
     
     # JWT
     app.config['JWT_SECRET_KEY'] = os.environ.get(
@@ -61,6 +127,9 @@ def create_app():
     # File Upload
     app.config['MAX_CONTENT_LENGTH'] = 16 * 1024 * 1024  # 16MB max
     
+    # Response compression (skip bodies too small to benefit)
+    app.config['COMPRESS_MIN_SIZE'] = 256
+    
     # S3 Configuration
     app.config['S3_BUCKET'] = os.environ.get('S3_BUCKET', 'saurellius-paystubs')
     app.config['AWS_REGION'] = os.environ.get('AWS_REGION', 'us-east-1')
@@ -81,9 +150,33 @@ def create_app():
     # Initialize database
     db.init_app(app)
     
+    if db_use_pgbouncer:
+        # Transaction-mode pgbouncer hands each transaction whichever server
+        # connection is free, so the timeout is scoped to the transaction
+        def set_statement_timeout(conn):
+            conn.exec_driver_sql(f"SET LOCAL statement_timeout = {db_statement_timeout_ms}")
+        
+        with app.app_context():
+            event.listen(db.engine, 'begin', set_statement_timeout)
+    
     # Initialize JWT
     jwt = JWTManager(app)
     
+    # Skip re-verifying the same bearer token within a short window
+    enable_jwt_verification_cache()
+    
+    # Initialize response compression
+    Compress(app)
+    
+    # Serve /static/* from WSGI middleware ahead of Flask routing. Asset
+    # names aren't content-hashed, so keep the browser cache lifetime short.
+    app.wsgi_app = WhiteNoise(
+        app.wsgi_app,
+        root=os.path.join(app.root_path, 'static'),
+        prefix='static/',
+        max_age=3600
+    )
+    
     # Initialize CORS
     CORS(app, resources={
         r"/api/*": {
@@ -101,35 +194,19 @@ def create_app():
     
     @jwt.expired_token_loader
     def expired_token_callback(jwt_header, jwt_payload):
-        return jsonify({
-            'success': False,
-            'message': 'Token has expired',
-            'error': 'token_expired'
-        }), 401
+        return _jwt_error_response('token_expired')
     
     @jwt.invalid_token_loader
     def invalid_token_callback(error):
-        return jsonify({
-            'success': False,
-            'message': 'Invalid token',
-            'error': 'invalid_token'
-        }), 401
+        return _jwt_error_response('invalid_token')
     
     @jwt.unauthorized_loader
     def missing_token_callback(error):
-        return jsonify({
-            'success': False,
-            'message': 'Authorization token required',
-            'error': 'authorization_required'
-        }), 401
+        return _jwt_error_response('authorization_required')
     
     @jwt.revoked_token_loader
     def revoked_token_callback(jwt_header, jwt_payload):
-        return jsonify({
-            'success': False,
-            'message': 'Token has been revoked',
-            'error': 'token_revoked'
-        }), 401
+        return _jwt_error_response('token_revoked')
     
     # ========================================================================
     # REGISTER BLUEPRINTS
@@ -154,26 +231,46 @@ def create_app():
         """Serve dashboard"""
         return send_from_directory('static', 'dashboard.html')
     
-    # Serve static assets
-    @app.route('/static/<path:filename>')
-    def serve_static(filename):
-        """Serve static files"""
-        return send_from_directory('static', filename)
-    
     # ========================================================================
     # API HEALTH CHECK
     # ========================================================================
     
+    # Probe results are reused for a few seconds so frequent load balancer
+    # checks don't each round-trip to Postgres
+    HEALTH_CHECK_INTERVAL = 5
+    _health_cache = {'ts': 0.0, 'db_status': 'healthy', 'error': None}
+    
+    # Probes get their own single-connection engine so a saturated app pool
+    # can't make a healthy instance look dead
+    health_engine = create_engine(
+        app.config['SQLALCHEMY_DATABASE_URI'],
+        pool_size=1,
+        max_overflow=0,
+        pool_timeout=1,
+        pool_pre_ping=True,
+        connect_args={'connect_timeout': 2}
+    )
+    
+    def _probe_database():
+        now = time.monotonic()
+        if now - _health_cache['ts'] < HEALTH_CHECK_INTERVAL:
+            return _health_cache['db_status'], _health_cache['error']
+        
+        try:
+            with health_engine.connect() as conn:
+                conn.execute(text('SELECT 1'))
+            db_status, error = 'healthy', None
+        except Exception as e:
+            db_status, error = 'unhealthy', str(e)
+            app.logger.error(f"Database health check failed: {error}")
+        
+        _health_cache.update(ts=now, db_status=db_status, error=error)
+        return db_status, error
+    
     @app.route('/api/health', methods=['GET'])
     def health_check():
         """Health check endpoint"""
-        try:
-            # Test database connection
-            db.session.execute(db.text('SELECT 1'))
-            db_status = 'healthy'
-        except Exception as e:
-            db_status = 'unhealthy'
-            print(f"Database health check failed: {str(e)}")
+        db_status, _ = _probe_database()
         
         return jsonify({
             'status': 'healthy' if db_status == 'healthy' else 'degraded',
@@ -183,41 +280,44 @@ def create_app():
             'environment': app.config['ENVIRONMENT']
         }), 200 if db_status == 'healthy' else 503
     
+    # Constant payload; serialized once instead of on every request
+    api_info_body = app.json.dumps({
+        'service': 'Saurellius Payroll API',
+        'version': app.config['APP_VERSION'],
+        'endpoints': {
+            'auth': {
+                'register': 'POST /api/auth/register',
+                'login': 'POST /api/auth/login',
+                'refresh': 'POST /api/auth/refresh',
+                'logout': 'POST /api/auth/logout',
+                'profile': 'GET /api/auth/profile'
+            },
+            'employees': {
+                'list': 'GET /api/employees',
+                'get': 'GET /api/employees/<id>',
+                'create': 'POST /api/employees',
+                'update': 'PUT /api/employees/<id>',
+                'delete': 'DELETE /api/employees/<id>'
+            },
+            'paystubs': {
+                'generate': 'POST /api/paystubs/generate-complete',
+                'history': 'GET /api/paystubs/history',
+                'get': 'GET /api/paystubs/<id>',
+                'download': 'GET /api/paystubs/<id>/download',
+                'verify': 'GET /api/paystubs/verify/<verification_id>'
+            },
+            'dashboard': {
+                'summary': 'GET /api/dashboard/summary',
+                'analytics': 'GET /api/dashboard/analytics/*',
+                'reports': 'GET /api/dashboard/reports/*'
+            }
+        }
+    }).encode()
+    
     @app.route('/api/info', methods=['GET'])
     def api_info():
         """API information endpoint"""
-        return jsonify({
-            'service': 'Saurellius Payroll API',
-            'version': app.config['APP_VERSION'],
-            'endpoints': {
-                'auth': {
-                    'register': 'POST /api/auth/register',
-                    'login': 'POST /api/auth/login',
-                    'refresh': 'POST /api/auth/refresh',
-                    'logout': 'POST /api/auth/logout',
-                    'profile': 'GET /api/auth/profile'
-                },
-                'employees': {
-                    'list': 'GET /api/employees',
-                    'get': 'GET /api/employees/<id>',
-                    'create': 'POST /api/employees',
-                    'update': 'PUT /api/employees/<id>',
-                    'delete': 'DELETE /api/employees/<id>'
-                },
-                'paystubs': {
-                    'generate': 'POST /api/paystubs/generate-complete',
-                    'history': 'GET /api/paystubs/history',
-                    'get': 'GET /api/paystubs/<id>',
-                    'download': 'GET /api/paystubs/<id>/download',
-                    'verify': 'GET /api/paystubs/verify/<verification_id>'
-                },
-                'dashboard': {
-                    'summary': 'GET /api/dashboard/summary',
-                    'analytics': 'GET /api/dashboard/analytics/*',
-                    'reports': 'GET /api/dashboard/reports/*'
-                }
-            }
-        }), 200
+        return app.response_class(api_info_body, mimetype='application/json')
     
     # ========================================================================
     # ERROR HANDLERS
@@ -274,6 +374,73 @@ def create_app():
         db.create_all()
         print("✅ Database tables created successfully!")
     
+    @app.cli.command()
+    def backfill_ssn_last4():
+        """Populate employees.ssn_last4 from the encrypted SSN (one-shot)"""
+        from models import Employee
+        from routes.employees import decrypt_data
+        
+        updated = 0
+        for employee in Employee.query.filter(Employee.ssn_last4.is_(None)).yield_per(500):
+            ssn = decrypt_data(employee.ssn_encrypted)
+            if ssn:
+                employee.ssn_last4 = ssn[-4:]
+                updated += 1
+        db.session.commit()
+        print(f"✅ Backfilled ssn_last4 for {updated} employees")
+    
+    @app.cli.command()
+    def backfill_ssn_hash():
+        """Populate employees.ssn_hash from the encrypted SSN (one-shot)"""
+        from models import Employee
+        from routes.employees import decrypt_data, hash_ssn
+        
+        updated = 0
+        for employee in Employee.query.filter(Employee.ssn_hash.is_(None)).yield_per(500):
+            ssn = decrypt_data(employee.ssn_encrypted)
+            if ssn:
+                employee.ssn_hash = hash_ssn(ssn)
+                updated += 1
+        db.session.commit()
+        print(f"✅ Backfilled ssn_hash for {updated} employees")
+    
+    @app.cli.command()
+    def reencrypt_ssns():
+        """Rewrite encrypted SSNs under the current field key (one-shot)"""
+        from models import Employee
+        from routes.employees import decrypt_data, encrypt_data
+        
+        updated = 0
+        for employee in Employee.query.filter(Employee.ssn_encrypted.isnot(None)).yield_per(500):
+            ssn = decrypt_data(employee.ssn_encrypted)
+            if ssn:
+                employee.ssn_encrypted = encrypt_data(ssn)
+                updated += 1
+        db.session.commit()
+        print(f"✅ Re-encrypted SSNs for {updated} employees")
+    
+    @app.cli.command()
+    @click.option('--failed', is_flag=True, help="Also retry events that ran out of attempts")
+    def replay_stripe_events(failed):
+        """Apply stored Stripe webhook events that are still pending"""
+        from models import StripeEvent
+        from routes.stripe import process_stripe_events_batch
+        
+        if failed:
+            StripeEvent.query.filter_by(status='failed').update({'status': 'pending', 'attempts': 0})
+            db.session.commit()
+        
+        pending = [
+            event_id for (event_id,) in db.session.query(StripeEvent.id)
+            .filter(StripeEvent.status == 'pending')
+            .order_by(StripeEvent.received_at)
+        ]
+        applied = 0
+        for start in range(0, len(pending), 500):
+            applied += process_stripe_events_batch(pending[start:start + 500])
+        remaining = StripeEvent.query.filter_by(status='pending').count()
+        print(f"✅ Replayed {applied} of {len(pending)} Stripe events ({remaining} still pending)")
+    
     @app.cli.command()
     def reset_db():
         """Reset database (CAUTION: Deletes all data)"""
@@ -288,10 +455,23 @@ def create_app():
     # LOGGING
     # ========================================================================
     
+    # Route modules log through logging.getLogger(__name__); records are
+    # queued and written by a listener thread so request threads never
+    # block on stream I/O.
+    root_logger = logging.getLogger()
+    if not any(isinstance(h, QueueHandler) for h in root_logger.handlers):
+        log_queue = queue.Queue(-1)
+        stream_handler = logging.StreamHandler()
+        stream_handler.setFormatter(logging.Formatter(
+            '%(asctime)s %(levelname)s %(name)s: %(message)s'
+        ))
+        listener = QueueListener(log_queue, stream_handler, respect_handler_level=True)
+        listener.start()
+        atexit.register(listener.stop)
+        root_logger.addHandler(QueueHandler(log_queue))
+        root_logger.setLevel(logging.INFO)
+    
     if app.config['ENVIRONMENT'] == 'production':
-        import logging
-        from logging.handlers import RotatingFileHandler
-        
         if not os.path.exists('logs'):
             os.mkdir('logs')
         
@@ -304,7 +484,13 @@ def create_app():
             '%(asctime)s %(levelname)s: %(message)s [in %(pathname)s:%(lineno)d]'
         ))
         file_handler.setLevel(logging.INFO)
-        app.logger.addHandler(file_handler)
+        
+        # File writes and rotation happen on the listener thread
+        file_queue = queue.Queue(-1)
+        file_listener = QueueListener(file_queue, file_handler, respect_handler_level=True)
+        file_listener.start()
+        atexit.register(file_listener.stop)
+        app.logger.addHandler(QueueHandler(file_queue))
         
         app.logger.setLevel(logging.INFO)
         app.logger.info('Saurellius startup')
@@ -6,13 +6,20 @@ YTD stats, rewards, activity feeds, reports
 
 from flask import Blueprint, request, jsonify
 from flask_jwt_extended import jwt_required, get_jwt_identity
-from models import db, User, Employee, Paystub, AuditLog
-from sqlalchemy import func, extract
+from models import db, User, Employee, Paystub, AuditLog, PaystubAnnualRollup
+from sqlalchemy import func
+from sqlalchemy.orm import undefer
 from datetime import datetime, timezone, timedelta
 from decimal import Decimal
 
 dashboard_bp = Blueprint('dashboard', __name__)
 
+# Index 1-12 -> English month name (report labels were always English)
+_MONTH_NAMES = (
+    '', 'January', 'February', 'March', 'April', 'May', 'June',
+    'July', 'August', 'September', 'October', 'November', 'December'
+)
+
 # ============================================================================
 # DASHBOARD SUMMARY
 # ============================================================================
@@ -72,21 +79,21 @@ def get_dashboard_summary():
         # YTD TOTALS
         # ====================================================================
         
-        year_start = now.replace(month=1, day=1, hour=0, minute=0, second=0, microsecond=0)
-        
+        # Summed from the per-employee annual rollup rather than scanning
+        # this year's paystubs on every dashboard poll
+        rollup = PaystubAnnualRollup.c
         ytd_data = db.session.query(
-            func.sum(Paystub.gross_pay).label('ytd_gross'),
-            func.sum(Paystub.net_pay).label('ytd_net'),
-            func.sum(Paystub.federal_income_tax).label('ytd_federal'),
-            func.sum(Paystub.social_security_tax).label('ytd_ss'),
-            func.sum(Paystub.medicare_tax).label('ytd_medicare'),
-            func.sum(Paystub.state_income_tax).label('ytd_state'),
-            func.sum(Paystub.total_taxes).label('ytd_total_taxes'),
-            func.avg(Paystub.net_pay).label('avg_net_pay')
+            func.sum(rollup.gross).label('ytd_gross'),
+            func.sum(rollup.net).label('ytd_net'),
+            func.sum(rollup.federal).label('ytd_federal'),
+            func.sum(rollup.ss).label('ytd_ss'),
+            func.sum(rollup.medicare).label('ytd_medicare'),
+            func.sum(rollup.state).label('ytd_state'),
+            func.sum(rollup.total_taxes).label('ytd_total_taxes'),
+            (func.sum(rollup.net) / func.nullif(func.sum(rollup.paystub_count), 0)).label('avg_net_pay')
         ).filter(
-            Paystub.user_id == user_id,
-            Paystub.status == 'finalized',
-            Paystub.created_at >= year_start
+            rollup.user_id == user_id,
+            rollup.year == now.year
         ).first()
         
         # ====================================================================
@@ -105,7 +112,9 @@ def get_dashboard_summary():
         ).count()
         
         # Get active employees list
-        employees = Employee.query.filter_by(
+        employees = Employee.query.options(
+            undefer(Employee.ytd_gross_pay), undefer(Employee.ytd_net_pay)
+        ).filter_by(
             user_id=user_id,
             status='active'
         ).order_by(Employee.last_name).limit(10).all()
@@ -114,16 +123,26 @@ def get_dashboard_summary():
         # RECENT ACTIVITY
         # ====================================================================
         
-        recent_paystubs = Paystub.query.filter_by(
-            user_id=user_id,
-            status='finalized'
+        # Only the columns the feed shows; names come from the join rather
+        # than lazy-loading each stub's employee
+        recent_paystubs = db.session.query(
+            Paystub.employee_id,
+            Paystub.net_pay,
+            Paystub.created_at,
+            Paystub.verification_id,
+            Employee.full_name
+        ).join(
+            Employee, Paystub.employee_id == Employee.id
+        ).filter(
+            Paystub.user_id == user_id,
+            Paystub.status == 'finalized'
         ).order_by(Paystub.created_at.desc()).limit(10).all()
         
         recent_activity = []
         for stub in recent_paystubs:
             recent_activity.append({
                 'type': 'paystub_generated',
-                'employee_name': stub.employee.full_name,
+                'employee_name': stub.full_name,
                 'employee_id': stub.employee_id,
                 'amount': float(stub.net_pay),
                 'date': stub.created_at.isoformat(),
@@ -154,13 +173,13 @@ def get_dashboard_summary():
         # ====================================================================
         
         # Find most recent paystub to predict next pay date
-        latest_paystub = Paystub.query.filter_by(
-            user_id=user_id
-        ).order_by(Paystub.pay_date.desc()).first()
+        latest_pay_date = db.session.query(Paystub.pay_date).filter(
+            Paystub.user_id == user_id
+        ).order_by(Paystub.pay_date.desc()).limit(1).scalar()
         
-        if latest_paystub:
+        if latest_pay_date:
             # Average pay frequency (biweekly = 14 days)
-            next_pay_date = latest_paystub.pay_date + timedelta(days=14)
+            next_pay_date = latest_pay_date + timedelta(days=14)
             days_until_paydate = (next_pay_date - now.date()).days
         else:
             next_pay_date = None
@@ -172,7 +191,7 @@ def get_dashboard_summary():
         
         # Get paystubs by month for chart
         monthly_data = db.session.query(
-            extract('month', Paystub.pay_date).label('month'),
+            Paystub.pay_month.label('month'),
             func.sum(Paystub.gross_pay).label('gross'),
             func.sum(Paystub.net_pay).label('net'),
             func.sum(Paystub.total_taxes).label('taxes'),
@@ -180,14 +199,14 @@ def get_dashboard_summary():
         ).filter(
             Paystub.user_id == user_id,
             Paystub.status == 'finalized',
-            Paystub.pay_date >= year_start.date()
+            Paystub.pay_year == now.year
         ).group_by('month').all()
         
         monthly_breakdown = []
         for row in monthly_data:
             monthly_breakdown.append({
                 'month': int(row.month),
-                'month_name': datetime(2025, int(row.month), 1).strftime('%B'),
+                'month_name': _MONTH_NAMES[int(row.month)],
                 'gross_pay': float(row.gross or 0),
                 'net_pay': float(row.net or 0),
                 'taxes': float(row.taxes or 0),
@@ -361,8 +380,7 @@ def get_employee_costs():
         
         employee_costs = db.session.query(
             Employee.id,
-            Employee.first_name,
-            Employee.last_name,
+            Employee.full_name,
             func.sum(Paystub.gross_pay).label('total_gross'),
             func.sum(Paystub.net_pay).label('total_net'),
             func.sum(Paystub.total_taxes).label('total_taxes'),
@@ -373,14 +391,14 @@ def get_employee_costs():
             Employee.user_id == user_id,
             Paystub.status == 'finalized'
         ).group_by(
-            Employee.id, Employee.first_name, Employee.last_name
+            Employee.id, Employee.full_name
         ).order_by(func.sum(Paystub.gross_pay).desc()).all()
         
         costs = []
         for row in employee_costs:
             costs.append({
                 'employee_id': row.id,
-                'employee_name': f"{row.first_name} {row.last_name}",
+                'employee_name': row.full_name,
                 'total_gross': float(row.total_gross or 0),
                 'total_net': float(row.total_net or 0),
                 'total_taxes': float(row.total_taxes or 0),
@@ -416,64 +434,49 @@ def get_tax_summary():
         user_id = get_jwt_identity()
         
         year = request.args.get('year', datetime.now().year, type=int)
-        year_start = datetime(year, 1, 1).date()
-        year_end = datetime(year, 12, 31).date()
-        
-        # Get tax totals by type
-        tax_summary = db.session.query(
-            func.sum(Paystub.federal_income_tax).label('federal'),
-            func.sum(Paystub.social_security_tax).label('ss'),
-            func.sum(Paystub.medicare_tax).label('medicare'),
-            func.sum(Paystub.state_income_tax).label('state'),
-            func.sum(Paystub.state_disability_tax).label('sdi'),
-            func.sum(Paystub.local_income_tax).label('local'),
-            func.sum(Paystub.total_taxes).label('total')
+        
+        # Yearly totals and the quarterly breakdown both come from the
+        # per-employee rollup, so they always agree with each other
+        rollup = PaystubAnnualRollup.c
+        quarter_rows = db.session.query(
+            rollup.quarter,
+            func.sum(rollup.federal).label('federal'),
+            func.sum(rollup.ss).label('ss'),
+            func.sum(rollup.medicare).label('medicare'),
+            func.sum(rollup.state).label('state'),
+            func.sum(rollup.sdi).label('sdi'),
+            func.sum(rollup.local).label('local'),
+            func.sum(rollup.total_taxes).label('total'),
+            func.sum(rollup.gross).label('gross')
         ).filter(
-            Paystub.user_id == user_id,
-            Paystub.status == 'finalized',
-            Paystub.pay_date >= year_start,
-            Paystub.pay_date <= year_end
-        ).first()
+            rollup.user_id == user_id,
+            rollup.year == year
+        ).group_by(rollup.quarter).all()
         
-        # Get quarterly breakdown
-        quarterly = []
-        for quarter in range(1, 5):
-            q_start = datetime(year, (quarter-1)*3 + 1, 1).date()
-            if quarter == 4:
-                q_end = year_end
-            else:
-                q_end = datetime(year, quarter*3, 1).date()
-                # Get last day of month
-                next_month = q_end.replace(day=28) + timedelta(days=4)
-                q_end = next_month - timedelta(days=next_month.day)
-            
-            q_data = db.session.query(
-                func.sum(Paystub.total_taxes).label('total_taxes'),
-                func.sum(Paystub.gross_pay).label('gross_pay')
-            ).filter(
-                Paystub.user_id == user_id,
-                Paystub.status == 'finalized',
-                Paystub.pay_date >= q_start,
-                Paystub.pay_date <= q_end
-            ).first()
-            
-            quarterly.append({
+        def year_total(field):
+            return float(sum(getattr(row, field) or 0 for row in quarter_rows))
+        
+        by_quarter = {row.quarter: row for row in quarter_rows}
+        quarterly = [
+            {
                 'quarter': quarter,
-                'total_taxes': float(q_data.total_taxes or 0),
-                'gross_pay': float(q_data.gross_pay or 0)
-            })
+                'total_taxes': float(by_quarter[quarter].total or 0) if quarter in by_quarter else 0.0,
+                'gross_pay': float(by_quarter[quarter].gross or 0) if quarter in by_quarter else 0.0
+            }
+            for quarter in range(1, 5)
+        ]
         
         return jsonify({
             'success': True,
             'year': year,
             'summary': {
-                'federal_income_tax': float(tax_summary.federal or 0),
-                'social_security': float(tax_summary.ss or 0),
-                'medicare': float(tax_summary.medicare or 0),
-                'state_income_tax': float(tax_summary.state or 0),
-                'state_disability': float(tax_summary.sdi or 0),
-                'local_income_tax': float(tax_summary.local or 0),
-                'total_taxes': float(tax_summary.total or 0)
+                'federal_income_tax': year_total('federal'),
+                'social_security': year_total('ss'),
+                'medicare': year_total('medicare'),
+                'state_income_tax': year_total('state'),
+                'state_disability': year_total('sdi'),
+                'local_income_tax': year_total('local'),
+                'total_taxes': year_total('total')
             },
             'quarterly': quarterly
         }), 200
@@ -502,8 +505,7 @@ def get_employee_earnings_report():
         
         query = db.session.query(
             Employee.id,
-            Employee.first_name,
-            Employee.last_name,
+            Employee.full_name,
             Employee.ytd_gross_pay,
             Employee.ytd_net_pay,
             Employee.ytd_federal_tax,
@@ -524,7 +526,7 @@ def get_employee_earnings_report():
         for emp in employees:
             earnings_report.append({
                 'employee_id': emp.id,
-                'employee_name': f"{emp.first_name} {emp.last_name}",
+                'employee_name': emp.full_name,
                 'ytd_gross': float(emp.ytd_gross_pay),
                 'ytd_net': float(emp.ytd_net_pay),
                 'ytd_taxes': {
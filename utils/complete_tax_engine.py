@@ -4,6 +4,58 @@ Implements all tax calculations from deployment guide lines 1400-2200
 """
 from decimal import Decimal
 
+# Money is carried as integers and rates as integer parts per million;
+# Decimal only appears when converting dollars in and out. Dollar inputs
+# with sub-cent digits are carried as integers of a finer unit (units_per_cent
+# units to the cent) so rates apply to the exact amount, as Decimal did.
+PPM = 1000000
+
+_CENT = Decimal('0.01')
+
+
+def _to_units(*amounts):
+    """
+    Convert dollar amounts (str, int, float or Decimal) to integers on one
+    common scale, just fine enough to hold every amount exactly.
+    Returns (units, units_per_cent); units are cents when units_per_cent is 1.
+    """
+    ratios = [Decimal(str(amount)).as_integer_ratio() for amount in amounts]
+    # Decimal denominators are 2**a * 5**b, so some power of ten divides evenly
+    units_per_dollar = 100
+    for _, denominator in ratios:
+        while units_per_dollar % denominator:
+            units_per_dollar *= 10
+    return [
+        numerator * (units_per_dollar // denominator) for numerator, denominator in ratios
+    ], units_per_dollar // 100
+
+
+def _to_dollars(cents):
+    return _CENT * cents
+
+
+def _rate_ppm(rate):
+    """Decimal rate as integer parts per million"""
+    return int(rate * PPM)
+
+
+def _dollars_to_cents(amount):
+    """Decimal dollar amount as integer cents (None stays None)"""
+    return None if amount is None else int(amount * 100)
+
+
+def _apply_rate(amount, rate_ppm, units_per_cent=1):
+    """
+    amount * rate rounded to the cent, half to even (the same result as
+    Decimal.quantize(Decimal('0.01')) under the default context)
+    """
+    divisor = PPM * units_per_cent
+    quotient, remainder = divmod(amount * rate_ppm, divisor)
+    if 2 * remainder > divisor or (2 * remainder == divisor and quotient % 2):
+        quotient += 1
+    return quotient
+
+
 class CompleteTaxEngine:
     """
     Comprehensive tax calculation for all US jurisdictions
@@ -76,36 +128,64 @@ class CompleteTaxEngine:
         'YON': Decimal('0.015'),    # Yonkers, NY - 1.5%
     }
     
+    # The same constants as integer cents and parts per million, which is
+    # what the calculations run on
+    SS_RATE_PPM = _rate_ppm(SS_RATE)
+    SS_WAGE_BASE_2025_CENTS = _dollars_to_cents(SS_WAGE_BASE_2025)
+    MEDICARE_RATE_PPM = _rate_ppm(MEDICARE_RATE)
+    ADDITIONAL_MEDICARE_RATE_PPM = _rate_ppm(ADDITIONAL_MEDICARE_RATE)
+    ADDITIONAL_MEDICARE_THRESHOLD_CENTS = {
+        status: _dollars_to_cents(threshold) for status, threshold in ADDITIONAL_MEDICARE_THRESHOLD.items()
+    }
+    FLAT_TAX_STATES_PPM = {
+        abbr: _rate_ppm(rate) for abbr, rate in FLAT_TAX_STATES.items()
+    }
+    SDI_RATES_2025_PPM = {
+        abbr: {
+            'rate_ppm': _rate_ppm(info['rate']),
+            'wage_base_cents': _dollars_to_cents(info['wage_base'])
+        }
+        for abbr, info in SDI_RATES_2025.items()
+    }
+    LOCAL_TAX_RATES_PPM = {
+        city: _rate_ppm(rate) for city, rate in LOCAL_TAX_RATES.items()
+    }
+    
+    # Placeholder rates until full tax tables are implemented
+    FEDERAL_PLACEHOLDER_RATE_PPM = 150000  # 15%
+    STATE_PLACEHOLDER_RATE_PPM = 50000  # 5%
+    
     @staticmethod
-    def calculate_fica(gross_pay, ytd_ss_wages, ytd_medicare_wages, filing_status):
+    def calculate_fica_cents(gross, ytd_ss_wages, ytd_medicare_wages, filing_status, units_per_cent=1):
         """
-        Calculate FICA taxes (Social Security + Medicare)
+        Calculate FICA taxes (Social Security + Medicare) in cents
+        
+        Amounts are integer cents, or units_per_cent units to the cent.
         """
         result = {
-            'social_security': Decimal('0'),
-            'medicare': Decimal('0'),
-            'additional_medicare': Decimal('0'),
+            'social_security': 0,
+            'medicare': 0,
+            'additional_medicare': 0,
             'ss_wage_base_reached': False
         }
         
         # Social Security Tax (capped at wage base)
-        if ytd_ss_wages < CompleteTaxEngine.SS_WAGE_BASE_2025:
-            ss_taxable_this_period = min(
-                gross_pay,
-                CompleteTaxEngine.SS_WAGE_BASE_2025 - ytd_ss_wages
+        wage_base = CompleteTaxEngine.SS_WAGE_BASE_2025_CENTS * units_per_cent
+        if ytd_ss_wages < wage_base:
+            ss_taxable_this_period = min(gross, wage_base - ytd_ss_wages)
+            result['social_security'] = _apply_rate(
+                ss_taxable_this_period, CompleteTaxEngine.SS_RATE_PPM, units_per_cent
             )
-            result['social_security'] = (ss_taxable_this_period * CompleteTaxEngine.SS_RATE).quantize(Decimal('0.01'))
             
-            if (ytd_ss_wages + gross_pay) >= CompleteTaxEngine.SS_WAGE_BASE_2025:
+            if (ytd_ss_wages + gross) >= wage_base:
                 result['ss_wage_base_reached'] = True
                 
         # Medicare Tax (no cap)
-        result['medicare'] = (gross_pay * CompleteTaxEngine.MEDICARE_RATE).quantize(Decimal('0.01'))
+        result['medicare'] = _apply_rate(gross, CompleteTaxEngine.MEDICARE_RATE_PPM, units_per_cent)
         
         # Additional Medicare Tax (for high earners)
-        medicare_wages_this_period = gross_pay
-        total_medicare_wages = ytd_medicare_wages + medicare_wages_this_period
-        threshold = CompleteTaxEngine.ADDITIONAL_MEDICARE_THRESHOLD.get(filing_status, Decimal('200000.00'))
+        total_medicare_wages = ytd_medicare_wages + gross
+        threshold = CompleteTaxEngine.ADDITIONAL_MEDICARE_THRESHOLD_CENTS.get(filing_status, 20000000) * units_per_cent
         
         if total_medicare_wages > threshold:
             # Calculate the amount of wages over the threshold for this period
@@ -114,79 +194,119 @@ class CompleteTaxEngine:
                 over_threshold_wages = total_medicare_wages - threshold
             else:
                 # All of this period's wages are over the threshold
-                over_threshold_wages = medicare_wages_this_period
+                over_threshold_wages = gross
                 
-            result['additional_medicare'] = (over_threshold_wages * CompleteTaxEngine.ADDITIONAL_MEDICARE_RATE).quantize(Decimal('0.01'))
+            result['additional_medicare'] = _apply_rate(
+                over_threshold_wages, CompleteTaxEngine.ADDITIONAL_MEDICARE_RATE_PPM, units_per_cent
+            )
             
         return result
 
     @staticmethod
-    def calculate_state_tax(state_abbr, gross_pay, filing_status, allowances, ytd_gross):
+    def calculate_state_tax_cents(state_abbr, gross, filing_status, allowances, ytd_gross, units_per_cent=1):
         """
-        Calculate state income tax (simplified for flat/no tax states)
+        Calculate state income tax in cents (simplified for flat/no tax states)
         NOTE: This is a highly simplified model. Real-world state tax is complex.
         """
         if state_abbr in CompleteTaxEngine.NO_TAX_STATES:
-            return Decimal('0.00')
+            return 0
         
-        if state_abbr in CompleteTaxEngine.FLAT_TAX_STATES:
-            rate = CompleteTaxEngine.FLAT_TAX_STATES[state_abbr]
-            return (gross_pay * rate).quantize(Decimal('0.01'))
+        rate_ppm = CompleteTaxEngine.FLAT_TAX_STATES_PPM.get(state_abbr)
+        if rate_ppm is not None:
+            return _apply_rate(gross, rate_ppm, units_per_cent)
             
         # Placeholder for complex states (e.g., CA, NY, etc.)
         # For now, return a placeholder calculation for non-flat tax states
         # This should be replaced with a full tax table implementation
         if state_abbr in ['CA', 'NY', 'NJ', 'TX']:
-            # Example placeholder: 5% of gross pay
-            return (gross_pay * Decimal('0.05')).quantize(Decimal('0.01'))
+            return _apply_rate(gross, CompleteTaxEngine.STATE_PLACEHOLDER_RATE_PPM, units_per_cent)
             
-        return Decimal('0.00')
+        return 0
 
     @staticmethod
-    def calculate_sdi(state_abbr, gross_pay, ytd_gross):
+    def calculate_sdi_cents(state_abbr, gross, ytd_gross, units_per_cent=1):
         """
-        Calculate State Disability Insurance (SDI)
+        Calculate State Disability Insurance (SDI) in cents
         """
-        sdi_info = CompleteTaxEngine.SDI_RATES_2025.get(state_abbr)
+        sdi_info = CompleteTaxEngine.SDI_RATES_2025_PPM.get(state_abbr)
         if not sdi_info:
-            return Decimal('0.00')
+            return 0
             
-        rate = sdi_info['rate']
-        wage_base = sdi_info['wage_base']
+        rate_ppm = sdi_info['rate_ppm']
+        wage_base = sdi_info['wage_base_cents']
         
         if wage_base is None:
             # No wage base limit
-            return (gross_pay * rate).quantize(Decimal('0.01'))
-        else:
-            # Calculate taxable wages for this period
-            if ytd_gross < wage_base:
-                sdi_taxable_this_period = min(
-                    gross_pay,
-                    wage_base - ytd_gross
-                )
-                return (sdi_taxable_this_period * rate).quantize(Decimal('0.01'))
-            else:
-                return Decimal('0.00')
+            return _apply_rate(gross, rate_ppm, units_per_cent)
+        
+        # Calculate taxable wages for this period
+        wage_base *= units_per_cent
+        if ytd_gross < wage_base:
+            sdi_taxable_this_period = min(gross, wage_base - ytd_gross)
+            return _apply_rate(sdi_taxable_this_period, rate_ppm, units_per_cent)
+        return 0
+
+    @staticmethod
+    def calculate_local_tax_cents(city_code, gross, units_per_cent=1):
+        """
+        Calculate local income tax in cents
+        """
+        rate_ppm = CompleteTaxEngine.LOCAL_TAX_RATES_PPM.get(city_code)
+        if rate_ppm:
+            return _apply_rate(gross, rate_ppm, units_per_cent)
+        return 0
+
+    @staticmethod
+    def calculate_fica(gross_pay, ytd_ss_wages, ytd_medicare_wages, filing_status):
+        """
+        Calculate FICA taxes (Social Security + Medicare)
+        """
+        (gross, ytd_ss, ytd_medicare), units_per_cent = _to_units(gross_pay, ytd_ss_wages, ytd_medicare_wages)
+        result = CompleteTaxEngine.calculate_fica_cents(gross, ytd_ss, ytd_medicare, filing_status, units_per_cent)
+        for key in ('social_security', 'medicare', 'additional_medicare'):
+            result[key] = _to_dollars(result[key])
+        return result
+
+    @staticmethod
+    def calculate_state_tax(state_abbr, gross_pay, filing_status, allowances, ytd_gross):
+        """
+        Calculate state income tax (simplified for flat/no tax states)
+        """
+        (gross, ytd), units_per_cent = _to_units(gross_pay, ytd_gross)
+        return _to_dollars(CompleteTaxEngine.calculate_state_tax_cents(
+            state_abbr, gross, filing_status, allowances, ytd, units_per_cent
+        ))
+
+    @staticmethod
+    def calculate_sdi(state_abbr, gross_pay, ytd_gross):
+        """
+        Calculate State Disability Insurance (SDI)
+        """
+        (gross, ytd), units_per_cent = _to_units(gross_pay, ytd_gross)
+        return _to_dollars(CompleteTaxEngine.calculate_sdi_cents(state_abbr, gross, ytd, units_per_cent))
 
     @staticmethod
     def calculate_local_tax(city_code, gross_pay):
         """
         Calculate local income tax
         """
-        rate = CompleteTaxEngine.LOCAL_TAX_RATES.get(city_code)
-        if rate:
-            return (gross_pay * rate).quantize(Decimal('0.01'))
-        return Decimal('0.00')
+        (gross,), units_per_cent = _to_units(gross_pay)
+        return _to_dollars(CompleteTaxEngine.calculate_local_tax_cents(city_code, gross, units_per_cent))
 
     @staticmethod
     def calculate_all_taxes(gross_pay, ytd_data, employee_data):
         """
         Main function to calculate all taxes for a pay period
+        
+        Amounts in and out are dollars; everything in between runs on
+        integers.
         """
-        gross_pay = Decimal(str(gross_pay))
-        ytd_ss_wages = Decimal(str(ytd_data.get('ytd_ss_wages', '0.00')))
-        ytd_medicare_wages = Decimal(str(ytd_data.get('ytd_medicare_wages', '0.00')))
-        ytd_gross = Decimal(str(ytd_data.get('ytd_gross', '0.00')))
+        (gross, ytd_ss_wages, ytd_medicare_wages, ytd_gross), units_per_cent = _to_units(
+            gross_pay,
+            ytd_data.get('ytd_ss_wages', '0.00'),
+            ytd_data.get('ytd_medicare_wages', '0.00'),
+            ytd_data.get('ytd_gross', '0.00')
+        )
         
         filing_status = employee_data.get('federal_filing_status', 'Single')
         federal_allowances = employee_data.get('federal_allowances', 0)
@@ -194,30 +314,30 @@ class CompleteTaxEngine:
         local_city_code = employee_data.get('local_city_code')
         
         # 1. FICA Taxes
-        fica_taxes = CompleteTaxEngine.calculate_fica(
-            gross_pay, ytd_ss_wages, ytd_medicare_wages, filing_status
+        fica_taxes = CompleteTaxEngine.calculate_fica_cents(
+            gross, ytd_ss_wages, ytd_medicare_wages, filing_status, units_per_cent
         )
         
         # 2. Federal Income Tax (Placeholder - requires full tax table logic)
         # For now, a simple placeholder calculation
-        federal_income_tax = (gross_pay * Decimal('0.15')).quantize(Decimal('0.01'))
+        federal_income_tax = _apply_rate(gross, CompleteTaxEngine.FEDERAL_PLACEHOLDER_RATE_PPM, units_per_cent)
         
         # 3. State Income Tax
-        state_income_tax = CompleteTaxEngine.calculate_state_tax(
-            state_abbr, gross_pay, filing_status, federal_allowances, ytd_gross
+        state_income_tax = CompleteTaxEngine.calculate_state_tax_cents(
+            state_abbr, gross, filing_status, federal_allowances, ytd_gross, units_per_cent
         )
         
         # 4. State Disability Insurance (SDI)
-        state_disability_tax = CompleteTaxEngine.calculate_sdi(
-            state_abbr, gross_pay, ytd_gross
+        state_disability_tax = CompleteTaxEngine.calculate_sdi_cents(
+            state_abbr, gross, ytd_gross, units_per_cent
         )
         
         # 5. Local Tax
-        local_income_tax = CompleteTaxEngine.calculate_local_tax(
-            local_city_code, gross_pay
+        local_income_tax = CompleteTaxEngine.calculate_local_tax_cents(
+            local_city_code, gross, units_per_cent
         )
         
-        return {
+        taxes = {
             'federal_income_tax': federal_income_tax,
             'social_security_tax': fica_taxes['social_security'],
             'medicare_tax': fica_taxes['medicare'],
@@ -225,5 +345,6 @@ class CompleteTaxEngine:
             'state_income_tax': state_income_tax,
             'state_disability_tax': state_disability_tax,
             'local_income_tax': local_income_tax,
-            'total_tax': federal_income_tax + fica_taxes['social_security'] + fica_taxes['medicare'] + fica_taxes['additional_medicare'] + state_income_tax + state_disability_tax + local_income_tax
         }
+        taxes['total_tax'] = sum(taxes.values())
+        return {name: _to_dollars(cents) for name, cents in taxes.items()}
@@ -0,0 +1,45 @@
+"""
+orjson-backed JSON Provider
+Replaces Flask's stdlib json encoder for jsonify() and request.get_json()
+"""
+
+from decimal import Decimal
+
+import orjson
+from flask.json.provider import JSONProvider
+
+ORJSON_OPTIONS = orjson.OPT_NON_STR_KEYS
+
+
+def _default(obj):
+    """Serialize types orjson does not handle natively"""
+    if isinstance(obj, Decimal):
+        # Money columns are Numeric; responses have always exposed them as floats
+        return float(obj)
+    if hasattr(obj, '__html__'):
+        return str(obj.__html__())
+    raise TypeError(f"Object of type {type(obj).__name__} is not JSON serializable")
+
+
+class OrjsonProvider(JSONProvider):
+    """
+    JSON provider using orjson (C-accelerated encode/decode).
+
+    datetime/date/UUID are serialized natively in ISO format, and Decimal
+    is converted to float, so handlers can return model values directly.
+    """
+
+    mimetype = 'application/json'
+
+    def dumps(self, obj, **kwargs):
+        return orjson.dumps(obj, default=_default, option=ORJSON_OPTIONS).decode()
+
+    def loads(self, s, **kwargs):
+        return orjson.loads(s)
+
+    def response(self, *args, **kwargs):
+        obj = self._prepare_response_obj(args, kwargs)
+        return self._app.response_class(
+            orjson.dumps(obj, default=_default, option=ORJSON_OPTIONS),
+            mimetype=self.mimetype
+        )
@@ -0,0 +1,61 @@
+"""
+JWT Verification Cache
+Short-circuits repeated signature verification of the same bearer token
+across requests handled by this worker
+"""
+
+import hashlib
+import threading
+import time
+
+import flask_jwt_extended.view_decorators as jwt_view_decorators
+from cachetools import TTLCache
+from flask import request
+
+# Upper bound on how long a verified token is trusted without re-decoding
+JWT_CACHE_TTL = 10
+
+_jwt_cache = TTLCache(maxsize=10000, ttl=JWT_CACHE_TTL)
+_jwt_cache_lock = threading.Lock()
+
+
+def _cached_decode(decode):
+    def wrapper(locations, fresh, refresh=False, verify_type=True, skip_revocation_check=False):
+        auth_header = request.headers.get('Authorization')
+        if not auth_header:
+            return decode(locations, fresh, refresh, verify_type, skip_revocation_check)
+
+        token_key = hashlib.sha256(auth_header.encode()).digest()[:16]
+        key = (token_key, fresh, refresh, verify_type)
+        now = time.time()
+
+        with _jwt_cache_lock:
+            entry = _jwt_cache.get(key)
+        if entry and entry[0] > now:
+            return entry[1]
+
+        result = decode(locations, fresh, refresh, verify_type, skip_revocation_check)
+
+        # Never trust a cached token past its own exp
+        decoded_token = result[0]
+        expires_at = min(decoded_token.get('exp', now), now + JWT_CACHE_TTL)
+        if expires_at > now:
+            with _jwt_cache_lock:
+                _jwt_cache[key] = (expires_at, result)
+        return result
+
+    wrapper._jwt_cached = True
+    return wrapper
+
+
+def enable_jwt_verification_cache():
+    """
+    Wrap flask_jwt_extended's request token decoding with a bounded TTL cache.
+
+    Entries are keyed by a hash of the raw Authorization header and expire
+    after JWT_CACHE_TTL seconds or at the token's exp, whichever is sooner.
+    Safe to call more than once.
+    """
+    decode = jwt_view_decorators._decode_jwt_from_request
+    if not getattr(decode, '_jwt_cached', False):
+        jwt_view_decorators._decode_jwt_from_request = _cached_decode(decode)
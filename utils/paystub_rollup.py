@@ -0,0 +1,88 @@
+"""
+Paystub Annual Rollup Refresh
+Refreshes the paystub_annual_rollup materialized view from a background
+thread, coalescing bursts of paystub finalizes/voids into one refresh
+
+Each gunicorn worker runs its own refresher, and a refresh recomputes the
+whole view for every account. A transaction-scoped advisory lock keeps the
+workers from refreshing at the same time: a worker that finds another
+worker's refresh running retries after ROLLUP_REFRESH_DELAY instead of
+piling on. A burst that touches every worker can therefore still cost up
+to one (sequential) refresh per worker.
+"""
+
+import logging
+import threading
+import time
+
+from flask import current_app
+from sqlalchemy import text
+
+from models import db
+
+logger = logging.getLogger(__name__)
+
+# Requests arriving within this window share a single refresh
+ROLLUP_REFRESH_DELAY = 5
+
+# pg_advisory_xact_lock key shared by every worker's refresher
+ROLLUP_REFRESH_LOCK_KEY = 0x726f6c6c
+
+_refresh_requested = threading.Event()
+
+_refresher = None
+_refresher_lock = threading.Lock()
+
+
+def _refresh_rollup(app):
+    """Refresh the view; returns False if another worker's refresh held the lock"""
+    with app.app_context():
+        try:
+            locked = db.session.execute(
+                text('SELECT pg_try_advisory_xact_lock(:key)'), {'key': ROLLUP_REFRESH_LOCK_KEY}
+            ).scalar()
+            if not locked:
+                db.session.rollback()
+                return False
+            db.session.execute(text('REFRESH MATERIALIZED VIEW CONCURRENTLY paystub_annual_rollup'))
+            db.session.commit()
+        except Exception:
+            db.session.rollback()
+            logger.exception("Paystub annual rollup refresh failed")
+    return True
+
+
+def _refresh_forever(app):
+    while True:
+        _refresh_requested.wait()
+        time.sleep(ROLLUP_REFRESH_DELAY)
+        # Cleared before refreshing so changes committed mid-refresh
+        # schedule another pass
+        _refresh_requested.clear()
+        if not _refresh_rollup(app):
+            # That refresh may have started before our change committed
+            _refresh_requested.set()
+
+
+def _ensure_refresher(app):
+    global _refresher
+    if _refresher is not None:
+        return
+    with _refresher_lock:
+        if _refresher is None:
+            # Started lazily so each forked worker runs its own thread
+            _refresher = threading.Thread(
+                target=_refresh_forever, args=(app,), name='paystub-rollup', daemon=True
+            )
+            _refresher.start()
+
+
+def schedule_rollup_refresh():
+    """
+    Request a refresh of paystub_annual_rollup.
+
+    Call after committing a change to finalized paystubs; must be called
+    from within a request/app context.
+    """
+    _ensure_refresher(current_app._get_current_object())
+    _refresh_requested.set()
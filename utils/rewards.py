@@ -3,6 +3,8 @@ Rewards and Gamification System
 Handles point awards, tier progression, and achievements
 """
 
+import bisect
+
 from models import User, RewardActivity # Assuming models are in models.py
 from application import db # Assuming db object is initialized in application.py
 from datetime import datetime, date, timedelta
@@ -32,16 +34,15 @@ TIER_THRESHOLDS = {
 }
 
 
+# Tier lookup tables, ordered by threshold
+_TIER_ORDER = sorted(TIER_THRESHOLDS, key=TIER_THRESHOLDS.get)
+_THRESHOLDS = [TIER_THRESHOLDS[tier] for tier in _TIER_ORDER]
+
+
 def calculate_tier(points):
     """Calculate reward tier based on points"""
-    if points >= TIER_THRESHOLDS['platinum']:
-        return 'platinum'
-    elif points >= TIER_THRESHOLDS['gold']:
-        return 'gold'
-    elif points >= TIER_THRESHOLDS['silver']:
-        return 'silver'
-    else:
-        return 'bronze'
+    return _TIER_ORDER[max(bisect.bisect_right(_THRESHOLDS, points) - 1, 0)]
+
 
 def award_points(user_id, activity_type, description=None, custom_points=None):
     """Award points to a user for an activity"""
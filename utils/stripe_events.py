@@ -0,0 +1,106 @@
+"""
+Background Stripe Event Processing
+Applies stored webhook events from a worker thread so the webhook endpoint
+can acknowledge Stripe as soon as the event is persisted, and periodically
+retries events that are still pending (failed handlers, full queues,
+restarted workers)
+"""
+
+import atexit
+import logging
+import os
+import queue
+import threading
+import time
+
+from flask import current_app
+
+logger = logging.getLogger(__name__)
+
+STRIPE_EVENT_QUEUE_SIZE = 10000
+
+# Seconds between sweeps for pending events that are due a retry
+STRIPE_EVENT_SWEEP_INTERVAL = 60
+
+_event_queue = queue.Queue(STRIPE_EVENT_QUEUE_SIZE)
+_STOP = object()
+
+_worker = None
+_worker_pid = None
+_worker_lock = threading.Lock()
+
+
+def _process_forever(app):
+    # Imported here: routes.stripe imports this module
+    from routes.stripe import process_stripe_event, retry_pending_stripe_events
+
+    # A single worker applies this process's events in arrival order
+    next_sweep = time.monotonic() + STRIPE_EVENT_SWEEP_INTERVAL
+    while True:
+        try:
+            event_id = _event_queue.get(timeout=max(next_sweep - time.monotonic(), 0))
+        except queue.Empty:
+            event_id = None
+        if event_id is _STOP:
+            break
+
+        with app.app_context():
+            if event_id is not None:
+                try:
+                    process_stripe_event(event_id)
+                except Exception:
+                    logger.exception("Stripe event %s failed; left pending for retry", event_id)
+
+            if time.monotonic() >= next_sweep:
+                try:
+                    retried = retry_pending_stripe_events()
+                    if retried:
+                        logger.info("Applied %d pending Stripe events on retry", retried)
+                except Exception:
+                    logger.exception("Stripe event retry sweep failed")
+                next_sweep = time.monotonic() + STRIPE_EVENT_SWEEP_INTERVAL
+
+
+def _stop_worker():
+    """Finish queued events on interpreter shutdown"""
+    _event_queue.put(_STOP)
+    _worker.join(timeout=10)
+
+
+def _ensure_worker(app):
+    global _worker, _worker_pid
+    if _worker_pid == os.getpid():
+        return
+    with _worker_lock:
+        if _worker_pid != os.getpid():
+            # One thread per process; a thread started before a fork does
+            # not exist in the child, so a new pid starts its own
+            _worker = threading.Thread(
+                target=_process_forever, args=(app,), name='stripe-events', daemon=True
+            )
+            _worker.start()
+            _worker_pid = os.getpid()
+            atexit.register(_stop_worker)
+
+
+def start_stripe_event_worker(app):
+    """
+    Start this process's worker from the app factory, so pending events are
+    retried after a restart even before the next webhook arrives.
+    """
+    _ensure_worker(app)
+
+
+def enqueue_stripe_event(event_id):
+    """
+    Queue a stored StripeEvent to be applied after the webhook responds.
+
+    Must be called from within a request/app context, after the event row
+    is committed. If the queue is full the event stays pending and is
+    applied by the next retry sweep.
+    """
+    _ensure_worker(current_app._get_current_object())
+    try:
+        _event_queue.put_nowait(event_id)
+    except queue.Full:
+        logger.warning("Stripe event queue full; %s left pending for retry", event_id)